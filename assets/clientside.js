@@ -0,0 +1,573 @@
+/*
+ * Клиентские callback'и дашборда.
+ * В клиентском режиме данные приходят в браузер один раз (dcc.Store 'client-data'),
+ * а фильтрация, графики, таблица и статистика считаются здесь, без запросов к серверу.
+ */
+(function () {
+    'use strict';
+
+    var PALETTE = ['#636efa', '#EF553B', '#00cc96', '#ab63fa', '#FFA15A',
+                   '#19d3f3', '#FF6692', '#B6E880', '#FF97FF', '#FECB52'];
+    var DAY_ORDER = ['Thur', 'Fri', 'Sat', 'Sun'];
+    var TYPED = {int8: Int8Array, int16: Int16Array, int32: Int32Array, float64: Float64Array};
+
+    // Декодированные колонки и последний результат фильтрации для каждого набора данных
+    var decoded = new WeakMap();
+    var lastSelection = {payload: null, key: null, rows: null};
+    // Номер последнего изменения слайдера: отложенные устаревшие значения отбрасываются
+    var rangeChanges = 0;
+    var lastRange = null;
+
+    // Одинаковый диапазон не отправляется повторно, чтобы не перезапускать callback'и
+    function emitRange(range) {
+        var key = JSON.stringify(range);
+        if (key === lastRange) {
+            return window.dash_clientside.no_update;
+        }
+        lastRange = key;
+        return range;
+    }
+
+    function decodeColumn(spec) {
+        var binary = atob(spec.data);
+        var bytes = new Uint8Array(binary.length);
+        for (var i = 0; i < binary.length; i++) {
+            bytes[i] = binary.charCodeAt(i);
+        }
+        var values = new TYPED[spec.dtype](bytes.buffer);
+        if (spec.kind === 'cents') {
+            var money = new Float64Array(values.length);
+            for (var j = 0; j < values.length; j++) {
+                money[j] = values[j] / 100;
+            }
+            return money;
+        }
+        return values;
+    }
+
+    function columns(payload) {
+        var result = decoded.get(payload);
+        if (!result) {
+            result = {};
+            Object.keys(payload.data).forEach(function (name) {
+                result[name] = decodeColumn(payload.data[name]);
+            });
+            decoded.set(payload, result);
+        }
+        return result;
+    }
+
+    // Значение строки: для категорий - название, для чисел - число
+    function value(payload, cols, name, row) {
+        var spec = payload.data[name];
+        if (spec.kind === 'category') {
+            var code = cols[name][row];
+            return code < 0 ? null : spec.categories[code];
+        }
+        return cols[name][row];
+    }
+
+    // Позиции строк, прошедших фильтры; три callback'а одного изменения фильтров
+    // получают один и тот же результат
+    function selectRows(payload, day, gender, time, smoker, billRange) {
+        var key = JSON.stringify([day, gender, time, smoker, billRange]);
+        if (lastSelection.payload === payload && lastSelection.key === key) {
+            return lastSelection.rows;
+        }
+
+        var cols = columns(payload);
+        var filters = [];
+        [['day', day], ['sex', gender], ['time', time], ['smoker', smoker]].forEach(function (pair) {
+            if (pair[1] !== 'All' && pair[1] !== null && pair[1] !== undefined) {
+                filters.push([cols[pair[0]], payload.data[pair[0]].categories.indexOf(pair[1])]);
+            }
+        });
+
+        var bills = cols.total_bill;
+        var rows = [];
+        for (var i = 0; i < payload.rows; i++) {
+            if (bills[i] < billRange[0] || bills[i] > billRange[1]) {
+                continue;
+            }
+            var match = true;
+            for (var f = 0; f < filters.length; f++) {
+                if (filters[f][0][i] !== filters[f][1]) {
+                    match = false;
+                    break;
+                }
+            }
+            if (match) {
+                rows.push(i);
+            }
+        }
+
+        lastSelection = {payload: payload, key: key, rows: rows};
+        return rows;
+    }
+
+    // Группировка позиций строк по значению категории в порядке появления
+    function groupRows(payload, rows, name) {
+        var cols = columns(payload);
+        var groups = [];
+        var byName = {};
+        rows.forEach(function (row) {
+            var group = value(payload, cols, name, row);
+            if (!(group in byName)) {
+                byName[group] = [];
+                groups.push(group);
+            }
+            byName[group].push(row);
+        });
+        return {names: groups, rows: byName};
+    }
+
+    function mean(values) {
+        if (!values.length) {
+            return NaN;
+        }
+        var sum = 0;
+        for (var i = 0; i < values.length; i++) {
+            sum += values[i];
+        }
+        return sum / values.length;
+    }
+
+    function pick(column, rows) {
+        return rows.map(function (row) {
+            return column[row];
+        });
+    }
+
+    function round2(x) {
+        return Math.round(x * 100) / 100;
+    }
+
+    // Форматирование как у f-строк Python: nan вместо NaN
+    function fixed(x, digits) {
+        return isNaN(x) ? 'nan' : x.toFixed(digits);
+    }
+
+    // Процентиль с линейной интерполяцией, как np.percentile
+    function percentile(sorted, p) {
+        var position = (sorted.length - 1) * p;
+        var lower = Math.floor(position);
+        var upper = Math.min(lower + 1, sorted.length - 1);
+        return sorted[lower] + (sorted[upper] - sorted[lower]) * (position - lower);
+    }
+
+    function boxStatistics(values, maxOutliers) {
+        var sorted = values.slice().sort(function (a, b) { return a - b; });
+        var q1 = percentile(sorted, 0.25);
+        var median = percentile(sorted, 0.5);
+        var q3 = percentile(sorted, 0.75);
+        var iqr = q3 - q1;
+        var inside = sorted.filter(function (x) {
+            return x >= q1 - 1.5 * iqr && x <= q3 + 1.5 * iqr;
+        });
+        var low = inside[0];
+        var high = inside[inside.length - 1];
+        var outliers = sorted.filter(function (x) { return x < low || x > high; });
+        if (outliers.length > maxOutliers) {
+            var step = (outliers.length - 1) / (maxOutliers - 1);
+            var sampled = [];
+            for (var i = 0; i < maxOutliers; i++) {
+                sampled.push(outliers[Math.floor(i * step)]);
+            }
+            outliers = sampled;
+        }
+        return {q1: q1, median: median, q3: q3, lowerfence: low, upperfence: high,
+                mean: mean(sorted), outliers: outliers};
+    }
+
+    // Экспоненциальное скользящее среднее как pandas ewm(span).mean()
+    function ewmMean(values, span) {
+        var decay = 1 - 2 / (span + 1);
+        var result = [];
+        var weighted = 0;
+        var weights = 0;
+        for (var i = 0; i < values.length; i++) {
+            weighted = weighted * decay + values[i];
+            weights = weights * decay + 1;
+            result.push(weighted / weights);
+        }
+        return result;
+    }
+
+    function figure(payload, data, layout) {
+        layout.template = payload.template;
+        return {data: data, layout: layout};
+    }
+
+    function tipDistribution(payload, rows, day) {
+        var cols = columns(payload);
+        var groups = groupRows(payload, rows, 'sex');
+        var means = groups.names.map(function (name) {
+            return {sex: name, tip: round2(mean(pick(cols.tip, groups.rows[name])))};
+        });
+        means.sort(function (a, b) { return b.tip - a.tip; });
+
+        var data = means.map(function (item, i) {
+            return {type: 'bar', x: [item.sex], y: [item.tip], name: item.sex,
+                    legendgroup: item.sex, offsetgroup: item.sex, alignmentgroup: 'True',
+                    marker: {color: PALETTE[i % PALETTE.length]}, width: 0.3,
+                    hovertemplate: 'Gender=%{x}<br>Average Tip ($)=%{y}<extra></extra>'};
+        });
+        var title = day !== 'All' ? 'Average Tips by Gender (' + day + ')'
+                                  : 'Average Tips by Gender (All Days)';
+        return figure(payload, data, {
+            title: {text: title}, barmode: 'relative',
+            xaxis: {title: {text: 'Gender'}}, yaxis: {title: {text: 'Average Tip Amount ($)'}},
+            showlegend: false, bargap: 0.7, bargroupgap: 0.3,
+            margin: {l: 50, r: 50, t: 60, b: 50}, autosize: true
+        });
+    }
+
+    function totalBillDistribution(payload, rows, day) {
+        var bills = pick(columns(payload).total_bill, rows);
+        var nbins = 20;
+        var low = bills.length ? bills.reduce(function (a, b) { return Math.min(a, b); }) : 0;
+        var high = bills.length ? bills.reduce(function (a, b) { return Math.max(a, b); }) : 1;
+        if (low === high) {
+            low -= 0.5;
+            high += 0.5;
+        }
+        var width = (high - low) / nbins;
+        var counts = new Array(nbins).fill(0);
+        bills.forEach(function (bill) {
+            counts[Math.min(Math.floor((bill - low) / width), nbins - 1)] += 1;
+        });
+
+        var centers = [], widths = [], ranges = [];
+        for (var i = 0; i < nbins; i++) {
+            centers.push(low + width * (i + 0.5));
+            widths.push(width);
+            ranges.push([low + width * i, low + width * (i + 1)]);
+        }
+        var title = day !== 'All' ? 'Total Bill Distribution (' + day + ')'
+                                  : 'Total Bill Distribution (All Days)';
+        return figure(payload, [{
+            type: 'bar', x: centers, y: counts, width: widths, customdata: ranges,
+            marker: {color: 'indianred'},
+            hovertemplate: 'Total Bill Amount ($)=%{customdata[0]:.2f}-%{customdata[1]:.2f}' +
+                           '<br>count=%{y}<extra></extra>'
+        }], {
+            title: {text: title}, xaxis: {title: {text: 'Total Bill Amount ($)'}},
+            yaxis: {title: {text: 'Count'}}, bargap: 0, showlegend: false
+        });
+    }
+
+    function timeBoxplot(payload, rows) {
+        var cols = columns(payload);
+        var times = groupRows(payload, rows, 'time').names;
+        var sexes = groupRows(payload, rows, 'sex');
+        var data = [];
+        sexes.names.forEach(function (sex, i) {
+            var color = PALETTE[i % PALETTE.length];
+            var byTime = groupRows(payload, sexes.rows[sex], 'time');
+            var present = times.filter(function (time) { return time in byTime.rows; });
+            var boxes = present.map(function (time) {
+                return boxStatistics(pick(cols.tip, byTime.rows[time]), 500);
+            });
+            var field = function (name) {
+                return boxes.map(function (box) { return box[name]; });
+            };
+            data.push({type: 'box', x: present, q1: field('q1'), median: field('median'),
+                       q3: field('q3'), lowerfence: field('lowerfence'),
+                       upperfence: field('upperfence'), mean: field('mean'),
+                       name: sex, legendgroup: sex, offsetgroup: sex,
+                       marker: {color: color}, line: {color: color}});
+            var outlierX = [], outlierY = [];
+            boxes.forEach(function (box, b) {
+                box.outliers.forEach(function (tip) {
+                    outlierX.push(present[b]);
+                    outlierY.push(tip);
+                });
+            });
+            data.push({type: 'scatter', mode: 'markers', x: outlierX, y: outlierY,
+                       name: sex, legendgroup: sex, offsetgroup: sex,
+                       marker: {color: color}, showlegend: false});
+        });
+        return figure(payload, data, {
+            title: {text: 'Tip Distribution by Time (All Genders)'},
+            legend: {title: {text: 'Gender'}},
+            xaxis: {title: {text: 'Time of Day'}}, yaxis: {title: {text: 'Tip Amount ($)'}},
+            boxmode: 'group', scattermode: 'group'
+        });
+    }
+
+    function dayPieChart(payload, rows) {
+        var groups = groupRows(payload, rows, 'day');
+        var days = groups.names.slice().sort(function (a, b) {
+            return groups.rows[b].length - groups.rows[a].length;
+        });
+        var order = DAY_ORDER.concat(groups.names.filter(function (day) {
+            return DAY_ORDER.indexOf(day) < 0;
+        }));
+        return figure(payload, [{
+            type: 'pie', labels: days,
+            values: days.map(function (day) { return groups.rows[day].length; }),
+            marker: {colors: days.map(function (day) {
+                return PALETTE[order.indexOf(day) % PALETTE.length];
+            })},
+            textposition: 'inside', textinfo: 'percent+label',
+            hovertemplate: 'day=%{label}<br>count=%{value}<extra></extra>'
+        }], {
+            title: {text: 'Distribution by Day of Week'}, legend: {tracegroupgap: 0}
+        });
+    }
+
+    function tipVsBillScatter(payload, rows) {
+        var cols = columns(payload);
+        var groups = groupRows(payload, rows, 'time');
+        var type = rows.length > payload.options.webgl_threshold ? 'scattergl' : 'scatter';
+        var data = [];
+        groups.names.forEach(function (time, i) {
+            var color = PALETTE[i % PALETTE.length];
+            var group = groups.rows[time];
+            data.push({type: type, mode: 'markers', name: time, legendgroup: time,
+                       x: pick(cols.total_bill, group), y: pick(cols.tip, group),
+                       marker: {color: color, symbol: 'circle'},
+                       hovertemplate: 'time=' + time + '<br>Total Bill ($)=%{x}<br>' +
+                                      'Tip Amount ($)=%{y}<extra></extra>'});
+            // Линия тренда: ewm(span=10) по точкам, упорядоченным по сумме счета
+            var ordered = group.slice().sort(function (a, b) {
+                return cols.total_bill[a] - cols.total_bill[b];
+            });
+            data.push({type: type, mode: 'lines', name: time, legendgroup: time,
+                       x: pick(cols.total_bill, ordered),
+                       y: ewmMean(pick(cols.tip, ordered), 10),
+                       line: {color: color}, showlegend: false,
+                       hovertemplate: '<b>EWM trend</b><br>time=' + time +
+                                      '<br>Total Bill ($)=%{x}<br>Tip Amount ($)=%{y} ' +
+                                      '<b>(trend)</b><extra></extra>'});
+        });
+        return figure(payload, data, {
+            title: {text: 'Tip Amount vs Total Bill'}, legend: {title: {text: 'Time of Day'}},
+            xaxis: {title: {text: 'Total Bill ($)'}}, yaxis: {title: {text: 'Tip Amount ($)'}}
+        });
+    }
+
+    function groupTipMeans(payload, rows, name) {
+        var cols = columns(payload);
+        var groups = groupRows(payload, rows, name);
+        var result = {};
+        groups.names.forEach(function (group) {
+            result[group] = round2(mean(pick(cols.tip, groups.rows[group])));
+        });
+        return result;
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        tips: {
+            toggleDisplay: function (graphType) {
+                var shown = {display: 'block'};
+                var hidden = {display: 'none'};
+                if (graphType === 'data_table') {
+                    return [hidden, shown, shown];
+                }
+                return [shown, hidden, hidden];
+            },
+
+            // Значение слайдера после отпускания применяется сразу,
+            // при перетаскивании - если за delay мс не было новых изменений
+            debounceRange: function (value, dragValue, delay) {
+                var change = ++rangeChanges;
+                var triggered = window.dash_clientside.callback_context.triggered.map(function (item) {
+                    return item.prop_id;
+                });
+                if (triggered.indexOf('bill-range.drag_value') < 0 ||
+                        triggered.indexOf('bill-range.value') >= 0 || !dragValue) {
+                    return emitRange(value);
+                }
+                return new Promise(function (resolve) {
+                    setTimeout(function () {
+                        resolve(change === rangeChanges ? emitRange(dragValue)
+                                                        : window.dash_clientside.no_update);
+                    }, delay);
+                });
+            },
+
+            // Страница таблицы приходит с сервера в колоночном виде
+            tableRecords: function (page) {
+                if (!page) {
+                    return [];
+                }
+                var records = [];
+                var count = page.columns.length ? page.data[page.columns[0]].length : 0;
+                for (var i = 0; i < count; i++) {
+                    var record = {};
+                    page.columns.forEach(function (name) {
+                        record[name] = page.data[name][i];
+                    });
+                    records.push(record);
+                }
+                return records;
+            },
+
+            // Ссылки выгрузки с текущими фильтрами, колонками и filter_query таблицы
+            exportLinks: function (day, gender, time, smoker, billRange, selectedColumns, filterQuery) {
+                var params = [['day', day], ['gender', gender], ['time', time], ['smoker', smoker],
+                              ['bill_min', billRange[0]], ['bill_max', billRange[1]],
+                              ['columns', (selectedColumns || []).join(',')],
+                              ['filter_query', filterQuery || '']];
+                var query = params.map(function (param) {
+                    return param[0] + '=' + encodeURIComponent(param[1]);
+                }).join('&');
+                return ['/export.csv?' + query, '/export.parquet?' + query];
+            },
+
+            updateGraph: function (day, graphType, gender, time, smoker, billRange, payload) {
+                if (graphType === 'data_table' || !payload) {
+                    return window.dash_clientside.no_update;
+                }
+                var rows = selectRows(payload, day, gender, time, smoker, billRange);
+                switch (graphType) {
+                    case 'tips':
+                        return tipDistribution(payload, rows, day);
+                    case 'total_bill':
+                        return totalBillDistribution(payload, rows, day);
+                    case 'time_boxplot':
+                        return timeBoxplot(payload, rows);
+                    case 'day_pie':
+                        return dayPieChart(payload, rows);
+                    case 'bill_scatter':
+                        return tipVsBillScatter(payload, rows);
+                    default:
+                        return null;
+                }
+            },
+
+            updateTable: function (day, gender, time, smoker, billRange, selected, payload) {
+                if (!payload) {
+                    return window.dash_clientside.no_update;
+                }
+                var cols = columns(payload);
+                var rows = selectRows(payload, day, gender, time, smoker, billRange);
+                var names = payload.columns.filter(function (name) {
+                    return selected.indexOf(name) >= 0;
+                });
+                var tableColumns = names.map(function (name) {
+                    var numeric = payload.data[name].kind !== 'category';
+                    return {name: name, id: name, type: numeric ? 'numeric' : 'text'};
+                });
+                var records = rows.map(function (row) {
+                    var record = {};
+                    names.forEach(function (name) {
+                        record[name] = value(payload, cols, name, row);
+                    });
+                    return record;
+                });
+                return [tableColumns, records];
+            },
+
+            updateStats: function (day, gender, time, smoker, billRange, payload, slots) {
+                if (!payload) {
+                    return window.dash_clientside.no_update;
+                }
+                var cols = columns(payload);
+                var rows = selectRows(payload, day, gender, time, smoker, billRange);
+                var bills = pick(cols.total_bill, rows);
+                var tips = pick(cols.tip, rows);
+                var percentages = rows.map(function (row) {
+                    return cols.tip[row] / cols.total_bill[row] * 100;
+                });
+
+                var groups = {};
+                ['sex', 'day', 'time'].forEach(function (name) {
+                    groups[name] = groupTipMeans(payload, rows, name);
+                });
+                var texts = [], styles = [];
+                slots.forEach(function (slot) {
+                    var tip = groups[slot.group][slot.value];
+                    if (tip === undefined) {
+                        texts.push('');
+                        styles.push({display: 'none'});
+                    } else {
+                        texts.push('$' + fixed(tip, 2) + ' чаевых');
+                        styles.push({});
+                    }
+                });
+
+                return [
+                    String(rows.length),
+                    '$' + fixed(mean(bills), 2),
+                    '$' + fixed(mean(tips), 2),
+                    fixed(mean(percentages), 1) + '% от счета',
+                    fixed(mean(pick(cols.size, rows)), 1),
+                    texts,
+                    styles
+                ];
+            },
+
+            // Число строк для вариантов каждого фильтра при остальных активных фильтрах:
+            // один проход по строкам в диапазоне счета, затем суммы по ячейкам
+            updateFacets: function (day, gender, time, smoker, billRange, payload, baseOptions) {
+                var names = ['day', 'sex', 'time', 'smoker'];
+                if (!payload) {
+                    return names.map(function () { return window.dash_clientside.no_update; });
+                }
+                var cols = columns(payload);
+                var selected = [day, gender, time, smoker];
+                var categories = names.map(function (name) { return payload.data[name].categories; });
+                var sizes = categories.map(function (values) { return values.length; });
+                var nCells = sizes.reduce(function (a, b) { return a * b; }, 1);
+
+                var counts = new Float64Array(nCells);
+                var bills = cols.total_bill;
+                for (var i = 0; i < payload.rows; i++) {
+                    if (bills[i] < billRange[0] || bills[i] > billRange[1]) {
+                        continue;
+                    }
+                    var cell = 0;
+                    for (var a = 0; a < names.length; a++) {
+                        var code = cols[names[a]][i];
+                        if (code < 0) {
+                            cell = -1;
+                            break;
+                        }
+                        cell = cell * sizes[a] + code;
+                    }
+                    if (cell >= 0) {
+                        counts[cell]++;
+                    }
+                }
+
+                // Для каждой ячейки: проходит ли она фильтр по каждой из осей
+                var facets = sizes.map(function (size) { return new Float64Array(size); });
+                var codes = new Array(names.length);
+                for (var c = 0; c < nCells; c++) {
+                    if (!counts[c]) {
+                        continue;
+                    }
+                    var rest = c;
+                    for (var b = names.length - 1; b >= 0; b--) {
+                        codes[b] = rest % sizes[b];
+                        rest = Math.floor(rest / sizes[b]);
+                    }
+                    var failed = [];
+                    for (var d = 0; d < names.length; d++) {
+                        if (selected[d] !== 'All' && categories[d][codes[d]] !== selected[d]) {
+                            failed.push(d);
+                        }
+                    }
+                    for (var axis = 0; axis < names.length; axis++) {
+                        if (!failed.length || (failed.length === 1 && failed[0] === axis)) {
+                            facets[axis][codes[axis]] += counts[c];
+                        }
+                    }
+                }
+
+                return names.map(function (name, axis) {
+                    var total = facets[axis].reduce(function (a, b) { return a + b; }, 0);
+                    return baseOptions[name].map(function (option) {
+                        var index = categories[axis].indexOf(option.value);
+                        var count = option.value === 'All' ? total : (index < 0 ? 0 : facets[axis][index]);
+                        return {label: option.label + ' (' + count.toLocaleString('en-US') + ')',
+                                value: option.value,
+                                disabled: count === 0 && option.value !== 'All' && option.value !== selected[axis]};
+                    });
+                });
+            }
+        }
+    });
+})();
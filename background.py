@@ -0,0 +1,141 @@
+import itertools
+import logging
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar, copy_context
+
+# Закрытые модули Dash: контекст callback'а в потоке задачи восстанавливается так же,
+# как в менеджерах самого Dash. Они меняются между версиями - менеджер проверен
+# с dash==2.14.2 из requirements
+from dash._callback_context import context_value
+from dash._utils import AttributeDict
+from dash.exceptions import PreventUpdate
+from dash.long_callback.managers import BaseLongCallbackManager
+
+from metrics import background_callback
+
+logger = logging.getLogger(__name__)
+
+# Флаг отмены фоновой задачи, в которой выполняется callback (None - обычный запрос)
+job_cancel = ContextVar('job_cancel', default=None)
+
+
+class JobCancelled(Exception):
+    """
+    Браузер отменил задачу новым запросом того же callback'а
+    """
+
+
+def check_cancelled():
+    """
+    Прерывает фоновую задачу, если ее отменили. Вызывается между этапами долгих вычислений
+    """
+    cancel = job_cancel.get()
+    if cancel is not None and cancel.is_set():
+        raise JobCancelled()
+
+
+class ThreadPoolManager(BaseLongCallbackManager):
+    """
+    Менеджер фоновых callback'ов Dash на локальном пуле потоков.
+
+    Данные и кэши остаются общими с процессом сервера, поэтому задаче не нужно
+    ничего сериализовать. Результат хранится по номеру задачи, так что одинаковые
+    запросы разных сессий не мешают друг другу. Когда браузер отправляет новый
+    запрос того же callback'а, Dash передает номер предыдущей задачи (oldJob):
+    еще не начатая задача снимается с очереди, у выполняемой выставляется флаг
+    отмены - callback прерывается на ближайшей проверке check_cancelled, а результат
+    отбрасывается. Пул работает внутри одного процесса
+    """
+
+    def __init__(self, max_workers=4, max_results=256):
+        self.max_results = max_results
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='callback')
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.jobs = {}
+        self.results = {}
+        self.cancel_flags = {}
+        super().__init__(cache_by=None)
+
+    def make_job_fn(self, fn, progress, key=None):
+        def job_fn(job, args, context):
+            def run():
+                context_value.set(AttributeDict(**context))
+                background_callback.set(fn.__name__)
+                job_cancel.set(cancel)
+                try:
+                    if isinstance(args, dict):
+                        return fn(**args)
+                    return fn(*args)
+                except (PreventUpdate, JobCancelled):
+                    return {'_dash_no_update': '_dash_no_update'}
+                except Exception as error:
+                    # Любая ошибка callback'а должна дойти до браузера, иначе он будет опрашивать
+                    # результат бесконечно; в журнал сервера она тоже пишется
+                    logger.error("Background callback %s error", fn.__name__, exc_info=True)
+                    return {'long_callback_error': {'msg': str(error), 'tb': traceback.format_exc()}}
+
+            with self._lock:
+                cancel = self.cancel_flags.get(job)
+            # Задачу отменили, пока она ждала в очереди
+            if cancel is None or cancel.is_set():
+                return
+            result = copy_context().run(run)
+            with self._lock:
+                self.cancel_flags.pop(job, None)
+                if job in self.jobs:
+                    self.results[job] = result
+                # Результаты задач, которые браузер так и не забрал, не копятся бесконечно
+                while len(self.results) > self.max_results:
+                    oldest = next(iter(self.results))
+                    del self.results[oldest]
+                    self.jobs.pop(oldest, None)
+        return job_fn
+
+    def call_job_fn(self, key, job_fn, args, context):
+        job = str(next(self._ids))
+        with self._lock:
+            self.cancel_flags[job] = threading.Event()
+            self.jobs[job] = self.executor.submit(job_fn, job, args, context)
+        return job
+
+    def terminate_job(self, job):
+        with self._lock:
+            future = self.jobs.pop(str(job), None)
+            self.results.pop(str(job), None)
+            cancel = self.cancel_flags.pop(str(job), None)
+        if cancel is not None:
+            cancel.set()
+        if future is not None:
+            future.cancel()
+
+    def terminate_unhealthy_job(self, job):
+        return False
+
+    def job_running(self, job):
+        with self._lock:
+            future = self.jobs.get(str(job))
+        return future is not None and not future.done()
+
+    def get_progress(self, key):
+        return None
+
+    def result_ready(self, key):
+        return False
+
+    def get_result(self, key, job):
+        with self._lock:
+            if str(job) not in self.results:
+                return self.UNDEFINED
+            result = self.results.pop(str(job))
+            self.jobs.pop(str(job), None)
+        return result
+
+    def clear_cache_entry(self, key):
+        pass
+
+    def build_cache_key(self, fn, args, cache_args_to_ignore):
+        # Результаты не кэшируются между запросами: за это отвечает кэш фигур
+        return 'job'
@@ -0,0 +1,177 @@
+"""
+Бенчмарк функций фильтрации, статистики и графиков на синтетических данных.
+
+    python benchmark.py --sizes 1e3 1e4 1e5 1e6 --output results.json
+    python benchmark.py --sizes 1e6 --compare results.json
+
+Для каждого размера данных и каждого набора фильтров измеряются время
+(min/median/mean по повторам) и пиковый объем выделенной памяти (tracemalloc).
+Результаты сохраняются в JSON; с --compare печатаются функции, замедлившиеся
+больше допустимого порога относительно предыдущего запуска
+"""
+import argparse
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import plotly
+
+import config
+import main
+from dataset import TipsDataset
+from graphfunc import (print_tip_distribution, print_total_bill_distribution, print_time_boxplot,
+                       print_day_pie_chart, print_tip_vs_bill_scatter, calculate_statistics,
+                       create_interactive_stats)
+from synthdata import generate_tips
+
+DEFAULT_SIZES = (10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6)
+
+# Наборы фильтров: (название, day, gender, time, smoker, диапазон счета или None - весь)
+FILTER_GRID = (
+    ('all', 'All', 'All', 'All', 'All', None),
+    ('day', 'Sat', 'All', 'All', 'All', None),
+    ('gender_time', 'All', 'Female', 'Dinner', 'All', None),
+    ('all_categories', 'Sun', 'Male', 'Dinner', 'No', None),
+    ('bill_range', 'All', 'All', 'All', 'All', (10.0, 30.0)),
+    ('narrow', 'Thur', 'Female', 'Lunch', 'Yes', (15.0, 20.0)),
+)
+
+
+def measure(function, repeat):
+    """
+    Время каждого повтора и пик памяти одного вызова
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return timings, peak
+
+
+def filtered_apply(snapshot, key):
+    # Без кэша фильтрации: измеряется сам выбор строк
+    main.filter_cache.clear()
+    return main.apply_filters(snapshot, *key)
+
+
+def benchmark_functions(snapshot, key, filtered):
+    """
+    Измеряемые функции для одного набора фильтров
+    """
+    day = key[0]
+    return {
+        'apply_filters': lambda: filtered_apply(snapshot, key),
+        'cube_statistics': lambda: snapshot.statistics(*key),
+        'calculate_statistics': lambda: calculate_statistics(filtered),
+        'create_interactive_stats': lambda: create_interactive_stats(filtered),
+        'print_tip_distribution': lambda: print_tip_distribution(filtered, day),
+        'print_total_bill_distribution': lambda: print_total_bill_distribution(filtered, day),
+        'print_time_boxplot': lambda: print_time_boxplot(filtered),
+        'print_day_pie_chart': lambda: print_day_pie_chart(filtered),
+        'print_tip_vs_bill_scatter': lambda: print_tip_vs_bill_scatter(
+            filtered, webgl_threshold=config.SCATTER_WEBGL_THRESHOLD,
+            density_threshold=config.SCATTER_DENSITY_THRESHOLD),
+    }
+
+
+def run(sizes, repeat=3, functions=None, seed=0, log=print):
+    results = []
+    for n_rows in sizes:
+        dataFrame = generate_tips(n_rows, seed=seed)
+        start = time.perf_counter()
+        snapshot = TipsDataset(dataFrame, bucket_width=config.STATS_BUCKET_WIDTH).snapshot
+        log(f"{n_rows} rows: index and cube built in {time.perf_counter() - start:.3f}s")
+
+        for name, day, gender, time_of_day, smoker, bill_range in FILTER_GRID:
+            key = (day, gender, time_of_day, smoker, bill_range or snapshot.bill_range)
+            filtered = filtered_apply(snapshot, key)
+            for function_name, function in benchmark_functions(snapshot, key, filtered).items():
+                if functions and function_name not in functions:
+                    continue
+                # Пустая выборка - не ошибка, но не все функции ее поддерживают
+                try:
+                    timings, peak = measure(function, repeat)
+                except (ValueError, IndexError, KeyError) as error:
+                    log(f"  {function_name} [{name}]: skipped ({error})")
+                    continue
+                results.append({
+                    'function': function_name,
+                    'rows': n_rows,
+                    'filters': name,
+                    'filtered_rows': len(filtered),
+                    'repeat': repeat,
+                    'min_s': min(timings),
+                    'median_s': statistics.median(timings),
+                    'mean_s': statistics.fmean(timings),
+                    'peak_bytes': peak,
+                })
+                log(f"  {function_name} [{name}, {len(filtered)} rows]: "
+                    f"{statistics.median(timings) * 1000:.2f} ms, {peak / 2 ** 20:.1f} MiB")
+    return results
+
+
+def environment():
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'plotly': plotly.__version__,
+    }
+
+
+def compare(results, baseline, threshold=1.2):
+    """
+    Сравнивает медианы времени с предыдущим запуском, возвращает замедления больше порога
+    """
+    previous = {(item['function'], item['rows'], item['filters']): item for item in baseline['results']}
+    regressions = []
+    for item in results:
+        old = previous.get((item['function'], item['rows'], item['filters']))
+        if old and old['median_s'] > 0:
+            ratio = item['median_s'] / old['median_s']
+            if ratio > threshold:
+                regressions.append(dict(item, baseline_median_s=old['median_s'], ratio=ratio))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Tips dashboard micro-benchmarks')
+    parser.add_argument('--sizes', type=float, nargs='+', default=DEFAULT_SIZES,
+                        help='размеры синтетических данных, например 1e3 1e5 1e7')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--functions', nargs='*', help='измерять только эти функции')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', help='JSON предыдущего запуска для поиска регрессий')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='допустимое замедление относительно предыдущего запуска')
+    args = parser.parse_args()
+
+    results = run([int(size) for size in args.sizes], args.repeat, args.functions, args.seed)
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump({'environment': environment(), 'results': results}, file, indent=2)
+    print(f"{len(results)} measurements saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        for item in regressions:
+            print(f"REGRESSION {item['function']} [{item['rows']} rows, {item['filters']}]: "
+                  f"{item['baseline_median_s'] * 1000:.2f} -> {item['median_s'] * 1000:.2f} ms "
+                  f"(x{item['ratio']:.2f})")
+        if regressions:
+            raise SystemExit(1)
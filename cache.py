@@ -0,0 +1,96 @@
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Потокобезопасный LRU-кэш с ограниченным размером и счетчиками попаданий/промахов.
+    Если задан maxbytes, вытеснение идет также по суммарному размеру значений (sizeof, по умолчанию len)
+    """
+
+    def __init__(self, maxsize=32, maxbytes=None, sizeof=len):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.sizeof = sizeof
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        # Ключи, которые сейчас вычисляются в других потоках
+        self._pending = {}
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self._lock:
+            if key in self._data:
+                self.nbytes -= self._sizeof(self._data[key])
+            self._data[key] = value
+            self._data.move_to_end(key)
+            self.nbytes += self._sizeof(value)
+            # Вытеснение самых давно использованных записей
+            while len(self._data) > self.maxsize or (
+                    self.maxbytes is not None and self.nbytes > self.maxbytes and len(self._data) > 1):
+                _, evicted = self._data.popitem(last=False)
+                self.nbytes -= self._sizeof(evicted)
+
+    def _sizeof(self, value):
+        return self.sizeof(value) if self.maxbytes is not None else 0
+
+    def get_or_compute(self, key, compute):
+        """
+        Возвращает значение из кэша или вычисляет и сохраняет его.
+        Параллельные запросы одного ключа ждут единственного вычисления.
+        """
+        while True:
+            with self._lock:
+                if key in self._data:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return self._data[key]
+                event = self._pending.get(key)
+                if event is None:
+                    self.misses += 1
+                    event = self._pending[key] = threading.Event()
+                    break
+            # Ключ уже вычисляется - ждем результат и проверяем кэш снова
+            event.wait()
+
+        try:
+            value = compute()
+            self.put(key, value)
+            return value
+        finally:
+            with self._lock:
+                del self._pending[key]
+            event.set()
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'size': len(self._data), 'maxsize': self.maxsize,
+                    'nbytes': self.nbytes, 'maxbytes': self.maxbytes}
+
+    def __len__(self):
+        return len(self._data)
+
+
+def filter_key(day, gender, time, smoker, bill_range):
+    """
+    Нормализует состояние фильтров в хешируемый ключ кэша
+    """
+    return (day or 'All', gender or 'All', time or 'All', smoker or 'All',
+            (float(bill_range[0]), float(bill_range[1])))
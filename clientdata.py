@@ -0,0 +1,51 @@
+import base64
+
+import numpy as np
+import pandas as pd
+import plotly.io as pio
+
+# Денежные колонки передаются в центах (int32), чтобы значения оставались точными
+MONEY_COLUMNS = ('total_bill', 'tip')
+
+
+def encode_array(array, dtype):
+    """
+    Кодирует массив в base64 little-endian, на клиенте он читается как typed array
+    """
+    array = np.ascontiguousarray(array, dtype=np.dtype(dtype).newbyteorder('<'))
+    return base64.b64encode(array.tobytes()).decode('ascii')
+
+
+def encode_column(series):
+    """
+    Описание одной колонки для клиента: категории кодами, деньги в центах, целые как есть
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype) or series.dtype == object:
+        categorical = pd.Categorical(series)
+        dtype = 'int8' if len(categorical.categories) < 128 else 'int32'
+        return {'kind': 'category', 'dtype': dtype,
+                'categories': categorical.categories.tolist(),
+                'data': encode_array(categorical.codes, dtype)}
+    if series.name in MONEY_COLUMNS:
+        cents = np.round(series.to_numpy(dtype=float) * 100)
+        return {'kind': 'cents', 'dtype': 'int32', 'data': encode_array(cents, 'int32')}
+    if series.dtype.kind in 'iu':
+        return {'kind': 'number', 'dtype': 'int32', 'data': encode_array(series.to_numpy(), 'int32')}
+    return {'kind': 'number', 'dtype': 'float64', 'data': encode_array(series.to_numpy(), 'float64')}
+
+
+def client_payload(snapshot, webgl_threshold=5000):
+    """
+    Компактный колоночный набор данных, который отправляется в браузер один раз.
+    Вместе с ним передается шаблон plotly, чтобы графики на клиенте выглядели так же
+    """
+    dataFrame = snapshot.df
+    template = pio.templates[pio.templates.default].to_plotly_json()
+    return {
+        'version': snapshot.version,
+        'rows': len(dataFrame),
+        'columns': snapshot.columns,
+        'data': {column: encode_column(dataFrame[column]) for column in dataFrame.columns},
+        'template': template,
+        'options': {'webgl_threshold': webgl_threshold},
+    }
@@ -0,0 +1,78 @@
+import os
+
+# Настройки дашборда, переопределяются через переменные окружения
+
+# Путь к CSV с данными о чаевых; колоночный кэш строится рядом, в .tipscache
+DATA_PATH = os.environ.get('TIPS_DATA_PATH', 'tips.csv')
+
+# Количество наборов фильтров, для которых хранится отфильтрованный результат,
+# и суммарный размер хранимых позиций строк в байтах (8 байт на строку)
+FILTER_CACHE_SIZE = int(os.environ.get('TIPS_FILTER_CACHE_SIZE', 32))
+FILTER_CACHE_MAXBYTES = int(os.environ.get('TIPS_FILTER_CACHE_MAXBYTES', 128 * 1024 * 1024))
+
+# Ширина корзины total_bill в кубе статистики, $
+STATS_BUCKET_WIDTH = float(os.environ.get('TIPS_STATS_BUCKET_WIDTH', 1.0))
+
+# Кэш фигур: число записей и примерный суммарный размер в байтах
+FIGURE_CACHE_SIZE = int(os.environ.get('TIPS_FIGURE_CACHE_SIZE', 256))
+FIGURE_CACHE_MAXBYTES = int(os.environ.get('TIPS_FIGURE_CACHE_MAXBYTES', 64 * 1024 * 1024))
+
+# Построить графики для состояния без фильтров при запуске
+PREWARM_FIGURES = os.environ.get('TIPS_PREWARM_FIGURES', '0') == '1'
+
+# Пороги числа точек для scatter: WebGL-маркеры и серверная тепловая карта плотности
+SCATTER_WEBGL_THRESHOLD = int(os.environ.get('TIPS_SCATTER_WEBGL_THRESHOLD', 5000))
+SCATTER_DENSITY_THRESHOLD = int(os.environ.get('TIPS_SCATTER_DENSITY_THRESHOLD', 200000))
+
+# Живое обновление: слежение за дописыванием CSV и период опроса, с
+LIVE_TAIL = os.environ.get('TIPS_LIVE_TAIL', '0') == '1'
+LIVE_TAIL_INTERVAL = float(os.environ.get('TIPS_LIVE_TAIL_INTERVAL', 2.0))
+
+# Период проверки новой версии данных открытыми дашбордами, с (0 - не проверять)
+LIVE_REFRESH_SECONDS = float(os.environ.get('TIPS_LIVE_REFRESH_SECONDS', 10))
+
+# Клиентский режим: данные отправляются в браузер один раз, фильтрация и графики
+# считаются там. auto - включается, если строк не больше TIPS_CLIENTSIDE_MAX_ROWS
+CLIENTSIDE_MODE = os.environ.get('TIPS_CLIENTSIDE', 'auto')
+CLIENTSIDE_MAX_ROWS = int(os.environ.get('TIPS_CLIENTSIDE_MAX_ROWS', 20000))
+
+# Production-запуск (serve.py): число рабочих процессов и адрес
+WORKERS = int(os.environ.get('TIPS_WORKERS', os.cpu_count() or 1))
+BIND = os.environ.get('TIPS_BIND', '0.0.0.0:8050')
+
+# Замеры времени callback'ов: заголовок Server-Timing и локальный GET /metrics
+METRICS = os.environ.get('TIPS_METRICS', '1') == '1'
+
+# Знаков после запятой у дробных чисел в данных графиков и таблицы (< 0 - не округлять)
+FLOAT_DECIMALS = int(os.environ.get('TIPS_FLOAT_DECIMALS', 2))
+
+# Сжатие ответов brotli/gzip: включение, минимальный размер ответа в байтах и уровень
+COMPRESS = os.environ.get('TIPS_COMPRESS', '1') == '1'
+COMPRESS_MIN_SIZE = int(os.environ.get('TIPS_COMPRESS_MIN_SIZE', 1024))
+COMPRESS_LEVEL = int(os.environ.get('TIPS_COMPRESS_LEVEL', 5))
+
+# Пауза при перетаскивании слайдера счета, после которой обновляются данные, мс
+SLIDER_DEBOUNCE_MS = int(os.environ.get('TIPS_SLIDER_DEBOUNCE_MS', 250))
+
+# Графики строятся фоновыми callback'ами на пуле потоков процесса (выключено по умолчанию:
+# каждый график ждет хотя бы один период опроса); число потоков и период опроса браузером, мс
+BACKGROUND_CALLBACKS = os.environ.get('TIPS_BACKGROUND_CALLBACKS', '0') == '1'
+BACKGROUND_WORKERS = int(os.environ.get('TIPS_BACKGROUND_WORKERS', 4))
+BACKGROUND_POLL_MS = int(os.environ.get('TIPS_BACKGROUND_POLL_MS', 100))
+
+# Число процессов для параллельного расчета статистики по частям набора данных
+# (TIPS_DATA_PATH - каталог с CSV-частями) на весь сервер: serve.py делит его
+# между рабочими процессами; 1 - считать в процессе сервера
+PARTITION_PROCESSES = int(os.environ.get('TIPS_PARTITION_PROCESSES', os.cpu_count() or 1))
+
+# Таблица с данными, если TIPS_DATA_PATH - файл SQLite (.db, .sqlite) или DuckDB (.duckdb)
+SQL_TABLE = os.environ.get('TIPS_SQL_TABLE', 'tips')
+
+# Приближенный режим для очень больших наборов данных (только серверный режим): графики
+# и статистика с доверительными интервалами считаются по стратифицированной выборке -
+# не больше TIPS_SAMPLE_CELL_ROWS строк на ячейку (day, sex, time, smoker)
+SAMPLING = os.environ.get('TIPS_SAMPLING', '0') == '1'
+SAMPLE_CELL_ROWS = int(os.environ.get('TIPS_SAMPLE_CELL_ROWS', 5000))
+
+# Размер порции строк при потоковой выгрузке /export.csv и /export.parquet
+EXPORT_CHUNK_ROWS = int(os.environ.get('TIPS_EXPORT_CHUNK_ROWS', 50000))
@@ -0,0 +1,242 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from datastore import CATEGORICAL_COLUMNS, NUMERIC_DTYPES
+from filterindex import FilterIndex
+from statcube import StatsCube, M
+
+# Дописанные строки сливаются с основной частью таблицы, когда их становится
+# не меньше 1/DELTA_FRACTION от нее
+DELTA_FRACTION = 8
+
+
+class AppendedIndex:
+    """
+    Индекс таблицы, дополненной на лету: основная часть (base) со своим индексом
+    не копируется, дописанные строки копятся в небольшой части (delta) с отдельным
+    индексом. Интерфейс - как у FilterIndex, позиции строк сквозные по обеим частям
+    """
+
+    def __init__(self, base, delta):
+        self.base = base
+        self.delta = delta
+        self.n_rows = base.n_rows + delta.n_rows
+        self._df = None
+
+    @property
+    def df(self):
+        # Таблица целиком собирается только по запросу (клиентский режим небольших наборов)
+        if self._df is None:
+            self._df = concat_rows(self.base.df, self.delta.df)
+        return self._df
+
+    def bill_bounds(self):
+        bounds = [part.bill_bounds() for part in (self.base, self.delta)]
+        bounds = [bound for bound in bounds if bound is not None]
+        if not bounds:
+            return None
+        return min(low for low, _ in bounds), max(high for _, high in bounds)
+
+    def select(self, day, gender, time, smoker, bill_range, side='right'):
+        filters = (day, gender, time, smoker, bill_range, side)
+        return np.concatenate([self.base.select(*filters), self.delta.select(*filters) + self.base.n_rows])
+
+    def take(self, rows, columns=None):
+        cut = np.searchsorted(rows, self.base.n_rows)
+        if cut == len(rows):
+            return self.base.take(rows, columns)
+        if cut == 0:
+            return self.delta.take(rows - self.base.n_rows, columns)
+        return concat_rows(*self.take_parts(rows, columns))
+
+    def take_parts(self, rows, columns=None):
+        # Строки основной части и дописанные строки отдельными таблицами, без склейки
+        cut = np.searchsorted(rows, self.base.n_rows)
+        if cut:
+            yield self.base.take(rows[:cut], columns)
+        if cut < len(rows):
+            yield self.delta.take(rows[cut:] - self.base.n_rows, columns)
+
+    def slice_rows(self, start, stop):
+        n = self.base.n_rows
+        if start >= n:
+            return self.delta.slice_rows(start - n, stop - n)
+        if stop <= n:
+            return self.base.slice_rows(start, stop)
+        return concat_rows(self.base.slice_rows(start, n), self.delta.slice_rows(0, stop - n))
+
+    def filter(self, day, gender, time, smoker, bill_range):
+        return self.take(self.select(day, gender, time, smoker, bill_range))
+
+
+def append_index(index, rows):
+    """
+    Индекс с новыми строками в конце. Строки дописываются в часть delta, пакет
+    стоит O(размер delta). Когда delta дорастает до 1/DELTA_FRACTION основной части,
+    части сливаются за O(N) - в среднем O(DELTA_FRACTION) на дописанную строку.
+    Основная часть до слияния остается отображенной из кэша или разделяемой памяти
+    """
+    if isinstance(index, AppendedIndex):
+        base = index.base
+        delta = index.delta.extend(concat_rows(index.delta.df, rows))
+    else:
+        base = index
+        delta = FilterIndex(concat_rows(base.df.iloc[:0], rows))
+    if delta.n_rows * DELTA_FRACTION >= base.n_rows:
+        return base.extend(concat_rows(base.df, delta.df))
+    return AppendedIndex(base, delta)
+
+
+class DataSnapshot:
+    """
+    Неизменяемый срез данных: индекс фильтрации (с таблицей) и куб статистики
+    одной версии. Callback берет срез один раз и работает с ним до конца
+    """
+
+    def __init__(self, index, cube):
+        self.index = index
+        self.cube = cube
+
+    @property
+    def df(self):
+        return self.index.df
+
+    @property
+    def version(self):
+        # Таблица только дополняется, поэтому версия - число строк: рабочие процессы,
+        # прочитавшие одни и те же строки, сообщают браузеру одну и ту же версию
+        return self.index.n_rows
+
+    @property
+    def columns(self):
+        return self.index.slice_rows(0, 0).columns.tolist()
+
+    @property
+    def n_rows(self):
+        return self.index.n_rows
+
+    @property
+    def categories(self):
+        return self.cube.categories
+
+    @property
+    def bill_range(self):
+        """
+        Минимальный и максимальный счет - крайние элементы отсортированного индекса
+        """
+        bounds = self.index.bill_bounds()
+        return bounds if bounds is not None else (0.0, 0.0)
+
+    def filter(self, day, gender, time, smoker, bill_range):
+        return self.index.filter(day, gender, time, smoker, bill_range)
+
+    def select(self, day, gender, time, smoker, bill_range):
+        # Позиции подходящих строк - их можно хранить в кэше вместо копий таблицы
+        return self.index.select(day, gender, time, smoker, bill_range)
+
+    def take(self, rows, columns=None):
+        return self.index.take(rows, columns)
+
+    def filter_chunks(self, day, gender, time, smoker, bill_range, rows=50000):
+        """
+        Отфильтрованные строки порциями по rows, в исходном порядке.
+        Всегда отдает хотя бы одну (возможно, пустую) порцию - с колонками и типами
+        """
+        positions = self.index.select(day, gender, time, smoker, bill_range)
+        yield self.index.take(positions[:rows])
+        for start in range(rows, len(positions), rows):
+            yield self.index.take(positions[start:start + rows])
+
+    def chunks(self, rows=1000000, start=0):
+        # Таблица порциями с позиции start - для проходов по всем строкам (например, построения выборки)
+        for first in range(start, self.n_rows, rows):
+            yield self.index.slice_rows(first, min(first + rows, self.n_rows))
+
+    def statistics(self, day, gender, time, smoker, bill_range):
+        return self.cube.statistics(day, gender, time, smoker, bill_range)
+
+    def cell_counts(self, bill_range):
+        # Число строк по ячейкам в диапазоне счета - для счетчиков вариантов фильтров
+        return self.cube.cells('All', 'All', 'All', 'All', bill_range)[0][..., M['count']]
+
+
+class TipsDataset:
+    """
+    Данные о чаевых, которые можно дополнять на лету.
+    Новые строки дописываются в индекс и куб инкрементально, после чего
+    публикуется новый срез с увеличенной версией
+    """
+
+    def __init__(self, dataFrame, bucket_width=1.0):
+        self._lock = threading.Lock()
+        index = FilterIndex(dataFrame)
+        cube = StatsCube(index, bucket_width=bucket_width)
+        self.snapshot = DataSnapshot(index, cube)
+
+    @property
+    def version(self):
+        return self.snapshot.version
+
+    def append(self, rows):
+        """
+        Добавляет строки (DataFrame с колонками исходной таблицы) и возвращает новую версию.
+        Срезы неизменяемы: строки дописываются в небольшую часть таблицы со своим
+        индексом (append_index), куб дополняется только новыми строками
+        """
+        with self._lock:
+            current = self.snapshot
+            rows = normalize_rows(rows, current.index.slice_rows(0, 0))
+            if not len(rows):
+                return current.version
+
+            index = append_index(current.index, rows)
+            cube = current.cube.extend(index, rows)
+            self.snapshot = DataSnapshot(index, cube)
+            return self.snapshot.version
+
+
+def normalize_rows(rows, dataFrame):
+    """
+    Проверяет колонки новых строк и приводит их к типам исходной таблицы.
+    Пропуски и нечисловые значения в числах, пропуски и не строки в категориях
+    отклоняются - иначе они стали бы новыми категориями 'None' и 'nan'
+    """
+    missing = [column for column in dataFrame.columns if column not in rows.columns]
+    if missing:
+        raise ValueError(f"missing columns: {', '.join(missing)}")
+
+    rows = rows[dataFrame.columns.tolist()].reset_index(drop=True)
+    for column, dtype in NUMERIC_DTYPES.items():
+        if column in rows.columns:
+            values = pd.to_numeric(rows[column], errors='raise')
+            invalid = ~np.isfinite(values.to_numpy(dtype=float))
+            if invalid.any():
+                raise ValueError(f"invalid {column} in row {int(np.argmax(invalid))}: {rows[column][invalid].iloc[0]!r}")
+            rows[column] = values.astype(dtype)
+    for column in CATEGORICAL_COLUMNS:
+        if column in rows.columns:
+            invalid = ~rows[column].map(lambda value: isinstance(value, str) and value != '').to_numpy(dtype=bool)
+            if invalid.any():
+                raise ValueError(f"invalid {column} in row {int(np.argmax(invalid))}: {rows[column][invalid].iloc[0]!r}")
+            rows[column] = rows[column].astype(str)
+    return rows
+
+
+def concat_rows(dataFrame, rows):
+    """
+    Дописывает строки в конец таблицы, сохраняя категориальные колонки
+    """
+    rows = rows.copy()
+    columns = {}
+    for column in dataFrame.columns:
+        series = dataFrame[column]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            added = [value for value in pd.unique(rows[column])
+                     if value not in series.cat.categories]
+            if added:
+                series = series.cat.add_categories(added)
+            rows[column] = pd.Categorical(rows[column], categories=series.cat.categories)
+        columns[column] = series
+    return pd.concat([pd.DataFrame(columns), rows], ignore_index=True)
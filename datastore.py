@@ -0,0 +1,175 @@
+import hashlib
+import io
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Типы колонок в колоночном кэше: категории хранятся кодами, числа - компактно.
+# Денежные колонки остаются float64, чтобы суммы совпадали с CSV до цента
+CATEGORICAL_COLUMNS = ('sex', 'smoker', 'day', 'time')
+NUMERIC_DTYPES = {'total_bill': 'float64', 'tip': 'float64', 'size': 'int8'}
+
+META_FILE = 'meta.json'
+
+
+def default_cache_dir(csv_path):
+    """
+    Каталог кэша рядом с CSV: .tipscache/<имя файла>
+    """
+    folder, name = os.path.split(os.path.abspath(csv_path))
+    return os.path.join(folder, '.tipscache', name)
+
+
+def file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_tips_csv(csv_path):
+    """
+    Читает CSV с компактными типами колонок
+    """
+    dtypes = {column: 'category' for column in CATEGORICAL_COLUMNS}
+    dtypes.update(NUMERIC_DTYPES)
+    return pd.read_csv(csv_path, dtype=dtypes)
+
+
+def _write_array(cache_dir, name, array):
+    # Запись через временный файл, чтобы параллельные процессы не читали недописанное
+    path = os.path.join(cache_dir, f'{name}.npy')
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as file:
+        np.save(file, np.ascontiguousarray(array))
+    os.replace(tmp_path, path)
+
+
+def build_column_cache(csv_path, cache_dir=None):
+    """
+    Конвертирует CSV в колоночный бинарный кэш: по .npy файлу на колонку
+    и meta.json с категориями и отпечатком исходного файла
+    """
+    cache_dir = cache_dir or default_cache_dir(csv_path)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # Разбирается ровно прочитанное содержимое, чтобы размер в meta
+    # совпадал с обработанной частью файла, даже если он дописывается
+    stat = os.stat(csv_path)
+    with open(csv_path, 'rb') as file:
+        content = file.read()
+    dataFrame = read_tips_csv(io.BytesIO(content))
+
+    categories = {}
+    for column in dataFrame.columns:
+        series = dataFrame[column]
+        if column in CATEGORICAL_COLUMNS:
+            # Категории сортируются, чтобы порядок кодов совпадал с порядком строк
+            series = series.cat.reorder_categories(sorted(series.cat.categories))
+            categories[column] = series.cat.categories.tolist()
+            codes = series.cat.codes.to_numpy()
+            _write_array(cache_dir, column, codes.astype(np.int8 if len(categories[column]) < 128 else np.int32))
+        else:
+            _write_array(cache_dir, column, series.to_numpy())
+
+    bills = dataFrame['total_bill'].dropna()
+    meta = {
+        'source': os.path.abspath(csv_path),
+        'mtime_ns': stat.st_mtime_ns,
+        'size': len(content),
+        'sha256': hashlib.sha256(content).hexdigest(),
+        'rows': len(dataFrame),
+        'columns': dataFrame.columns.tolist(),
+        # Категории строятся по встречающимся значениям, т.е. это и есть присутствующие в файле
+        'categories': categories,
+        'bill_range': [float(bills.min()), float(bills.max())] if len(bills) else None,
+    }
+    _write_meta(cache_dir, meta)
+    return meta
+
+
+def _write_meta(cache_dir, meta):
+    path = os.path.join(cache_dir, META_FILE)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump(meta, file, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _read_meta(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, META_FILE), encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def cache_is_valid(csv_path, cache_dir, meta):
+    """
+    Кэш действителен, если у CSV не изменились mtime и размер,
+    либо изменился только mtime, а содержимое (sha256) то же самое
+    """
+    if meta is None or 'bill_range' not in meta:
+        return False
+    stat = os.stat(csv_path)
+    if stat.st_mtime_ns == meta['mtime_ns'] and stat.st_size == meta['size']:
+        return True
+    if stat.st_size == meta['size'] and file_hash(csv_path) == meta['sha256']:
+        # Файл переписан без изменений - обновляем только отпечаток времени
+        meta['mtime_ns'] = stat.st_mtime_ns
+        _write_meta(cache_dir, meta)
+        return True
+    return False
+
+
+def load_column_cache(cache_dir, meta, categories=None):
+    """
+    Загружает таблицу из кэша через memory-map: данные не копируются в память
+    процесса, а страницы файлов разделяются между процессами.
+    categories - общий набор категорий, к которому приводятся коды (для частей набора данных)
+    """
+    columns = {}
+    for column in meta['columns']:
+        array = np.load(os.path.join(cache_dir, f'{column}.npy'), mmap_mode='r')
+        if column in meta['categories'] and categories is not None:
+            # Последний элемент переводит код -1 (пропуск) сам в себя
+            remap = np.array([categories[column].index(value) for value in meta['categories'][column]] + [-1])
+            columns[column] = pd.Categorical.from_codes(remap[array], categories=categories[column])
+        elif column in meta['categories']:
+            columns[column] = pd.Categorical.from_codes(array, categories=meta['categories'][column])
+        else:
+            columns[column] = array
+    return pd.DataFrame(columns, copy=False)
+
+
+def ensure_column_cache(csv_path, cache_dir=None):
+    """
+    Возвращает каталог и метаданные актуального колоночного кэша CSV, пересобирая его при необходимости
+    """
+    cache_dir = cache_dir or default_cache_dir(csv_path)
+    meta = _read_meta(cache_dir)
+    if not cache_is_valid(csv_path, cache_dir, meta):
+        meta = build_column_cache(csv_path, cache_dir)
+    return cache_dir, meta
+
+
+def load_tips(csv_path, cache_dir=None, with_meta=False):
+    """
+    Загружает данные о чаевых, при необходимости пересобирая колоночный кэш.
+    С with_meta=True возвращает также метаданные кэша (в том числе размер
+    прочитанного CSV, с которого можно продолжать чтение дописанных строк)
+    """
+    cache_dir, meta = ensure_column_cache(csv_path, cache_dir)
+    dataFrame = load_column_cache(cache_dir, meta)
+    return (dataFrame, meta) if with_meta else dataFrame
+
+
+if __name__ == '__main__':
+    # Предварительная сборка кэша: python datastore.py [tips.csv]
+    path = sys.argv[1] if len(sys.argv) > 1 else 'tips.csv'
+    meta = build_column_cache(path)
+    print(f"{meta['rows']} rows cached in {default_cache_dir(path)}")
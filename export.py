@@ -0,0 +1,188 @@
+import hashlib
+import io
+import re
+
+from flask import Response, jsonify, request
+
+from cache import LRUCache, filter_key
+from tablequery import apply_filter_query
+
+# pyarrow необязателен: без него доступна только выгрузка в CSV
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+EXPORT_MIMETYPES = {'csv': 'text/csv', 'parquet': 'application/vnd.apache.parquet'}
+
+# Один диапазон байт: "bytes=500-", "bytes=500-999" или "bytes=-500" (последние 500 байт)
+BYTE_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class ChunkBuffer(io.RawIOBase):
+    """
+    Файл только для записи: parquet-писатель пишет в него, а накопленные байты
+    забираются после каждой группы строк
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.parts = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def take(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def export_chunks(snapshot, filters, columns, filter_query='', rows=50000):
+    """
+    Строки для выгрузки порциями: те же фильтры, колонки и filter_query, что у update_table
+    """
+    for chunk in snapshot.filter_chunks(*filters, rows=rows):
+        yield apply_filter_query(chunk[columns], filter_query)
+
+
+def csv_stream(chunks):
+    first = True
+    for chunk in chunks:
+        yield chunk.to_csv(index=False, header=first).encode('utf-8')
+        first = False
+
+
+def parquet_stream(chunks):
+    # Каждая порция - отдельная группа строк; схема берется из первой порции
+    buffer = ChunkBuffer()
+    writer = None
+    for chunk in chunks:
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(buffer, table.schema)
+        writer.write_table(table.cast(writer.schema))
+        yield buffer.take()
+    if writer is not None:
+        writer.close()
+    yield buffer.take()
+
+
+def slice_stream(stream, start, end):
+    """
+    Байты потока с позиции start по end включительно
+    """
+    position = 0
+    for data in stream:
+        data_start, position = position, position + len(data)
+        if position <= start:
+            continue
+        yield data[max(start - data_start, 0):end + 1 - data_start]
+        if position > end:
+            break
+
+
+def parse_range(header, total):
+    """
+    Диапазон (start, end) из заголовка Range; None - отдать файл целиком,
+    False - диапазон за пределами файла
+    """
+    match = BYTE_RANGE.match(header.strip())
+    if match is None or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        start, end = max(total - int(last), 0), total - 1
+    else:
+        start = int(first)
+        end = min(int(last), total - 1) if last else total - 1
+    if start > end or start >= total:
+        return False
+    return start, end
+
+
+def register_export_route(server, dataset, chunk_rows=50000, identity=''):
+    """
+    Добавляет на Flask-сервер GET /export.csv и /export.parquet: выгрузку отфильтрованных
+    строк потоком, порциями по chunk_rows. Параметры: day, gender, time, smoker,
+    bill_min, bill_max, columns (через запятую), filter_query. Поддерживается
+    докачка по заголовку Range - поток формируется заново и пропускает уже полученные байты.
+    Размер выгрузки становится известен после первой полной отдачи; до этого запрос
+    с Range получает выгрузку целиком (200), чтобы не строить ее дважды.
+    identity - отпечаток исходных данных, общий для процессов и перезапусков: вместе
+    с версией данных он входит в ETag, чтобы докачка не склеила байты разных выгрузок
+    """
+    # Полный размер выгрузки по ETag, записанный после полной отдачи - нужен для ответов 206
+    lengths = LRUCache(maxsize=256)
+
+    def measured(stream, etag):
+        # Поток, который после отдачи последнего байта запоминает полный размер
+        total = 0
+        for data in stream:
+            total += len(data)
+            yield data
+        lengths.put(etag, total)
+
+    @server.route('/export.<fmt>')
+    def export(fmt):
+        if fmt not in EXPORT_MIMETYPES:
+            return jsonify(error=f'unknown export format: {fmt}'), 404
+        if fmt == 'parquet' and pq is None:
+            return jsonify(error='parquet export requires pyarrow'), 501
+
+        snapshot = dataset.snapshot
+        args = request.args
+        bill_min, bill_max = snapshot.bill_range
+        try:
+            filters = filter_key(args.get('day', 'All'), args.get('gender', 'All'),
+                                 args.get('time', 'All'), args.get('smoker', 'All'),
+                                 (args.get('bill_min', bill_min), args.get('bill_max', bill_max)))
+        except ValueError as error:
+            return jsonify(error=str(error)), 400
+        columns = [column for column in args.get('columns', '').split(',') if column] or snapshot.columns
+        unknown = [column for column in columns if column not in snapshot.columns]
+        if unknown:
+            return jsonify(error=f"unknown columns: {', '.join(unknown)}"), 400
+        filter_query = args.get('filter_query', '')
+
+        def stream():
+            chunks = export_chunks(snapshot, filters, columns, filter_query, chunk_rows)
+            return csv_stream(chunks) if fmt == 'csv' else parquet_stream(chunks)
+
+        # Выгрузка однозначно определяется данными, их версией и параметрами запроса
+        digest = hashlib.sha1(repr((fmt, filters, columns, filter_query)).encode()).hexdigest()[:16]
+        etag = f'{identity[:16]}-{snapshot.version}-{digest}'
+        headers = {'ETag': f'"{etag}"', 'Accept-Ranges': 'bytes',
+                   'Content-Disposition': f'attachment; filename="tips-export.{fmt}"'}
+
+        total = lengths.get(etag)
+        byte_range = request.headers.get('Range')
+        if_range = request.headers.get('If-Range')
+        if total is not None and byte_range and (if_range is None or if_range.strip('"') == etag):
+            selected = parse_range(byte_range, total)
+            if selected is False:
+                return Response(status=416, headers={**headers, 'Content-Range': f'bytes */{total}'})
+            if selected is not None:
+                start, end = selected
+                headers.update({'Content-Range': f'bytes {start}-{end}/{total}',
+                                'Content-Length': str(end - start + 1)})
+                return Response(slice_stream(stream(), start, end), status=206,
+                                mimetype=EXPORT_MIMETYPES[fmt], headers=headers)
+
+        if total is not None:
+            headers['Content-Length'] = str(total)
+            return Response(stream(), mimetype=EXPORT_MIMETYPES[fmt], headers=headers)
+        return Response(measured(stream(), etag), mimetype=EXPORT_MIMETYPES[fmt], headers=headers)
+
+    return export
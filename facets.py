@@ -0,0 +1,48 @@
+import numpy as np
+
+from filterindex import FILTER_COLUMNS
+
+
+def facet_counts(counts, categories, day, gender, time, smoker):
+    """
+    Число строк для каждого значения каждого фильтра при остальных активных фильтрах
+    (как в crossfilter). counts - числа строк по ячейкам (day, sex, time, smoker)
+    в диапазоне счета: все фасеты считаются по этому массиву, без прохода по строкам
+    """
+    selected = []
+    for axis, (column, value) in enumerate(zip(FILTER_COLUMNS, (day, gender, time, smoker))):
+        # У куба за категориями может стоять ячейка пустых значений - она входит только в All
+        if value == 'All':
+            selected.append(np.ones(counts.shape[axis], dtype=bool))
+        else:
+            mask = np.zeros(counts.shape[axis], dtype=bool)
+            mask[:len(categories[column])] = [category == value for category in categories[column]]
+            selected.append(mask)
+
+    facets = {}
+    axes = tuple(range(len(FILTER_COLUMNS)))
+    for axis, column in enumerate(FILTER_COLUMNS):
+        # Фильтр самой колонки не применяется, остальные сужают свои оси
+        masked = counts
+        for other, mask in enumerate(selected):
+            if other != axis:
+                masked = np.compress(mask, masked, axis=other)
+        values = masked.sum(axis=tuple(a for a in axes if a != axis))
+        facets[column] = dict(zip(categories[column], values.tolist()))
+        facets[column]['All'] = float(values.sum())
+    return facets
+
+
+def facet_options(options, counts, selected, approximate=False):
+    """
+    Варианты фильтра с числом строк в подписи. Варианты без строк отключаются,
+    кроме All и выбранного; у оценок по выборке (approximate) отключения нет
+    """
+    prefix = '~' if approximate else ''
+    result = []
+    for option in options:
+        count = int(round(counts.get(option['value'], 0)))
+        result.append({'label': f"{option['label']} ({prefix}{count:,})",
+                       'value': option['value'],
+                       'disabled': not approximate and count == 0 and option['value'] not in ('All', selected)})
+    return result
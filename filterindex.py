@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+
+# Категориальные колонки, по которым фильтрует дашборд
+FILTER_COLUMNS = ('day', 'sex', 'time', 'smoker')
+
+
+def billed_order(bills):
+    """
+    Позиции строк с суммой счета, отсортированные по счету; строки без счета пропускаются
+    """
+    order = np.argsort(bills, kind='stable')
+    # NaN при сортировке оказываются в конце
+    return order[:len(order) - np.count_nonzero(np.isnan(bills))]
+
+
+class FilterIndex:
+    """
+    Индекс для фильтрации данных о чаевых, строится один раз при загрузке.
+
+    Для каждого значения категориальной колонки хранится булева маска строк,
+    для total_bill - порядок сортировки, так что диапазон счета выбирается
+    бинарным поиском. Результат фильтрации - набор позиций строк, а не копия таблицы.
+    Пустые значения категорий не получают маски (строки с ними проходят только
+    фильтр All), строки без суммы счета не попадают ни в один диапазон - как в pandas.
+    """
+
+    def __init__(self, dataFrame):
+        self.df = dataFrame
+        self.n_rows = len(dataFrame)
+
+        # Маски строк для каждого значения категориальных колонок
+        self.masks = {
+            column: {value: (dataFrame[column] == value).to_numpy()
+                     for value in dataFrame[column].dropna().unique()}
+            for column in FILTER_COLUMNS
+        }
+
+        # Отсортированные суммы счетов для бинарного поиска по диапазону
+        bills = dataFrame['total_bill'].to_numpy()
+        self.bill_order = billed_order(bills)
+        self.sorted_bills = bills[self.bill_order]
+
+    def extend(self, dataFrame):
+        """
+        Возвращает новый индекс для таблицы, дополненной строками в конце.
+        Старые маски дополняются, новые счета вливаются в отсортированный порядок
+        без пересортировки всей колонки
+        """
+        new_rows = dataFrame.iloc[self.n_rows:]
+        extended = FilterIndex.__new__(FilterIndex)
+        extended.df = dataFrame
+        extended.n_rows = len(dataFrame)
+
+        extended.masks = {}
+        for column in FILTER_COLUMNS:
+            values = new_rows[column].to_numpy()
+            masks = {value: np.concatenate([mask, values == value])
+                     for value, mask in self.masks[column].items()}
+            for value in pd.unique(values):
+                if not pd.isna(value) and value not in masks:
+                    masks[value] = np.concatenate([np.zeros(self.n_rows, dtype=bool), values == value])
+            extended.masks[column] = masks
+
+        # Слияние отсортированных счетов: новые строки встают после равных старых
+        bills = new_rows['total_bill'].to_numpy()
+        order = billed_order(bills)
+        positions = np.searchsorted(self.sorted_bills, bills[order], side='right')
+        extended.sorted_bills = np.insert(self.sorted_bills, positions, bills[order])
+        extended.bill_order = np.insert(self.bill_order, positions, order + self.n_rows)
+        return extended
+
+    def bill_positions(self, bill_range, side='right'):
+        """
+        Возвращает границы [lo, hi) диапазона счета в отсортированном порядке;
+        side='left' - без строк, равных верхней границе
+        """
+        lo = np.searchsorted(self.sorted_bills, bill_range[0], side='left')
+        hi = np.searchsorted(self.sorted_bills, bill_range[1], side=side)
+        return lo, hi
+
+    def bill_bounds(self):
+        # Минимальный и максимальный счет или None, если счетов нет
+        if not len(self.sorted_bills):
+            return None
+        return float(self.sorted_bills[0]), float(self.sorted_bills[-1])
+
+    def category_masks(self, day, gender, time, smoker):
+        """
+        Возвращает маски для активных категориальных фильтров
+        """
+        selected = zip(FILTER_COLUMNS, (day, gender, time, smoker))
+        masks = []
+        for column, value in selected:
+            if value == 'All':
+                continue
+            mask = self.masks[column].get(value)
+            if mask is None:
+                # Значения нет в данных - ни одна строка не подходит
+                mask = np.zeros(self.n_rows, dtype=bool)
+            masks.append(mask)
+        return masks
+
+    def select(self, day, gender, time, smoker, bill_range, side='right'):
+        """
+        Возвращает позиции строк, прошедших фильтры, в исходном порядке
+        """
+        lo, hi = self.bill_positions(bill_range, side)
+        rows = self.bill_order[lo:hi]
+        for mask in self.category_masks(day, gender, time, smoker):
+            rows = rows[mask[rows]]
+        return np.sort(rows)
+
+    def take(self, rows, columns=None):
+        """
+        Строки исходной таблицы по позициям из select; columns - только нужные колонки.
+        Таблица копируется только в этих колонках и только для выбранных строк
+        """
+        if len(rows) == self.n_rows:
+            # Фильтры ничего не отсекли - отдаем таблицу как есть
+            return self.df if columns is None else self.df[columns]
+        if columns is None:
+            return self.df.take(rows)
+        # По колонке за раз: iloc по строкам и колонкам сначала выбирает строки во всех колонках
+        return pd.DataFrame({column: self.df[column].array.take(rows) for column in columns})
+
+    def take_parts(self, rows, columns=None):
+        # Строки по позициям порциями, без склейки в одну таблицу (у FilterIndex порция одна)
+        yield self.take(rows, columns)
+
+    def slice_rows(self, start, stop):
+        # Строки таблицы с позиции start до stop
+        return self.df.iloc[start:stop]
+
+    def filter(self, day, gender, time, smoker, bill_range):
+        """
+        Возвращает отфильтрованную выборку строк исходной таблицы
+        """
+        return self.take(self.select(day, gender, time, smoker, bill_range))
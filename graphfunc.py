@@ -1,4 +1,5 @@
 import plotly.express as px
+import plotly.graph_objects as go
 import pandas as pd
 from dash import html
 import numpy as np
@@ -13,7 +14,7 @@ def print_tip_distribution(dataFrame, day_filter='All'):
        dataFrame = dataFrame[dataFrame['day'] == day_filter]
 
     # Группировка и расчет средних чаевых
-    filtered_data = dataFrame.groupby(['sex']).agg({'tip': 'mean'}).reset_index()
+    filtered_data = dataFrame.groupby(['sex'], observed=True).agg({'tip': 'mean'}).reset_index()
     filtered_data['tip'] = filtered_data['tip'].round(2)
     filtered_data.sort_values(by='tip', ascending=False, inplace=True)
 
@@ -47,7 +48,7 @@ def print_tip_distribution(dataFrame, day_filter='All'):
     return fig
 
 
-def print_total_bill_distribution(dataFrame, day_filter='All'):
+def print_total_bill_distribution(dataFrame, day_filter='All', nbins=20):
     """
     Создает гистограмму распределения сумм счетов (total_bill)
     """
@@ -59,28 +60,49 @@ def print_total_bill_distribution(dataFrame, day_filter='All'):
     title = (f"Total Bill Distribution ({day_filter})" if day_filter != 'All'
              else "Total Bill Distribution (All Days)")
 
-    # Создание гистограммы
-    fig = px.histogram(dataFrame,
-                       x="total_bill",
-                       title=title,
-                       nbins=20,
-                       color_discrete_sequence=['indianred'],
-                       labels={'total_bill': 'Total Bill Amount ($)'})
+    # Создание гистограммы: корзины считаются на сервере, в фигуру идут только счетчики
+    counts, edges = np.histogram(dataFrame['total_bill'].to_numpy(dtype=float), bins=nbins)
+    fig = go.Figure(go.Bar(x=(edges[:-1] + edges[1:]) / 2,
+                           y=counts,
+                           width=np.diff(edges),
+                           customdata=np.column_stack([edges[:-1], edges[1:]]),
+                           marker_color='indianred',
+                           hovertemplate='Total Bill Amount ($)=%{customdata[0]:.2f}-%{customdata[1]:.2f}'
+                                         '<br>count=%{y}<extra></extra>'))
 
     # Настройка макета
     fig.update_layout(
+        title=title,
         xaxis_title="Total Bill Amount ($)",
         yaxis_title="Count",
+        bargap=0,
         showlegend=False
     )
 
     return fig
 
 
-def print_time_boxplot(dataFrame, gender_filter='All'):
+def box_statistics(values, max_outliers=500):
     """
-    Создает Box plot распределения чаевых по времени дня с фильтром по полу
-
+    Считает квартили, усы (1.5 IQR) и выбросы так же, как box plot в plotly.
+    Выбросов возвращается не больше max_outliers, включая крайние значения
+    """
+    values = np.sort(np.asarray(values, dtype=float))
+    q1, median, q3 = np.percentile(values, [25, 50, 75])
+    iqr = q3 - q1
+    inside = values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)]
+    outliers = values[(values < inside[0]) | (values > inside[-1])]
+    if len(outliers) > max_outliers:
+        outliers = outliers[np.linspace(0, len(outliers) - 1, max_outliers).astype(int)]
+    return {'q1': q1, 'median': median, 'q3': q3,
+            'lowerfence': inside[0], 'upperfence': inside[-1],
+            'mean': values.mean(), 'outliers': outliers}
+
+
+def print_time_boxplot(dataFrame, gender_filter='All', max_outliers=500):
+    """
+    Создает Box plot распределения чаевых по времени дня с фильтром по полу.
+    Квартили и выбросы считаются на сервере, размер фигуры не зависит от числа строк
     """
     # Фильтрация по полу
     if gender_filter != 'All':
@@ -89,22 +111,53 @@ def print_time_boxplot(dataFrame, gender_filter='All'):
     title = f"Tip Distribution by Time ({gender_filter})" if gender_filter != 'All' \
         else "Tip Distribution by Time (All Genders)"
 
-    fig = px.box(dataFrame,
-                 x='time',
-                 y='tip',
-                 color='sex' if gender_filter == 'All' else None,
-                 title=title,
-                 labels={'time': 'Time of Day', 'tip': 'Tip Amount ($)'})
+    # Группы в порядке появления в данных, как у px.box
+    groups = pd.unique(dataFrame['sex']) if gender_filter == 'All' else [None]
+    times = pd.unique(dataFrame['time'])
+    colors = px.colors.qualitative.Plotly
+
+    fig = go.Figure()
+    for i, sex in enumerate(groups):
+        group_df = dataFrame if sex is None else dataFrame[dataFrame['sex'] == sex]
+        tips_by_time = {time: tips.to_numpy() for time, tips in group_df.groupby('time', sort=False, observed=True)['tip']}
+        present = [time for time in times if time in tips_by_time]
+        boxes = [box_statistics(tips_by_time[time], max_outliers) for time in present]
+        color = colors[i % len(colors)] if sex is not None else 'darkblue'
+        name = str(sex) if sex is not None else str(gender_filter)
+
+        fig.add_trace(go.Box(x=present,
+                             q1=[box['q1'] for box in boxes],
+                             median=[box['median'] for box in boxes],
+                             q3=[box['q3'] for box in boxes],
+                             lowerfence=[box['lowerfence'] for box in boxes],
+                             upperfence=[box['upperfence'] for box in boxes],
+                             mean=[box['mean'] for box in boxes],
+                             name=name,
+                             legendgroup=name,
+                             offsetgroup=name,
+                             marker_color=color,
+                             line_color=color,
+                             fillcolor='lightblue' if sex is None else None,
+                             showlegend=sex is not None))
+        # Выбросы отдельными точками, сгруппированными вместе с боксами
+        fig.add_trace(go.Scatter(x=[time for time, box in zip(present, boxes) for _ in box['outliers']],
+                                 y=np.concatenate([box['outliers'] for box in boxes]) if boxes else [],
+                                 mode='markers',
+                                 name=name,
+                                 legendgroup=name,
+                                 offsetgroup=name,
+                                 marker=dict(color=color),
+                                 showlegend=False))
 
     fig.update_layout(
+        title=title,
         legend_title_text='Gender',
         xaxis_title="Time of Day",
-        yaxis_title="Tip Amount ($)"
+        yaxis_title="Tip Amount ($)",
+        boxmode='group',
+        scattermode='group'
     )
 
-    if gender_filter != 'All':
-        fig.update_traces(fillcolor='lightblue', line_color='darkblue')
-
     return fig
 
 
@@ -112,6 +165,8 @@ def print_time_boxplot(dataFrame, gender_filter='All'):
 def print_day_pie_chart(dataFrame):
     day_counts = dataFrame['day'].value_counts().reset_index()
     day_counts.columns = ['day', 'count']
+    # У категориальной колонки value_counts возвращает и пустые категории
+    day_counts = day_counts[day_counts['count'] > 0]
 
     fig = px.pie(day_counts,
                  values='count',
@@ -124,19 +179,86 @@ def print_day_pie_chart(dataFrame):
     return fig
 
 # Scatter plot зависимости чаевых от суммы счета
-def print_tip_vs_bill_scatter(dataFrame):
+def print_tip_vs_bill_scatter(dataFrame, webgl_threshold=5000, density_threshold=200000, bins=60):
+    """
+    Создает scatter plot чаевых от суммы счета с учетом объема данных:
+    до webgl_threshold точек - SVG-маркеры, до density_threshold - WebGL,
+    выше - тепловая карта плотности, посчитанная на сервере
+    """
+    if len(dataFrame) > density_threshold:
+        return print_tip_vs_bill_density(dataFrame, bins=bins)
+
     fig = px.scatter(dataFrame,
                      x='total_bill',
                      y='tip',
                      color='time',
                      title='Tip Amount vs Total Bill',
                      trendline='ewm', trendline_options=dict(span=10),
+                     render_mode='webgl' if len(dataFrame) > webgl_threshold else 'svg',
                      labels={'total_bill': 'Total Bill ($)', 'tip': 'Tip Amount ($)'})
 
     fig.update_layout(legend_title_text='Time of Day')
     return fig
 
 
+def ewm_mean(values, span):
+    """
+    Экспоненциальное скользящее среднее (как pandas ewm(span).mean()) без цикла по точкам.
+    Рассчитано на короткие ряды (агрегаты по корзинам): веса растут как (1 - alpha) ** -n
+    """
+    values = np.asarray(values, dtype=float)
+    decay = 1 - 2 / (span + 1)
+    powers = decay ** -np.arange(len(values))
+    return np.cumsum(values * powers) / np.cumsum(powers)
+
+
+def print_tip_vs_bill_density(dataFrame, bins=60, span=10):
+    """
+    Создает тепловую карту плотности чаевых от суммы счета с трендом по времени дня.
+    Точки бинируются на сервере, размер фигуры не зависит от числа строк
+    """
+    bills = dataFrame['total_bill'].to_numpy(dtype=float)
+    tips = dataFrame['tip'].to_numpy(dtype=float)
+
+    counts, x_edges, y_edges = np.histogram2d(bills, tips, bins=bins)
+    x_centers = (x_edges[:-1] + x_edges[1:]) / 2
+    y_centers = (y_edges[:-1] + y_edges[1:]) / 2
+
+    fig = go.Figure(go.Heatmap(
+        x=x_centers,
+        y=y_centers,
+        z=np.where(counts > 0, counts, np.nan).T,
+        colorscale='Blues',
+        colorbar=dict(title='Count'),
+        hovertemplate='Total Bill: %{x:.2f}<br>Tip: %{y:.2f}<br>Count: %{z}<extra></extra>'
+    ))
+
+    # Тренд по времени дня: средние чаевые в корзинах счета, сглаженные ewm
+    colors = px.colors.qualitative.Plotly
+    times = dataFrame['time'].to_numpy()
+    x_bins = np.clip(np.searchsorted(x_edges, bills, side='right') - 1, 0, bins - 1)
+    for i, time in enumerate(pd.unique(times)):
+        selected = times == time
+        bin_counts = np.bincount(x_bins[selected], minlength=bins)
+        bin_sums = np.bincount(x_bins[selected], weights=tips[selected], minlength=bins)
+        present = bin_counts > 0
+        fig.add_trace(go.Scatter(
+            x=x_centers[present],
+            y=ewm_mean(bin_sums[present] / bin_counts[present], span),
+            mode='lines',
+            name=str(time),
+            line=dict(color=colors[i % len(colors)], width=3)
+        ))
+
+    fig.update_layout(
+        title=f'Tip Amount vs Total Bill (density of {len(dataFrame):,} points)',
+        xaxis_title='Total Bill ($)',
+        yaxis_title='Tip Amount ($)',
+        legend_title_text='Time of Day'
+    )
+    return fig
+
+
 def calculate_statistics(dataFrame):
     """
     Рассчитывает основные статистические показатели данных о чаевых
@@ -151,7 +273,7 @@ def calculate_statistics(dataFrame):
     stats['avg_size'] = dataFrame['size'].mean()
 
     # По полу
-    gender_stats = dataFrame.groupby('sex').agg({
+    gender_stats = dataFrame.groupby('sex', observed=True).agg({
         'tip': 'mean',
         'total_bill': 'mean',
         'size': 'mean'
@@ -159,7 +281,7 @@ def calculate_statistics(dataFrame):
     stats['gender_stats'] = gender_stats
 
     # По дням недели
-    day_stats = dataFrame.groupby('day').agg({
+    day_stats = dataFrame.groupby('day', observed=True).agg({
         'tip': 'mean',
         'total_bill': 'mean',
         'size': 'count'
@@ -167,14 +289,14 @@ def calculate_statistics(dataFrame):
     stats['day_stats'] = day_stats
 
     # По времени дня
-    time_stats = dataFrame.groupby('time').agg({
+    time_stats = dataFrame.groupby('time', observed=True).agg({
         'tip': 'mean',
         'total_bill': 'mean'
     }).round(2)
     stats['time_stats'] = time_stats
 
     # По курящим/некурящим
-    smoker_stats = dataFrame.groupby('smoker').agg({
+    smoker_stats = dataFrame.groupby('smoker', observed=True).agg({
         'tip': 'mean',
         'total_bill': 'mean'
     }).round(2)
@@ -192,11 +314,79 @@ def calculate_statistics(dataFrame):
     return stats
 
 
-def create_interactive_stats(dataFrame):
+# Идентификаторы значений в статистических карточках, которые обновляют callback'и
+STATS_VALUE_IDS = ('stats-total-records', 'stats-avg-bill', 'stats-avg-tip',
+                   'stats-avg-tip-percentage', 'stats-avg-size')
+
+# Разбивки: ключ в calculate_statistics, колонка и заголовок карточки
+STATS_GROUPS = (('gender_stats', 'sex', "👨‍👩 По полу"),
+                ('day_stats', 'day', "📅 По дням недели"),
+                ('time_stats', 'time', "⏰ По времени дня"))
+
+
+def stats_values(stats):
     """
-    Создает интерактивные статистические карточки
+    Форматирует основные показатели в порядке STATS_VALUE_IDS.
+    У оценок по выборке (intervals) добавляется полуширина доверительного интервала
     """
-    stats = calculate_statistics(dataFrame)
+    intervals = stats.get('intervals', {})
+
+    def margin(name, digits):
+        value = intervals.get(name, 0)
+        return f" ± {value:.{digits}f}" if round(value, digits) > 0 else ''
+
+    return [f"{stats['total_records']}{margin('total_records', 0)}",
+            f"${stats['avg_bill']:.2f}{margin('avg_bill', 2)}",
+            f"${stats['avg_tip']:.2f}{margin('avg_tip', 2)}",
+            f"{stats['avg_tip_percentage']:.1f}%{margin('avg_tip_percentage', 1)} от счета",
+            f"{stats['avg_size']:.1f}{margin('avg_size', 1)}"]
+
+
+def stats_group_values(stats, slots):
+    """
+    Форматирует средние чаевые по группам для слотов карточек разбивки.
+    slots - id слотов вида {'group': колонка, 'value': значение}.
+    Возвращает тексты и стили: группы без строк скрываются
+    """
+    tables = {column: stats[key] for key, column, _ in STATS_GROUPS}
+    texts, styles = [], []
+    for slot in slots:
+        table = tables[slot['group']]
+        if slot['value'] in table.index:
+            texts.append(f"${table.loc[slot['value'], 'tip']:.2f} чаевых")
+            styles.append({})
+        else:
+            texts.append('')
+            styles.append({'display': 'none'})
+    return texts, styles
+
+
+def create_interactive_stats(dataFrame=None, stats=None, categories=None):
+    """
+    Создает интерактивные статистические карточки.
+    Готовую статистику (например, из StatsCube) можно передать через stats.
+    Изменяемые значения вынесены в элементы с id, чтобы callback'и обновляли
+    только их; categories задает слоты разбивок (по умолчанию - группы из stats)
+    """
+    if stats is None:
+        stats = calculate_statistics(dataFrame)
+    if categories is None:
+        categories = {column: stats[key].index.tolist() for key, column, _ in STATS_GROUPS}
+
+    values = dict(zip(STATS_VALUE_IDS, stats_values(stats)))
+
+    def group_card(key, column, header):
+        slots = [{'group': column, 'value': value} for value in sorted(categories[column])]
+        texts, styles = stats_group_values(stats, slots)
+        return dbc.Col(dbc.Card([
+            dbc.CardHeader(header),
+            dbc.CardBody([
+                html.P([f"{slot['value']}: ",
+                        html.Span(text, id={'type': 'stats-group-value', **slot})],
+                       id={'type': 'stats-group-row', **slot}, style=style)
+                for slot, text, style in zip(slots, texts, styles)
+            ])
+        ]), md=4)
 
     return html.Div([
         dbc.Row([
@@ -204,7 +394,7 @@ def create_interactive_stats(dataFrame):
             dbc.Col(dbc.Card([
                 dbc.CardHeader("📊 Основные показатели"),
                 dbc.CardBody([
-                    html.H4(f"{stats['total_records']}", className="text-primary"),
+                    html.H4(values['stats-total-records'], id='stats-total-records', className="text-primary"),
                     html.P("Всего записей", className="text-muted")
                 ])
             ]), md=3),
@@ -212,7 +402,7 @@ def create_interactive_stats(dataFrame):
             dbc.Col(dbc.Card([
                 dbc.CardHeader("💰 Средний счет"),
                 dbc.CardBody([
-                    html.H4(f"${stats['avg_bill']:.2f}", className="text-success"),
+                    html.H4(values['stats-avg-bill'], id='stats-avg-bill', className="text-success"),
                     html.P("Средняя сумма", className="text-muted")
                 ])
             ]), md=3),
@@ -220,44 +410,21 @@ def create_interactive_stats(dataFrame):
             dbc.Col(dbc.Card([
                 dbc.CardHeader("💵 Средние чаевые"),
                 dbc.CardBody([
-                    html.H4(f"${stats['avg_tip']:.2f}", className="text-info"),
-                    html.P(f"{stats['avg_tip_percentage']:.1f}% от счета", className="text-muted")
+                    html.H4(values['stats-avg-tip'], id='stats-avg-tip', className="text-info"),
+                    html.P(values['stats-avg-tip-percentage'], id='stats-avg-tip-percentage',
+                           className="text-muted")
                 ])
             ]), md=3),
 
             dbc.Col(dbc.Card([
                 dbc.CardHeader("👥 Размер компании"),
                 dbc.CardBody([
-                    html.H4(f"{stats['avg_size']:.1f}", className="text-warning"),
+                    html.H4(values['stats-avg-size'], id='stats-avg-size', className="text-warning"),
                     html.P("Среднее количество", className="text-muted")
                 ])
             ]), md=3),
         ], className="mb-4"),
 
         # Детальная статистика
-        dbc.Row([
-            dbc.Col(dbc.Card([
-                dbc.CardHeader("👨‍👩 По полу"),
-                dbc.CardBody([
-                    *[html.P(f"{row.Index}: ${row.tip:.2f} чаевых")
-                      for row in stats['gender_stats'].itertuples()]
-                ])
-            ]), md=4),
-
-            dbc.Col(dbc.Card([
-                dbc.CardHeader("📅 По дням недели"),
-                dbc.CardBody([
-                    *[html.P(f"{row.Index}: ${row.tip:.2f} чаевых")
-                      for row in stats['day_stats'].itertuples()]
-                ])
-            ]), md=4),
-
-            dbc.Col(dbc.Card([
-                dbc.CardHeader("⏰ По времени дня"),
-                dbc.CardBody([
-                    *[html.P(f"{row.Index}: ${row.tip:.2f} чаевых")
-                      for row in stats['time_stats'].itertuples()]
-                ])
-            ]), md=4),
-        ])
-    ])
\ No newline at end of file
+        dbc.Row([group_card(*group) for group in STATS_GROUPS])
+    ])
@@ -0,0 +1,105 @@
+import io
+import logging
+import os
+import threading
+
+import pandas as pd
+from flask import jsonify, request
+
+# Адреса, с которых принимается загрузка строк через /ingest
+LOCAL_ADDRESSES = ('127.0.0.1', '::1', 'localhost')
+
+logger = logging.getLogger(__name__)
+
+
+def parse_csv_rows(text, header):
+    """
+    Разбирает строки CSV без заголовка, используя колонки исходного файла
+    """
+    return pd.read_csv(io.StringIO(text), header=None, names=header)
+
+
+class CsvTailer:
+    """
+    Следит за дописыванием строк в конец CSV и передает их в датасет.
+    Читаются только полные строки, начиная с уже обработанного смещения
+    """
+
+    def __init__(self, csv_path, dataset, offset, interval=2.0):
+        self.csv_path = csv_path
+        self.dataset = dataset
+        self.offset = offset
+        self.interval = interval
+        self.header = dataset.snapshot.columns
+        self._stop = threading.Event()
+        self._thread = None
+
+    def poll(self):
+        """
+        Читает новые полные строки файла и возвращает их количество
+        """
+        size = os.path.getsize(self.csv_path)
+        if size < self.offset:
+            # Файл усечен или заменен - хвост начинаем следить заново с конца
+            self.offset = size
+            return 0
+        if size == self.offset:
+            return 0
+
+        with open(self.csv_path, 'rb') as file:
+            file.seek(self.offset)
+            chunk = file.read(size - self.offset)
+        end = chunk.rfind(b'\n')
+        if end < 0:
+            # Строка еще дописывается
+            return 0
+
+        text = chunk[:end + 1].decode('utf-8')
+        self.offset += end + 1
+        rows = parse_csv_rows(text, self.header) if text.strip() else pd.DataFrame()
+        if len(rows):
+            self.dataset.append(rows)
+        return len(rows)
+
+    def run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except (OSError, ValueError):
+                logger.exception("CSV tail error in %s", self.csv_path)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+
+def register_ingest_route(server, dataset):
+    """
+    Добавляет на Flask-сервер локальный endpoint POST /ingest для пакетной загрузки строк:
+    JSON-список записей (или {"rows": [...]}) либо text/csv с заголовком
+    """
+
+    @server.route('/ingest', methods=['POST'])
+    def ingest():
+        if request.remote_addr not in LOCAL_ADDRESSES:
+            return jsonify(error='ingest is only available from localhost'), 403
+
+        try:
+            if request.mimetype == 'text/csv':
+                rows = pd.read_csv(io.StringIO(request.get_data(as_text=True)))
+            else:
+                payload = request.get_json(force=True)
+                if isinstance(payload, dict):
+                    payload = payload.get('rows', [])
+                rows = pd.DataFrame.from_records(payload)
+            version = dataset.append(rows)
+        except (ValueError, TypeError) as error:
+            return jsonify(error=str(error)), 400
+
+        return jsonify(rows=len(rows), version=version)
+
+    return ingest
@@ -0,0 +1,502 @@
+"""
+Нагрузочный тест callback'ов дашборда: N параллельных сессий повторяют сценарии
+действий пользователя через /_dash-update-component.
+
+    python loadtest.py --sessions 16 --duration 60 --data big.csv --output load.json
+    python loadtest.py --sessions 32 --duration 60 --url http://127.0.0.1:8050 --pid 12345
+
+Без --url приложение создается в этом же процессе (create_app, серверный режим)
+и запросы идут через тестовый клиент Flask; с --url - к уже запущенному серверу
+(например, serve.py), --pid - процесс сервера для замера RSS.
+Сессия, как браузер, сначала вызывает callback'и начальной загрузки, затем выполняет
+шаги сценариев: каждое изменение свойства запускает зависящие от него серверные
+callback'и, а их результаты - следующие. Клиентские callback'и не выполняются,
+кроме задержки слайдера: его значение сразу передается в bill-range-debounced.
+Отчет по callback'ам: число вызовов, пропускная способность, p50/p95/p99 времени
+ответа, размер ответа и пиковая память (tracemalloc, отдельный проход одной сессии
+до нагрузки, только без --url); общий пиковый RSS процесса сервера под нагрузкой
+"""
+import argparse
+import gzip
+import http.client
+import json
+import os
+import threading
+import time
+import tracemalloc
+from urllib.parse import urlsplit
+
+import numpy as np
+
+import config
+
+# Сценарии: шаги из изменений свойств ('id.свойство': значение) и паузы после шага, с.
+# '+1' увеличивает счетчик (n_clicks, n_intervals) на единицу
+TRACES = {
+    'browse_graphs': [({'graph-type.value': graph_type}, 1.0)
+                      for graph_type in ('total_bill', 'time_boxplot', 'day_pie', 'bill_scatter', 'tips')],
+    'drag_bill': [({'bill-range.value': bill_range}, 0.3)
+                  for bill_range in ([5, 45], [10, 40], [15, 35], [15, 25], [20, 30], [0, 100])],
+    'filters': [({'day-dropdown.value': 'Sat'}, 1.0),
+                ({'gender-dropdown.value': 'Female'}, 1.0),
+                ({'time-dropdown.value': 'Dinner'}, 1.0),
+                ({'smoker-filter.value': 'No'}, 1.0),
+                ({'reset-button.n_clicks': '+1'}, 1.0)],
+    'table': [({'graph-type.value': 'data_table'}, 1.0),
+              ({'data-table.page_current': 1}, 0.5),
+              ({'data-table.page_current': 2}, 0.5),
+              ({'data-table.sort_by': [{'column_id': 'tip', 'direction': 'desc'}]}, 1.0),
+              ({'data-table.filter_query': '{size} > 2'}, 1.0),
+              ({'data-table.filter_query': '', 'data-table.sort_by': []}, 0.5),
+              ({'graph-type.value': 'tips'}, 1.0)],
+}
+
+# Клиентские callback'и, которые нужно повторить в сессии: свойство -> свойство-копия
+CLIENTSIDE_MIRRORS = {('bill-range', 'value'): ('bill-range-debounced', 'data')}
+
+UPDATE_PATH = '/_dash-update-component'
+
+
+def stringify_id(component_id):
+    # Так же, как Dash записывает id-словари в ответах
+    if isinstance(component_id, dict):
+        return json.dumps(component_id, sort_keys=True, separators=(',', ':'))
+    return component_id
+
+
+def load_traces(path):
+    """
+    Сценарии из JSON: {"название": [{"changes": {"id.свойство": значение}, "think": секунды}, ...]}
+    """
+    with open(path, encoding='utf-8') as file:
+        traces = json.load(file)
+    return {name: [(step['changes'], step.get('think', 1.0)) for step in steps]
+            for name, steps in traces.items()}
+
+
+def decode(data, headers):
+    if headers.get('Content-Encoding') == 'gzip':
+        return gzip.decompress(data)
+    return data
+
+
+class TestClientTransport:
+    """
+    Запросы к приложению в этом же процессе через тестовый клиент Flask
+    """
+
+    def __init__(self, app):
+        self.client = app.server.test_client()
+
+    def request(self, method, path, body=None):
+        response = self.client.open(path, method=method, json=body, headers={'Accept-Encoding': 'gzip'})
+        return response.status_code, response.headers, response.get_data()
+
+
+class HttpTransport:
+    """
+    Запросы к запущенному серверу по одному keep-alive соединению на сессию
+    """
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=120)
+        self.prefix = parts.path.rstrip('/')
+
+    def request(self, method, path, body=None):
+        headers = {'Accept-Encoding': 'gzip'}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        self.connection.request(method, self.prefix + path, body=payload, headers=headers)
+        response = self.connection.getresponse()
+        return response.status, dict(response.getheaders()), response.read()
+
+
+class Session:
+    """
+    Одна вкладка браузера: состояние свойств компонентов и вызовы серверных callback'ов
+    """
+
+    def __init__(self, transport, callback_names=None, record=None):
+        self.transport = transport
+        self.callback_names = callback_names or {}
+        self.record = record or (lambda *args: None)
+
+        status, headers, data = transport.request('GET', '/_dash-layout')
+        layout = json.loads(decode(data, headers))
+        status, headers, data = transport.request('GET', '/_dash-dependencies')
+        dependencies = json.loads(decode(data, headers))
+
+        self.state = {}
+        self.dict_ids = []
+        self._walk(layout)
+        self.callbacks = [self._prepare(dependency) for dependency in dependencies
+                          if not dependency.get('clientside_function')]
+
+        interval = (self.state.get(('refresh-interval', 'interval')) or 0) / 1000
+        self.refresh_interval = 0 if self.state.get(('refresh-interval', 'disabled')) else interval
+        self.last_refresh = time.perf_counter()
+
+    def _walk(self, node):
+        if isinstance(node, list):
+            for child in node:
+                self._walk(child)
+        elif isinstance(node, dict):
+            props = node.get('props', {})
+            if 'id' in props:
+                if isinstance(props['id'], dict):
+                    self.dict_ids.append(props['id'])
+                for prop, value in props.items():
+                    self.state[(stringify_id(props['id']), prop)] = value
+            for value in props.values():
+                self._walk(value)
+
+    def _expand(self, component_id):
+        # id с шаблонами (ALL, MATCH) превращается в список подходящих id из layout
+        if not isinstance(component_id, dict):
+            return component_id
+        return [candidate for candidate in self.dict_ids
+                if candidate.keys() == component_id.keys()
+                and all(isinstance(value, list) or candidate[key] == value
+                        for key, value in component_id.items())]
+
+    def _prepare(self, dependency):
+        output = dependency['output']
+        multi = output.startswith('..')
+        items = output[2:-2].split('...') if multi else [output]
+        outputs = []
+        for item in items:
+            component_id, prop = item.rsplit('.', 1)
+            if component_id.startswith('{'):
+                component_id = json.loads(component_id)
+            outputs.append((component_id, prop))
+
+        input_keys = set()
+        for spec in dependency['inputs']:
+            expanded = self._expand(spec['id'])
+            for component_id in expanded if isinstance(expanded, list) else [expanded]:
+                input_keys.add((stringify_id(component_id), spec['property']))
+        return {'output': output, 'multi': multi, 'outputs': outputs,
+                'inputs': dependency['inputs'], 'state': dependency['state'],
+                'input_keys': input_keys, 'initial': not dependency.get('prevent_initial_call'),
+                'interval': ((dependency.get('long') or {}).get('interval') or 100) / 1000,
+                'name': self.callback_names.get(output) or output_label(items)}
+
+    def _values(self, specs):
+        values = []
+        for spec in specs:
+            expanded = self._expand(spec['id'])
+            if isinstance(expanded, list):
+                values.append([{'id': component_id, 'property': spec['property'],
+                                'value': self.state.get((stringify_id(component_id), spec['property']))}
+                               for component_id in expanded])
+            else:
+                values.append({'id': expanded, 'property': spec['property'],
+                               'value': self.state.get((expanded, spec['property']))})
+        return values
+
+    def _outputs(self, callback):
+        outputs = []
+        for component_id, prop in callback['outputs']:
+            expanded = self._expand(component_id)
+            if isinstance(expanded, list):
+                outputs.append([{'id': item, 'property': prop} for item in expanded])
+            else:
+                outputs.append({'id': expanded, 'property': prop})
+        return outputs if callback['multi'] else outputs[0]
+
+    def call(self, callback, changed):
+        """
+        Вызывает callback и возвращает изменившиеся свойства
+        """
+        body = {'output': callback['output'], 'outputs': self._outputs(callback),
+                'inputs': self._values(callback['inputs']), 'state': self._values(callback['state']),
+                'changedPropIds': [f'{component_id}.{prop}' for component_id, prop in changed
+                                   if (component_id, prop) in callback['input_keys']]}
+        start = time.perf_counter()
+        status, headers, data = self.transport.request('POST', UPDATE_PATH, body)
+        size = len(data)
+        payload = json.loads(decode(data, headers)) if status == 200 else {}
+        # Фоновый callback: результат забирается опросом, как это делает браузер
+        if status == 200 and 'job' in payload:
+            path = f"{UPDATE_PATH}?cacheKey={payload['cacheKey']}&job={payload['job']}"
+            while status == 200 and 'response' not in payload:
+                time.sleep(callback['interval'])
+                status, headers, data = self.transport.request('POST', path, body)
+                size += len(data)
+                payload = json.loads(decode(data, headers)) if status == 200 else {}
+        self.record(callback['name'], time.perf_counter() - start, status, size)
+        return self.update(payload.get('response', {}))
+
+    def update(self, response):
+        changed = set()
+        for component_id, props in response.items():
+            for prop, value in props.items():
+                # Свойство с allow_duplicate приходит без суффикса @hash
+                key = (component_id, prop.split('@')[0])
+                if self.state.get(key) != value:
+                    self.state[key] = value
+                    changed.add(key)
+                    mirror = CLIENTSIDE_MIRRORS.get(key)
+                    if mirror is not None and self.state.get(mirror) != value:
+                        self.state[mirror] = value
+                        changed.add(mirror)
+        return changed
+
+    def fire(self, changed):
+        # Цепочка: callback'и, зависящие от изменившихся свойств, затем зависящие от их результатов
+        for _ in range(10):
+            if not changed:
+                break
+            triggered = [callback for callback in self.callbacks if callback['input_keys'] & changed]
+            following = set()
+            for callback in triggered:
+                following |= self.call(callback, changed)
+            changed = following
+
+    def load(self):
+        """
+        Начальная загрузка страницы: callback'и без prevent_initial_call
+        """
+        changed = set()
+        for callback in self.callbacks:
+            if callback['initial']:
+                changed |= self.call(callback, set())
+        self.fire(changed)
+
+    def step(self, changes):
+        update = {}
+        for name, value in changes.items():
+            component_id, prop = name.rsplit('.', 1)
+            if value == '+1':
+                value = (self.state.get((component_id, prop)) or 0) + 1
+            update.setdefault(component_id, {})[prop] = value
+        self.fire(self.update(update))
+
+    def tick(self):
+        # Периодическая проверка новой версии данных (dcc.Interval)
+        if self.refresh_interval and time.perf_counter() - self.last_refresh >= self.refresh_interval:
+            self.last_refresh = time.perf_counter()
+            self.step({'refresh-interval.n_intervals': '+1'})
+
+
+def output_label(items):
+    first = items[0].split('...')[0]
+    return first if len(items) == 1 else f'{first}+{len(items) - 1}'
+
+
+def process_rss(pid):
+    """
+    RSS процесса и его дочерних процессов (рабочих процессов gunicorn), байт; None вне Linux
+    """
+    try:
+        with open(f'/proc/{pid}/status', encoding='ascii') as file:
+            rss = next(int(line.split()[1]) * 1024 for line in file if line.startswith('VmRSS:'))
+        children = []
+        for task in os.listdir(f'/proc/{pid}/task'):
+            with open(f'/proc/{pid}/task/{task}/children', encoding='ascii') as file:
+                children += file.read().split()
+    except (OSError, StopIteration):
+        return None
+    return rss + sum(process_rss(int(child)) or 0 for child in children)
+
+
+class RssSampler:
+    """
+    Пиковый RSS процесса сервера за время нагрузки
+    """
+
+    def __init__(self, pid, interval=0.1):
+        self.pid = pid
+        self.interval = interval
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        while True:
+            rss = process_rss(self.pid)
+            if rss is not None:
+                self.peak = max(self.peak or 0, rss)
+            if self._stop.wait(self.interval):
+                break
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+def calibrate_memory(make_transport, traces, callback_names):
+    """
+    Пиковая память каждого callback'а: одна сессия проходит все сценарии без пауз
+    под tracemalloc, так что выделения не смешиваются с другими сессиями
+    """
+    peaks = {}
+    tracemalloc.start()
+    try:
+        def record(name, latency, status, size):
+            _, peak = tracemalloc.get_traced_memory()
+            peaks[name] = max(peaks.get(name, 0), peak - record.start)
+
+        def reset():
+            tracemalloc.reset_peak()
+            record.start = tracemalloc.get_traced_memory()[0]
+
+        session = Session(make_transport(), callback_names, record)
+        # Пик считается от объема памяти перед каждым запросом
+        call = session.call
+        session.call = lambda callback, changed: (reset(), call(callback, changed))[1]
+        session.load()
+        for steps in traces.values():
+            for changes, _ in steps:
+                session.step(changes)
+    finally:
+        tracemalloc.stop()
+    return peaks
+
+
+def run(make_transport, traces, sessions=8, duration=30.0, iterations=None, think=1.0,
+        callback_names=None, pid=None, log=print):
+    """
+    Запускает сессии в потоках; каждая начинает со своего сценария и проходит их по кругу
+    до конца duration (или iterations кругов). Возвращает записи вызовов и пиковый RSS
+    """
+    records = []
+    errors = []
+    names = list(traces)
+    deadline = time.perf_counter() + duration
+
+    def record(name, latency, status, size):
+        records.append((name, latency, status, size))
+
+    def session_loop(number):
+        try:
+            session = Session(make_transport(), callback_names, record)
+            session.load()
+            loop = 0
+            while iterations is None or loop < iterations:
+                for i in range(len(names)):
+                    for changes, pause in traces[names[(number + i) % len(names)]]:
+                        if iterations is None and time.perf_counter() >= deadline:
+                            return
+                        session.step(changes)
+                        session.tick()
+                        time.sleep(pause * think)
+                loop += 1
+        except (OSError, http.client.HTTPException, ValueError, KeyError) as error:
+            # Обрыв соединения, ответ не JSON или без ожидаемых полей: сессия останавливается,
+            # остальные продолжают, а запуск завершается с ошибкой
+            errors.append(error)
+            log(f"session {number} failed: {error!r}")
+
+    threads = [threading.Thread(target=session_loop, args=(number,), daemon=True)
+               for number in range(sessions)]
+    start = time.perf_counter()
+    with RssSampler(pid or os.getpid()) as sampler:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return records, time.perf_counter() - start, sampler.peak, errors
+
+
+def summarize(records, elapsed, memory_peaks=None):
+    """
+    Сводка по callback'ам: вызовы, ошибки (статус >= 400), вызовов в секунду,
+    перцентили времени ответа в мс, средний размер ответа и пиковая память
+    """
+    by_callback = {}
+    for name, latency, status, size in records:
+        by_callback.setdefault(name, []).append((latency, status, size))
+
+    summary = []
+    for name, calls in sorted(by_callback.items()):
+        latencies = np.array([latency for latency, _, _ in calls]) * 1000
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        summary.append({
+            'callback': name,
+            'calls': len(calls),
+            'errors': sum(status >= 400 for _, status, _ in calls),
+            'throughput_per_s': len(calls) / elapsed,
+            'p50_ms': p50,
+            'p95_ms': p95,
+            'p99_ms': p99,
+            'max_ms': latencies.max(),
+            'mean_bytes': float(np.mean([size for _, _, size in calls])),
+            'peak_memory_bytes': (memory_peaks or {}).get(name),
+        })
+    return summary
+
+
+def print_summary(summary, elapsed, rss_peak, log=print):
+    total = sum(item['calls'] for item in summary)
+    log(f"{total} callback requests in {elapsed:.1f}s: {total / elapsed:.1f} req/s")
+    if rss_peak is not None:
+        log(f"peak server RSS: {rss_peak / 2 ** 20:.1f} MiB")
+    log(f"{'callback':<32} {'calls':>7} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+        f"{'p99 ms':>8} {'bytes':>9} {'peak MiB':>9}")
+    for item in summary:
+        peak = item['peak_memory_bytes']
+        peak = f"{peak / 2 ** 20:.1f}" if peak is not None else '-'
+        log(f"{item['callback']:<32} {item['calls']:>7} {item['errors']:>6} "
+            f"{item['throughput_per_s']:>8.1f} {item['p50_ms']:>8.1f} {item['p95_ms']:>8.1f} "
+            f"{item['p99_ms']:>8.1f} {item['mean_bytes']:>9.0f} {peak:>9}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Tips dashboard callback load test')
+    parser.add_argument('--sessions', type=int, default=8, help='число параллельных сессий')
+    parser.add_argument('--duration', type=float, default=30.0, help='длительность нагрузки, с')
+    parser.add_argument('--iterations', type=int, help='вместо --duration: кругов сценариев на сессию')
+    parser.add_argument('--think', type=float, default=1.0,
+                        help='множитель пауз между шагами (0 - без пауз)')
+    parser.add_argument('--traces', nargs='*', help='выполнять только эти сценарии')
+    parser.add_argument('--trace-file', help='JSON со своими сценариями')
+    parser.add_argument('--data', help='данные для приложения в этом процессе (как TIPS_DATA_PATH)')
+    parser.add_argument('--url', help='адрес запущенного сервера, например http://127.0.0.1:8050')
+    parser.add_argument('--pid', type=int, help='PID запущенного сервера для замера RSS')
+    parser.add_argument('--output', help='сохранить сводку в JSON')
+    args = parser.parse_args()
+
+    traces = load_traces(args.trace_file) if args.trace_file else TRACES
+    if args.traces:
+        traces = {name: traces[name] for name in args.traces}
+
+    memory_peaks = None
+    if args.url:
+        callback_names = {}
+
+        def make_transport():
+            return HttpTransport(args.url)
+    else:
+        # Клиентский режим не нагружает сервер: в этом процессе приложение всегда серверное
+        config.CLIENTSIDE_MODE = '0'
+        import main
+        app = main.create_app(args.data)
+        callback_names = {output: entry['callback'].__name__ for output, entry in app.callback_map.items()
+                          if 'callback' in entry}
+
+        def make_transport():
+            return TestClientTransport(app)
+
+        memory_peaks = calibrate_memory(make_transport, traces, callback_names)
+
+    records, elapsed, rss_peak, errors = run(make_transport, traces, args.sessions, args.duration,
+                                             args.iterations, args.think, callback_names,
+                                             args.pid if args.url else None)
+    summary = summarize(records, elapsed, memory_peaks)
+    print_summary(summary, elapsed, rss_peak if (args.pid or not args.url) else None)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump({'sessions': args.sessions, 'elapsed_s': elapsed, 'peak_rss_bytes': rss_peak,
+                       'callbacks': summary}, file, indent=2)
+        print(f"summary saved to {args.output}")
+    if errors:
+        raise SystemExit(1)
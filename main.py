@@ -1,13 +1,51 @@
-import pandas as pd
+import hashlib
+import os
+import threading
+
 import dash_bootstrap_components as dbc
-from dash import Dash, dcc, html, Input, Output, no_update
+from dash import Dash, dcc, html, Input, Output, State, ALL, no_update, ctx, ClientsideFunction
 from dash import dash_table
 from graphfunc import print_tip_distribution, print_total_bill_distribution, print_time_boxplot, print_day_pie_chart, print_tip_vs_bill_scatter
-from graphfunc import calculate_statistics, create_interactive_stats
+from graphfunc import create_interactive_stats, stats_values, stats_group_values, STATS_VALUE_IDS
+from datastore import load_tips
+from dataset import TipsDataset
+from partitions import PartitionedDataset
+from sqlstore import SqlDataset, is_database
+from sampling import StratifiedSample
+from facets import facet_counts, facet_options
+from filterindex import FILTER_COLUMNS
+from ingest import CsvTailer, register_ingest_route
+from export import register_export_route
+from cache import LRUCache, filter_key
+from tablequery import apply_filter_query, get_page
+from clientdata import client_payload
+from metrics import registry, register_metrics, cache_collector, stage
+from serialization import figure_data, estimate_size, columnar, register_compression
+from background import ThreadPoolManager, check_cancelled
+import config
+
+# Общий кэш результатов фильтрации (позиций строк) для update_graph и update_table:
+# ограничен и по числу записей, и по объему, иначе 32 выборки большой таблицы не помещаются в память
+filter_cache = LRUCache(maxsize=config.FILTER_CACHE_SIZE, maxbytes=config.FILTER_CACHE_MAXBYTES,
+                        sizeof=lambda rows: rows.nbytes)
+# Кэш готовых фигур по (тип графика, версия данных, состояние фильтров): словарь фигуры
+# отдается Dash как есть, без повторной сборки
+figure_cache = LRUCache(maxsize=config.FIGURE_CACHE_SIZE, maxbytes=config.FIGURE_CACHE_MAXBYTES,
+                        sizeof=estimate_size)
+registry.collectors.append(cache_collector({'filter': filter_cache, 'figure': figure_cache}))
+# Датасет, метаданные кэша и режим фильтрации задаются в create_app
+dataset = None
+data_meta = None
+CLIENTSIDE = False
+# Стратифицированная выборка: графики по ней строятся в приближенном режиме и для данных,
+# которые не загружаются в память целиком; статистика по ней - только в приближенном режиме
+data_sample = None
+APPROXIMATE = False
+sample_lock = threading.Lock()
 
-# Загрузка данных
-df = pd.read_csv('tips.csv')
-app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
+# Оси графиков в долларах: при сериализации округляются только их координаты
+MONEY_AXES = {'tips': ('y',), 'total_bill': ('x',), 'time_boxplot': ('y',),
+              'day_pie': (), 'bill_scatter': ('x', 'y')}
 
 # Опции для выбора типа графика
 graph_options = [
@@ -19,287 +57,591 @@ graph_options = [
     {'label': "📋 Data Table", 'value': 'data_table'},
 ]
 
-app.layout = dbc.Container([
-    # Header
-    dbc.Row([
-        dbc.Col([
-            html.Div([
-                html.H1("Tips Analysis Dashboard", className="header-title"),
-                html.P("Interactive analysis of restaurant tipping patterns",
-                       className="header-subtitle"),
+# Варианты фильтров по колонкам; в подписи добавляется число подходящих строк
+filter_options = {
+    'day': [{'label': 'All Days', 'value': 'All'},
+            {'label': 'Thursday', 'value': 'Thur'},
+            {'label': 'Friday', 'value': 'Fri'},
+            {'label': 'Saturday', 'value': 'Sat'},
+            {'label': 'Sunday', 'value': 'Sun'}],
+    'sex': [{'label': 'All Genders', 'value': 'All'},
+            {'label': 'Male', 'value': 'Male'},
+            {'label': 'Female', 'value': 'Female'}],
+    'time': [{'label': 'All Times', 'value': 'All'},
+             {'label': 'Lunch', 'value': 'Lunch'},
+             {'label': 'Dinner', 'value': 'Dinner'}],
+    'smoker': [{'label': 'All', 'value': 'All'},
+               {'label': 'Smokers', 'value': 'Yes'},
+               {'label': 'Non-smokers', 'value': 'No'}],
+}
+
+def serve_layout():
+    # Layout строится при каждой загрузке страницы по текущей версии данных
+    snapshot = dataset.snapshot
+    bill_min, bill_max = snapshot.bill_range
+    return dbc.Container([
+        # Header
+        dbc.Row([
+            dbc.Col([
                 html.Div([
-                    html.Span("📊 5 Visualizations", className="badge-custom"),
-                    html.Span("⚡ Real-time", className="badge-custom"),
-                    html.Span("🎯 Smart Filters", className="badge-custom")
-                ], className="text-center mt-3")
-            ], className="dashboard-header text-center p-5")
-        ], width=12)
-    ], className="mb-4"),
-
-    # Статистика
-    html.Div(id='stats-container', children=create_interactive_stats(df), className="fade-in"),
-
-    # Кнопка сброса
-    dbc.Row([
-        dbc.Col([
-            dbc.Button("🔄 Reset All Filters",
-                      id='reset-button',
-                      n_clicks=0,
-                      color="danger",
-                      className="btn-custom-primary mb-4")
-        ], width=12)
-    ]),
-
-    # Выбор типа отображения
-    dbc.Card([
-        dbc.CardHeader(html.H4("📈 Visualization Type", className="card-title"),
-                      className="card-header-custom"),
-        dbc.CardBody([
-            dbc.RadioItems(
-                id='graph-type',
-                options=graph_options,
-                value='tips',
-                inline=True,
-                className="radio-group-custom"
-            )
-        ])
-    ], className="custom-card mb-4"),
-
-    # Фильтры
-    dbc.Card([
-        dbc.CardHeader(html.H4("🔧 Data Filters", className="card-title"),
-                      className="card-header-custom"),
-        dbc.CardBody([
-            dbc.Row([
-                dbc.Col([
-                    dbc.Label("📅 Day of Week", className="fw-bold mb-2"),
-                    dcc.Dropdown(
-                        id='day-dropdown',
-                        options=[
-                            {'label': 'All Days', 'value': 'All'},
-                            {'label': 'Thursday', 'value': 'Thur'},
-                            {'label': 'Friday', 'value': 'Fri'},
-                            {'label': 'Saturday', 'value': 'Sat'},
-                            {'label': 'Sunday', 'value': 'Sun'}
-                        ],
-                        value='All',
-                        clearable=False
-                    )
-                ], md=3, className="mb-3"),
-
-                dbc.Col([
-                    dbc.Label("⏰ Time of Day", className="fw-bold mb-2"),
-                    dcc.Dropdown(
-                        id='time-dropdown',
-                        options=[
-                            {'label': 'All Times', 'value': 'All'},
-                            {'label': 'Lunch', 'value': 'Lunch'},
-                            {'label': 'Dinner', 'value': 'Dinner'}
-                        ],
-                        value='All',
-                        clearable=False
-                    )
-                ], md=3, className="mb-3"),
-
-                dbc.Col([
-                    dbc.Label("👥 Gender", className="fw-bold mb-2"),
-                    dcc.Dropdown(
-                        id='gender-dropdown',
-                        options=[
-                            {'label': 'All Genders', 'value': 'All'},
-                            {'label': 'Male', 'value': 'Male'},
-                            {'label': 'Female', 'value': 'Female'}
-                        ],
-                        value='All',
-                        clearable=False
-                    )
-                ], md=3, className="mb-3"),
-
-                dbc.Col([
-                    dbc.Label("🚬 Smoker Status", className="fw-bold mb-2"),
-                    dbc.RadioItems(
-                        id='smoker-filter',
-                        options=[
-                            {'label': 'All', 'value': 'All'},
-                            {'label': 'Smokers', 'value': 'Yes'},
-                            {'label': 'Non-smokers', 'value': 'No'}
-                        ],
-                        value='All',
-                        inline=True
-                    )
-                ], md=3, className="mb-3")
-            ]),
-
-            # Слайдер счета
-            dbc.Row([
-                dbc.Col([
-                    dbc.Label("💰 Bill Amount Range", className="fw-bold mb-3"),
-                    dcc.RangeSlider(
-                        id='bill-range',
-                        min=df['total_bill'].min(),
-                        max=df['total_bill'].max(),
-                        step=5,
-                        marks={i: f'${i}' for i in range(0, 55, 10)},
-                        value=[df['total_bill'].min(), df['total_bill'].max()],
-                        tooltip={"placement": "bottom", "always_visible": True}
-                    )
-                ], width=12)
-            ], className="mt-4"),
-
-            # Фильтр колонок таблицы
-            dbc.Row([
-                dbc.Col([
-                    html.Div(
-                        id='column-filter-container',
-                        children=[
-                            dbc.Label("📋 Table Columns", className="fw-bold mb-2"),
-                            dcc.Dropdown(
-                                id='column-selector',
-                                options=[{'label': col, 'value': col} for col in df.columns],
-                                value=df.columns.tolist(),
-                                multi=True,
-                                clearable=False
-                            )
-                        ],
-                        style={'display': 'none'}
-                    )
-                ], width=12)
-            ], className="mt-4")
-        ])
-    ], className="custom-card mb-4"),
-
-    # График/Таблица
-    dbc.Row([
-        dbc.Col([
-            dbc.Card([
-                dbc.CardBody([
-                    html.Div(id='graph-container', children=[
-                        dcc.Graph(id='graph-output')
-                    ]),
-                    html.Div(id='table-container', children=[
-                        dash_table.DataTable(
-                            id='data-table',
-                            columns=[],
-                            data=[],
-                            page_size=10,
-                            style_table={'overflowX': 'auto'},
-                            style_cell={'textAlign': 'left', 'padding': '12px'},
-                            style_header={'backgroundColor': '#667eea', 'color': 'white'},
-                            filter_action="native",
-                            sort_action="native",
-                            page_action="native"
+                    html.H1("Tips Analysis Dashboard", className="header-title"),
+                    html.P("Interactive analysis of restaurant tipping patterns",
+                           className="header-subtitle"),
+                    html.Div([
+                        html.Span("📊 5 Visualizations", className="badge-custom"),
+                        html.Span("⚡ Real-time", className="badge-custom"),
+                        html.Span("🎯 Smart Filters", className="badge-custom")
+                    ], className="text-center mt-3")
+                ], className="dashboard-header text-center p-5")
+            ], width=12)
+        ], className="mb-4"),
+
+        # Версия данных и периодическая проверка новых строк
+        dcc.Store(id='data-version', data=snapshot.version),
+        dcc.Interval(id='refresh-interval', interval=config.LIVE_REFRESH_SECONDS * 1000,
+                     disabled=config.LIVE_REFRESH_SECONDS <= 0),
+        # Колоночный набор данных для клиентского режима
+        dcc.Store(id='client-data',
+                  data=client_payload(snapshot, config.SCATTER_WEBGL_THRESHOLD) if CLIENTSIDE else None),
+        # Текущая страница таблицы в колоночном виде (серверный режим)
+        dcc.Store(id='table-page'),
+        # Исходные подписи вариантов фильтров для счетчиков в клиентском режиме
+        dcc.Store(id='filter-options', data=filter_options),
+
+        # Статистика
+        html.Div(id='stats-container', children=create_interactive_stats(
+            stats=view_statistics(snapshot, filter_key('All', 'All', 'All', 'All', snapshot.bill_range)),
+            categories=snapshot.categories), className="fade-in"),
+        # Признак приближенного режима: по скольким строкам выборки построены график и статистика
+        html.Div(id='sample-indicator', className="text-center text-muted mb-4", style={'display': 'none'}),
+
+        # Кнопка сброса
+        dbc.Row([
+            dbc.Col([
+                dbc.Button("🔄 Reset All Filters",
+                          id='reset-button',
+                          n_clicks=0,
+                          color="danger",
+                          className="btn-custom-primary mb-4")
+            ], width=12)
+        ]),
+
+        # Выбор типа отображения
+        dbc.Card([
+            dbc.CardHeader(html.H4("📈 Visualization Type", className="card-title"),
+                          className="card-header-custom"),
+            dbc.CardBody([
+                dbc.RadioItems(
+                    id='graph-type',
+                    options=graph_options,
+                    value='tips',
+                    inline=True,
+                    className="radio-group-custom"
+                )
+            ])
+        ], className="custom-card mb-4"),
+
+        # Фильтры
+        dbc.Card([
+            dbc.CardHeader(html.H4("🔧 Data Filters", className="card-title"),
+                          className="card-header-custom"),
+            dbc.CardBody([
+                dbc.Row([
+                    dbc.Col([
+                        dbc.Label("📅 Day of Week", className="fw-bold mb-2"),
+                        dcc.Dropdown(
+                            id='day-dropdown',
+                            options=filter_options['day'],
+                            value='All',
+                            clearable=False
+                        )
+                    ], md=3, className="mb-3"),
+
+                    dbc.Col([
+                        dbc.Label("⏰ Time of Day", className="fw-bold mb-2"),
+                        dcc.Dropdown(
+                            id='time-dropdown',
+                            options=filter_options['time'],
+                            value='All',
+                            clearable=False
                         )
-                    ], style={'display': 'none'})
-                ])
-            ], className="custom-card")
-        ], width=12)
-    ]),
-
-    # Футер
-    dbc.Row([
-        dbc.Col([
-            html.Div([
-                html.Img(src="/assets/images/otus_logo.png", height=40, className="me-3"),
-                html.Span("© 2025 OTUS - Data Science Platform",
-                         className="text-muted")
-            ], className="footer-custom text-center p-4")
-        ], width=12)
-    ], className="mt-5")
-
-], fluid=True)
-
-# Callback функции (остаются без изменений)
-@app.callback(
-    [Output('day-dropdown', 'value'),
-     Output('gender-dropdown', 'value'),
-     Output('time-dropdown', 'value'),
-     Output('smoker-filter', 'value'),
-     Output('graph-type', 'value'),
-     Output('column-selector', 'value'),
-     Output('bill-range','value')],
-    Input('reset-button', 'n_clicks'),
-    prevent_initial_call=True
-)
+                    ], md=3, className="mb-3"),
+
+                    dbc.Col([
+                        dbc.Label("👥 Gender", className="fw-bold mb-2"),
+                        dcc.Dropdown(
+                            id='gender-dropdown',
+                            options=filter_options['sex'],
+                            value='All',
+                            clearable=False
+                        )
+                    ], md=3, className="mb-3"),
+
+                    dbc.Col([
+                        dbc.Label("🚬 Smoker Status", className="fw-bold mb-2"),
+                        dbc.RadioItems(
+                            id='smoker-filter',
+                            options=filter_options['smoker'],
+                            value='All',
+                            inline=True
+                        )
+                    ], md=3, className="mb-3")
+                ]),
+
+                # Слайдер счета
+                dbc.Row([
+                    dbc.Col([
+                        dbc.Label("💰 Bill Amount Range", className="fw-bold mb-3"),
+                        dcc.RangeSlider(
+                            id='bill-range',
+                            min=bill_min,
+                            max=bill_max,
+                            step=5,
+                            marks={i: f'${i}' for i in range(0, 55, 10)},
+                            value=[bill_min, bill_max],
+                            tooltip={"placement": "bottom", "always_visible": True}
+                        ),
+                        # Диапазон, на который реагируют графики: значение после отпускания
+                        # слайдера или после паузы при перетаскивании
+                        dcc.Store(id='bill-range-debounced', data=[bill_min, bill_max]),
+                        dcc.Store(id='debounce-ms', data=config.SLIDER_DEBOUNCE_MS)
+                    ], width=12)
+                ], className="mt-4"),
+
+                # Фильтр колонок таблицы
+                dbc.Row([
+                    dbc.Col([
+                        html.Div(
+                            id='column-filter-container',
+                            children=[
+                                dbc.Label("📋 Table Columns", className="fw-bold mb-2"),
+                                dcc.Dropdown(
+                                    id='column-selector',
+                                    options=[{'label': col, 'value': col} for col in snapshot.columns],
+                                    value=snapshot.columns,
+                                    multi=True,
+                                    clearable=False
+                                )
+                            ],
+                            style={'display': 'none'}
+                        )
+                    ], width=12)
+                ], className="mt-4")
+            ])
+        ], className="custom-card mb-4"),
+
+        # График/Таблица
+        dbc.Row([
+            dbc.Col([
+                dbc.Card([
+                    dbc.CardBody([
+                        html.Div(id='graph-container', children=[
+                            dcc.Graph(id='graph-output')
+                        ]),
+                        html.Div(id='table-container', children=[
+                            dash_table.DataTable(
+                                id='data-table',
+                                columns=[],
+                                data=[],
+                                page_size=10,
+                                page_current=0,
+                                style_table={'overflowX': 'auto'},
+                                style_cell={'textAlign': 'left', 'padding': '12px'},
+                                style_header={'backgroundColor': '#667eea', 'color': 'white'},
+                                # Страница, сортировка и фильтр считаются на сервере,
+                                # а в клиентском режиме - самой таблицей в браузере
+                                filter_action="native" if CLIENTSIDE else "custom",
+                                filter_query='',
+                                sort_action="native" if CLIENTSIDE else "custom",
+                                sort_mode="multi",
+                                sort_by=[],
+                                page_action="native" if CLIENTSIDE else "custom"
+                            ),
+                            # Выгрузка всех строк текущего вида потоком
+                            html.Div([
+                                html.A("⬇️ CSV", id='export-csv', href='/export.csv',
+                                       className="btn btn-outline-primary btn-sm me-2"),
+                                html.A("⬇️ Parquet", id='export-parquet', href='/export.parquet',
+                                       className="btn btn-outline-primary btn-sm")
+                            ], className="mt-3")
+                        ], style={'display': 'none'})
+                    ])
+                ], className="custom-card")
+            ], width=12)
+        ]),
+
+        # Футер
+        dbc.Row([
+            dbc.Col([
+                html.Div([
+                    html.Img(src="/assets/images/otus_logo.png", height=40, className="me-3"),
+                    html.Span("© 2025 OTUS - Data Science Platform",
+                             className="text-muted")
+                ], className="footer-custom text-center p-4")
+            ], width=12)
+        ], className="mt-5")
+
+    ], fluid=True)
+
+# Callback функции
 def reset_filters(n_clicks):
     if n_clicks > 0:
-        return 'All', 'All', 'All', 'All', 'tips', df.columns.tolist(), [df['total_bill'].min(), df['total_bill'].max()]
+        snapshot = dataset.snapshot
+        return 'All', 'All', 'All', 'All', 'tips', snapshot.columns, list(snapshot.bill_range)
     return no_update
 
-@app.callback(
-    [Output('graph-container', 'style'),
-     Output('table-container', 'style'),
-     Output('column-filter-container', 'style')],
-    Input('graph-type', 'value')
-)
-def toggle_display_type(graph_type):
-    if graph_type == 'data_table':
-        return {'display': 'none'}, {'display': 'block'}, {'display': 'block'}
+def refresh_data(n_intervals, known_version, bill_min, bill_max, bill_range):
+    # Открытые дашборды обновляются, только если появились новые строки. Версия растет
+    # вместе с данными: процесс, который еще не прочитал новые строки, ее не откатывает
+    snapshot = dataset.snapshot
+    if known_version is not None and snapshot.version <= known_version:
+        return no_update, no_update, no_update, no_update
+    new_min, new_max = snapshot.bill_range
+    # Если был выбран весь диапазон счета, он расширяется вместе с данными
+    if bill_range == [bill_min, bill_max]:
+        bill_range = [new_min, new_max]
     else:
-        return {'display': 'block'}, {'display': 'none'}, {'display': 'none'}
-
-@app.callback(
-    Output('graph-output', 'figure'),
-    Input('day-dropdown', 'value'),
-    Input('graph-type', 'value'),
-    Input('gender-dropdown', 'value'),
-    Input('time-dropdown', 'value'),
-    Input('smoker-filter', 'value'),
-    Input('bill-range', 'value'),
-)
-def update_graph(selected_day, graph_type, selected_gender, selected_time, smoker_status, bill_range):
+        bill_range = no_update
+    return snapshot.version, new_min, new_max, bill_range
+
+def update_graph(selected_day, graph_type, selected_gender, selected_time, smoker_status, bill_range, data_version):
     if graph_type == 'data_table':
         return no_update
 
-    filtered_df = apply_filters(df, selected_day, selected_gender, selected_time, smoker_status, bill_range)
-
-    if graph_type == 'tips':
-        return print_tip_distribution(filtered_df, selected_day)
-    elif graph_type == 'total_bill':
-        return print_total_bill_distribution(filtered_df, selected_day)
-    elif graph_type == 'time_boxplot':
-        return print_time_boxplot(filtered_df)
-    elif graph_type == 'day_pie':
-        return print_day_pie_chart(filtered_df)
-    elif graph_type == 'bill_scatter':
-        return print_tip_vs_bill_scatter(filtered_df)
-
-@app.callback(
-    [Output('data-table', 'columns'),
-     Output('data-table', 'data')],
-    [Input('day-dropdown', 'value'),
-     Input('gender-dropdown', 'value'),
-     Input('time-dropdown', 'value'),
-     Input('smoker-filter', 'value'),
-     Input('bill-range', 'value'),
-     Input('column-selector', 'value')]
-)
-def update_table(selected_day, selected_gender, selected_time, smoker_status, bill_range, selected_columns):
-    filtered_df = apply_filters(df, selected_day, selected_gender, selected_time, smoker_status, bill_range)
-    filtered_df = filtered_df[selected_columns]
-    columns = [{"name": col, "id": col} for col in filtered_df.columns]
-    data = filtered_df.to_dict('records')
-    return columns, data
-
-@app.callback(
-    Output('stats-container', 'children'),
-    Input('day-dropdown', 'value'),
-    Input('gender-dropdown', 'value'),
-    Input('time-dropdown', 'value'),
-    Input('smoker-filter', 'value'),
-    Input('bill-range', 'value')
-)
-def update_stats(selected_day, selected_gender, selected_time, smoker_status, bill_range):
-    filtered_df = apply_filters(df, selected_day, selected_gender, selected_time, smoker_status, bill_range)
-    return create_interactive_stats(filtered_df)
-
-def apply_filters(dataframe, day, gender, time, smoker, bill_range):
-    filtered_df = dataframe.copy()
-    if day != 'All': filtered_df = filtered_df[filtered_df['day'] == day]
-    if gender != 'All': filtered_df = filtered_df[filtered_df['sex'] == gender]
-    if time != 'All': filtered_df = filtered_df[filtered_df['time'] == time]
-    if smoker != 'All': filtered_df = filtered_df[filtered_df['smoker'] == smoker]
-    filtered_df = filtered_df[(filtered_df['total_bill'] >= bill_range[0]) & (filtered_df['total_bill'] <= bill_range[1])]
-    return filtered_df
+    snapshot = dataset.snapshot
+    key = filter_key(selected_day, selected_gender, selected_time, smoker_status, bill_range)
+    return figure_cache.get_or_compute((graph_type, snapshot.version, key),
+                                       lambda: render_figure(snapshot, graph_type, key))
+
+def render_figure(snapshot, graph_type, key):
+    # Строит фигуру для набора фильтров и возвращает ее словарем для ответа Dash
+    selected_day, selected_gender, selected_time, smoker_status, bill_range = key
+    if data_sample is not None:
+        # График строится по равномерной выборке подходящих строк
+        with stage('filter'):
+            filtered_df, exact = current_sample(snapshot).view(*key)
+    else:
+        filtered_df = apply_filters(snapshot, selected_day, selected_gender, selected_time, smoker_status, bill_range)
+        exact = True
+
+    # Фоновая задача, которую уже отменил новый запрос, прерывается между этапами
+    check_cancelled()
+    with stage('render'):
+        if graph_type == 'tips':
+            fig = print_tip_distribution(filtered_df, selected_day)
+        elif graph_type == 'total_bill':
+            fig = print_total_bill_distribution(filtered_df, selected_day)
+        elif graph_type == 'time_boxplot':
+            fig = print_time_boxplot(filtered_df)
+        elif graph_type == 'day_pie':
+            fig = print_day_pie_chart(filtered_df)
+        elif graph_type == 'bill_scatter':
+            fig = print_tip_vs_bill_scatter(filtered_df,
+                                            webgl_threshold=config.SCATTER_WEBGL_THRESHOLD,
+                                            density_threshold=config.SCATTER_DENSITY_THRESHOLD)
+        else:
+            return None
+        if not exact:
+            fig.update_layout(title_text=f"{fig.layout.title.text} · sample of {len(filtered_df):,} rows")
+    check_cancelled()
+    with stage('serialize'):
+        return figure_data(fig, config.FLOAT_DECIMALS, MONEY_AXES[graph_type])
+
+def prewarm_figures():
+    # Заранее строит графики для состояния без фильтров (как после сброса)
+    snapshot = dataset.snapshot
+    key = filter_key('All', 'All', 'All', 'All', snapshot.bill_range)
+    for option in graph_options:
+        graph_type = option['value']
+        if graph_type != 'data_table':
+            figure_cache.get_or_compute((graph_type, snapshot.version, key),
+                                        lambda: render_figure(snapshot, graph_type, key))
+
+def update_table(selected_day, selected_gender, selected_time, smoker_status, bill_range, selected_columns,
+                 page_current, page_size, sort_by, filter_query, data_version):
+    snapshot = dataset.snapshot
+    # При смене фильтров или сортировки возвращаемся на первую страницу
+    if 'data-table.page_current' not in ctx.triggered_prop_ids:
+        page_current = 0
+    if not isinstance(dataset, TipsDataset):
+        # Части и база не загружаются в память целиком: страница читается запросом
+        # или просмотром порций частей
+        with stage('filter'):
+            page, n_rows = snapshot.table_page(*filter_key(selected_day, selected_gender, selected_time,
+                                                           smoker_status, bill_range),
+                                               selected_columns, filter_query, sort_by, page_current, page_size)
+    else:
+        filtered_df = apply_filters(snapshot, selected_day, selected_gender, selected_time, smoker_status, bill_range,
+                                    selected_columns)
+        with stage('filter'):
+            filtered_df = apply_filter_query(filtered_df, filter_query)
+        # Сериализуется только текущая страница
+        with stage('aggregate'):
+            page = get_page(filtered_df, page_current, page_size, sort_by)
+        n_rows = len(filtered_df)
+    columns = [{"name": col, "id": col,
+                "type": 'numeric' if page[col].dtype.kind in 'iuf' else 'text'}
+               for col in page.columns]
+    page_count = max(1, -(-n_rows // page_size))
+    # Страница уходит в колоночном виде, записи для таблицы собираются в браузере
+    with stage('serialize'):
+        data = columnar(page, config.FLOAT_DECIMALS)
+    return columns, data, page_count, page_current
+
+def update_stats(selected_day, selected_gender, selected_time, smoker_status, bill_range, data_version):
+    # Статистика собирается из ячеек куба, без прохода по строкам
+    with stage('aggregate'):
+        stats = view_statistics(dataset.snapshot, filter_key(selected_day, selected_gender, selected_time,
+                                                             smoker_status, bill_range))
+    # Отправляются только значения, а не все дерево карточек
+    with stage('render'):
+        slots = [output['id'] for output in ctx.outputs_list[len(STATS_VALUE_IDS)]]
+        group_texts, group_styles = stats_group_values(stats, slots)
+        values = stats_values(stats)
+    return *values, group_texts, group_styles
+
+def update_sample_indicator(selected_day, selected_gender, selected_time, smoker_status, bill_range, data_version):
+    # Показывается, только если график и статистика построены не по всем подходящим строкам
+    snapshot = dataset.snapshot
+    key = filter_key(selected_day, selected_gender, selected_time, smoker_status, bill_range)
+    sample = current_sample(snapshot)
+    stats = sample.statistics(*key)
+    if stats['exact']:
+        return '', {'display': 'none'}
+    view_rows, sample_rows, total = (f"{n:,}".replace(',', ' ') for n in
+                                     (len(sample.view(*key)[0]), stats['sample_rows'], stats['total_records']))
+    return (f"🎲 Приближенный режим: график построен по {view_rows} строкам выборки, "
+            f"статистика — по {sample_rows} строкам из ~{total}; ± — 95% доверительный интервал"), {}
+
+def update_facets(selected_day, selected_gender, selected_time, smoker_status, bill_range, data_version):
+    # Счетчики всех фильтров считаются вместе по числам строк в ячейках (day, sex, time, smoker)
+    snapshot = dataset.snapshot
+    key = filter_key(selected_day, selected_gender, selected_time, smoker_status, bill_range)
+    source = current_sample(snapshot) if APPROXIMATE else snapshot
+    with stage('aggregate'):
+        facets = facet_counts(source.cell_counts(key[-1]), source.categories, *key[:-1])
+    with stage('render'):
+        return [facet_options(filter_options[column], facets[column], value, approximate=APPROXIMATE)
+                for column, value in zip(FILTER_COLUMNS, key[:-1])]
+
+def view_statistics(snapshot, key):
+    # В приближенном режиме статистика оценивается по выборке
+    if APPROXIMATE:
+        return current_sample(snapshot).statistics(*key)
+    return snapshot.statistics(*key)
+
+def current_sample(snapshot):
+    # Выборка догоняет версию данных: новые строки добавляются к ней без полного прохода
+    global data_sample
+    with sample_lock:
+        data_sample = data_sample.extend(snapshot)
+        return data_sample
+
+def apply_filters(snapshot, day, gender, time, smoker, bill_range, columns=None):
+    # Выборка строк по индексу. Один выбор фильтра запускает три callback'а, поэтому
+    # кэшируются позиции строк, а таблица собирается каждым только из нужных ему колонок
+    key = filter_key(day, gender, time, smoker, bill_range)
+    with stage('filter'):
+        rows = filter_cache.get_or_compute(
+            (snapshot.version, key), lambda: snapshot.select(*key))
+        return snapshot.take(rows, columns)
+
+def refresh_client_data(data_version):
+    # Новая версия данных отправляется в браузер целиком
+    return client_payload(dataset.snapshot, config.SCATTER_WEBGL_THRESHOLD)
+
+# Фильтры, от которых зависят график, таблица и статистика
+FILTER_INPUTS = [Input('day-dropdown', 'value'),
+                 Input('gender-dropdown', 'value'),
+                 Input('time-dropdown', 'value'),
+                 Input('smoker-filter', 'value'),
+                 Input('bill-range-debounced', 'data')]
+GRAPH_OUTPUT = Output('graph-output', 'figure')
+GRAPH_INPUTS = FILTER_INPUTS[:1] + [Input('graph-type', 'value')] + FILTER_INPUTS[1:]
+FACET_OUTPUTS = [Output('day-dropdown', 'options'),
+                 Output('gender-dropdown', 'options'),
+                 Output('time-dropdown', 'options'),
+                 Output('smoker-filter', 'options')]
+STATS_OUTPUTS = ([Output(value_id, 'children') for value_id in STATS_VALUE_IDS] +
+                 [Output({'type': 'stats-group-value', 'group': ALL, 'value': ALL}, 'children'),
+                  Output({'type': 'stats-group-row', 'group': ALL, 'value': ALL}, 'style')])
+
+
+def create_app(data_path=None, background=None, partition_processes=None):
+    """
+    Создает приложение: загружает данные, строит индексы и куб статистики,
+    регистрирует маршруты и callback'и. Фоновые задачи запускаются отдельно
+    (start_background_tasks), в том процессе, который будет обслуживать запросы.
+    background - строить графики фоновыми callback'ами, partition_processes - размер
+    пула для набора из частей (по умолчанию оба из config)
+    """
+    global dataset, data_meta, CLIENTSIDE, data_sample, APPROXIMATE
+    data_path = data_path or config.DATA_PATH
+    if os.path.isdir(data_path):
+        # Каталог CSV-частей: в память загружаются только метаданные частей
+        dataset = PartitionedDataset(data_path, processes=partition_processes or config.PARTITION_PROCESSES)
+        data_meta = {'source': os.path.abspath(data_path), 'rows': dataset.snapshot.n_rows,
+                     'identity': fingerprint(*(meta['sha256'] for _, meta in dataset.snapshot.partitions))}
+    elif is_database(data_path):
+        # Встроенная база (SQLite/DuckDB): фильтры и статистика выполняются запросами
+        dataset = SqlDataset(data_path, table=config.SQL_TABLE)
+        stat = os.stat(data_path)
+        data_meta = {'source': os.path.abspath(data_path), 'rows': dataset.snapshot.n_rows,
+                     'identity': fingerprint(stat.st_size, stat.st_mtime_ns)}
+    else:
+        # Загрузка данных из колоночного кэша (memory-map), CSV разбирается только при изменении
+        df, data_meta = load_tips(data_path, with_meta=True)
+        data_meta = {**data_meta, 'identity': data_meta['sha256']}
+        # Датасет с индексом фильтрации и кубом статистики, дополняемый на лету
+        dataset = TipsDataset(df, bucket_width=config.STATS_BUCKET_WIDTH)
+    # Небольшие наборы данных фильтруются прямо в браузере (assets/clientside.js),
+    # если явно не включен приближенный режим
+    CLIENTSIDE = config.CLIENTSIDE_MODE == '1' or (
+        config.CLIENTSIDE_MODE == 'auto' and not config.SAMPLING
+        and dataset.snapshot.n_rows <= config.CLIENTSIDE_MAX_ROWS)
+    APPROXIMATE = config.SAMPLING and not CLIENTSIDE
+    # Стратифицированная выборка строится одним проходом по данным
+    data_sample = (StratifiedSample.build(dataset.snapshot, config.SAMPLE_CELL_ROWS)
+                   if APPROXIMATE or (not isinstance(dataset, TipsDataset) and not CLIENTSIDE) else None)
+    filter_cache.clear()
+    figure_cache.clear()
+
+    app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
+    app.layout = serve_layout
+    # Локальная загрузка новых строк пакетами: POST /ingest
+    register_ingest_route(app.server, dataset)
+    # Потоковая выгрузка отфильтрованных строк: GET /export.csv, /export.parquet
+    register_export_route(app.server, dataset, config.EXPORT_CHUNK_ROWS, data_meta['identity'])
+    if background is None:
+        background = config.BACKGROUND_CALLBACKS
+    register_callbacks(app, ThreadPoolManager(config.BACKGROUND_WORKERS) if background else None)
+    # Время callback'ов по этапам: заголовок Server-Timing и GET /metrics
+    if config.METRICS:
+        register_metrics(app)
+    # Сжатие ответов; размер в метриках - уже сжатый
+    if config.COMPRESS:
+        register_compression(app.server, config.COMPRESS_MIN_SIZE, config.COMPRESS_LEVEL)
+    return app
+
+def fingerprint(*parts):
+    # Отпечаток данных, одинаковый во всех процессах и после перезапуска
+    return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+def register_callbacks(app, manager=None):
+    # Обработка данных регистрируется на сервере или в браузере в зависимости от режима.
+    # С manager графики строятся фоновыми callback'ами на его пуле
+    app.callback(
+        [Output('day-dropdown', 'value'),
+         Output('gender-dropdown', 'value'),
+         Output('time-dropdown', 'value'),
+         Output('smoker-filter', 'value'),
+         Output('graph-type', 'value'),
+         Output('column-selector', 'value'),
+         Output('bill-range','value')],
+        Input('reset-button', 'n_clicks'),
+        prevent_initial_call=True
+    )(reset_filters)
+    app.callback(
+        [Output('data-version', 'data'),
+         Output('bill-range', 'min'),
+         Output('bill-range', 'max'),
+         Output('bill-range', 'value', allow_duplicate=True)],
+        Input('refresh-interval', 'n_intervals'),
+        State('data-version', 'data'),
+        State('bill-range', 'min'),
+        State('bill-range', 'max'),
+        State('bill-range', 'value'),
+        prevent_initial_call=True
+    )(refresh_data)
+
+    # Переключение графика и таблицы не требует данных и всегда выполняется в браузере
+    app.clientside_callback(
+        ClientsideFunction(namespace='tips', function_name='toggleDisplay'),
+        [Output('graph-container', 'style'),
+         Output('table-container', 'style'),
+         Output('column-filter-container', 'style')],
+        Input('graph-type', 'value')
+    )
+    # Ссылки выгрузки повторяют фильтры, колонки и filter_query таблицы
+    app.clientside_callback(
+        ClientsideFunction(namespace='tips', function_name='exportLinks'),
+        [Output('export-csv', 'href'), Output('export-parquet', 'href')],
+        *FILTER_INPUTS, Input('column-selector', 'value'), Input('data-table', 'filter_query')
+    )
+    # Перетаскивание слайдера обновляет данные только после паузы
+    app.clientside_callback(
+        ClientsideFunction(namespace='tips', function_name='debounceRange'),
+        Output('bill-range-debounced', 'data'),
+        Input('bill-range', 'value'),
+        Input('bill-range', 'drag_value'),
+        State('debounce-ms', 'data')
+    )
+
+    if CLIENTSIDE:
+        # Данные уже в браузере: сервер только обновляет их при появлении новой версии
+        app.callback(Output('client-data', 'data'), Input('data-version', 'data'),
+                     prevent_initial_call=True)(refresh_client_data)
+        app.clientside_callback(ClientsideFunction(namespace='tips', function_name='updateGraph'),
+                                GRAPH_OUTPUT, *GRAPH_INPUTS, Input('client-data', 'data'))
+        app.clientside_callback(ClientsideFunction(namespace='tips', function_name='updateTable'),
+                                [Output('data-table', 'columns'), Output('data-table', 'data')],
+                                *FILTER_INPUTS, Input('column-selector', 'value'),
+                                Input('client-data', 'data'))
+        app.clientside_callback(ClientsideFunction(namespace='tips', function_name='updateFacets'),
+                                FACET_OUTPUTS, *FILTER_INPUTS, Input('client-data', 'data'),
+                                State('filter-options', 'data'))
+        app.clientside_callback(ClientsideFunction(namespace='tips', function_name='updateStats'),
+                                STATS_OUTPUTS, *FILTER_INPUTS, Input('client-data', 'data'),
+                                State({'type': 'stats-group-value', 'group': ALL, 'value': ALL}, 'id'))
+    else:
+        if manager is not None:
+            # Новый запрос графика из той же сессии отменяет предыдущий (oldJob)
+            app.callback(GRAPH_OUTPUT, *GRAPH_INPUTS, Input('data-version', 'data'),
+                         background=True, manager=manager,
+                         interval=config.BACKGROUND_POLL_MS)(update_graph)
+        else:
+            app.callback(GRAPH_OUTPUT, *GRAPH_INPUTS, Input('data-version', 'data'))(update_graph)
+        app.callback(
+            [Output('data-table', 'columns'),
+             Output('table-page', 'data'),
+             Output('data-table', 'page_count'),
+             Output('data-table', 'page_current')],
+            FILTER_INPUTS +
+            [Input('column-selector', 'value'),
+             Input('data-table', 'page_current'),
+             Input('data-table', 'page_size'),
+             Input('data-table', 'sort_by'),
+             Input('data-table', 'filter_query'),
+             Input('data-version', 'data')]
+        )(update_table)
+        app.clientside_callback(ClientsideFunction(namespace='tips', function_name='tableRecords'),
+                                Output('data-table', 'data'), Input('table-page', 'data'))
+        app.callback(STATS_OUTPUTS, *FILTER_INPUTS, Input('data-version', 'data'))(update_stats)
+        app.callback(FACET_OUTPUTS, *FILTER_INPUTS, Input('data-version', 'data'))(update_facets)
+        if APPROXIMATE:
+            app.callback([Output('sample-indicator', 'children'), Output('sample-indicator', 'style')],
+                         *FILTER_INPUTS, Input('data-version', 'data'))(update_sample_indicator)
+
+def start_background_tasks(prewarm=True):
+    """
+    Фоновые потоки не переживают fork, поэтому запускаются в каждом рабочем процессе
+    """
+    # Дописанные в CSV строки подхватываются без перезапуска; части и база только читаются
+    if config.LIVE_TAIL and isinstance(dataset, TipsDataset) and 'size' in data_meta:
+        CsvTailer(data_meta['source'], dataset, offset=data_meta['size'],
+                  interval=config.LIVE_TAIL_INTERVAL).start()
+
+    if prewarm and config.PREWARM_FIGURES:
+        threading.Thread(target=prewarm_figures, daemon=True).start()
+
+    if isinstance(dataset, PartitionedDataset):
+        # Пул процессов для частей запускается заранее, чтобы первый запрос его не ждал
+        snapshot = dataset.snapshot
+        threading.Thread(target=snapshot.statistics, daemon=True,
+                         args=('All', 'All', 'All', 'All', snapshot.bill_range)).start()
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    # Режим разработки: один процесс с отладкой; для production - serve.py
+    app = create_app()
+    start_background_tasks()
+    app.run(debug=True)
@@ -0,0 +1,185 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import Response, g, has_request_context, request
+
+from ingest import LOCAL_ADDRESSES
+
+# Границы корзин гистограмм: время ответа callback'а и этапов, с; размер ответа, байт
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PAYLOAD_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+class Histogram:
+    """
+    Гистограмма в формате Prometheus: накопительные счетчики по корзинам, сумма и количество
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_sum{{{labels}}} {self.sum}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+class MetricsRegistry:
+    """
+    Метрики callback'ов процесса: время ответа, время этапов и размер ответа
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = {}
+        self.stages = {}
+        self.payload = {}
+        # Функции, возвращающие дополнительные строки метрик (например, статистику кэшей)
+        self.collectors = []
+
+    def _observe(self, histograms, key, buckets, value):
+        with self._lock:
+            histogram = histograms.get(key)
+            if histogram is None:
+                histogram = histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def observe_latency(self, callback, seconds):
+        self._observe(self.latency, callback, LATENCY_BUCKETS, seconds)
+
+    def observe_stage(self, callback, stage_name, seconds):
+        self._observe(self.stages, (callback, stage_name), LATENCY_BUCKETS, seconds)
+
+    def observe_payload(self, callback, size):
+        self._observe(self.payload, callback, PAYLOAD_BUCKETS, size)
+
+    def render(self):
+        """
+        Текстовый формат экспозиции Prometheus
+        """
+        lines = []
+        with self._lock:
+            lines += ['# HELP tips_callback_latency_seconds Callback request latency.',
+                      '# TYPE tips_callback_latency_seconds histogram']
+            for callback, histogram in sorted(self.latency.items()):
+                lines += histogram.lines('tips_callback_latency_seconds', f'callback="{callback}"')
+            lines += ['# HELP tips_callback_stage_seconds Time spent in each callback stage.',
+                      '# TYPE tips_callback_stage_seconds histogram']
+            for (callback, stage_name), histogram in sorted(self.stages.items()):
+                lines += histogram.lines('tips_callback_stage_seconds',
+                                         f'callback="{callback}",stage="{stage_name}"')
+            lines += ['# HELP tips_callback_response_bytes Callback response payload size.',
+                      '# TYPE tips_callback_response_bytes histogram']
+            for callback, histogram in sorted(self.payload.items()):
+                lines += histogram.lines('tips_callback_response_bytes', f'callback="{callback}"')
+        for collector in self.collectors:
+            lines += collector()
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+# Имя callback'а, выполняемого в фоновой задаче (вне запроса Flask)
+background_callback = ContextVar('background_callback', default=None)
+
+
+@contextmanager
+def stage(name):
+    """
+    Замеряет этап обработки текущего callback'а. Этапы фоновых задач попадают только
+    в гистограммы; вне callback'ов (прогрев, бенчмарки) ничего не пишется
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        if has_request_context() and 'callback' in g:
+            g.stage_timings[name] = g.stage_timings.get(name, 0.0) + elapsed
+        elif background_callback.get() is not None:
+            registry.observe_stage(background_callback.get(), name, elapsed)
+
+
+# Метрики LRU-кэшей: имя, тип, поле cache.stats() и описание
+CACHE_METRICS = (
+    ('tips_cache_hits_total', 'counter', 'hits', 'Cache lookups served from the cache.'),
+    ('tips_cache_misses_total', 'counter', 'misses', 'Cache lookups that had to compute the value.'),
+    ('tips_cache_entries', 'gauge', 'size', 'Entries currently in the cache.'),
+    ('tips_cache_bytes', 'gauge', 'nbytes', 'Approximate size of cached values in bytes.'),
+)
+
+
+def cache_collector(caches):
+    """
+    Строки метрик с попаданиями, промахами и размером LRU-кэшей {имя: кэш}:
+    HELP и TYPE выводятся один раз на метрику, кэши различаются меткой cache
+    """
+    def collect():
+        stats = {name: cache.stats() for name, cache in caches.items()}
+        lines = []
+        for metric, kind, field, description in CACHE_METRICS:
+            lines += [f'# HELP {metric} {description}', f'# TYPE {metric} {kind}']
+            lines += [f'{metric}{{cache="{name}"}} {values[field]}' for name, values in stats.items()]
+        return lines
+    return collect
+
+
+def register_metrics(app, metrics=registry):
+    """
+    Подключает замеры к запросам /_dash-update-component: заголовок Server-Timing
+    с этапами и общим временем, гистограммы в реестре и локальный маршрут GET /metrics
+    """
+    server = app.server
+
+    @server.before_request
+    def start_timer():
+        if not request.path.endswith('/_dash-update-component'):
+            return
+        body = request.get_json(silent=True) or {}
+        entry = app.callback_map.get(body.get('output'), {})
+        callback = entry.get('callback')
+        g.callback = getattr(callback, '__name__', 'unknown')
+        g.stage_timings = {}
+        g.request_start = time.perf_counter()
+
+    @server.after_request
+    def record_timings(response):
+        if 'callback' not in g:
+            return response
+        total = time.perf_counter() - g.request_start
+        metrics.observe_latency(g.callback, total)
+        for stage_name, seconds in g.stage_timings.items():
+            metrics.observe_stage(g.callback, stage_name, seconds)
+        if not response.is_streamed:
+            metrics.observe_payload(g.callback, len(response.get_data()))
+
+        timings = [f'{name};dur={seconds * 1000:.2f}' for name, seconds in g.stage_timings.items()]
+        timings.append(f'total;dur={total * 1000:.2f};desc="{g.callback}"')
+        response.headers.add('Server-Timing', ', '.join(timings))
+        return response
+
+    @server.route('/metrics')
+    def metrics_route():
+        if request.remote_addr not in LOCAL_ADDRESSES:
+            return Response('metrics are only available from localhost\n', status=403)
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+    return metrics_route
@@ -0,0 +1,205 @@
+import glob
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from cache import LRUCache
+from datastore import ensure_column_cache, load_column_cache
+from filterindex import FILTER_COLUMNS
+from statcube import (METRICS, EXTREMES, EMPTY_EXTREMES, CELL_MODES, M,
+                      accumulate_cells, statistics_from_cells)
+from tablequery import chunked_page
+
+
+def partition_can_match(meta, day, gender, time, smoker, bill_range):
+    """
+    Может ли часть содержать строки для фильтров: по присутствующим категориям и диапазону счета
+    """
+    if not meta['rows'] or meta['bill_range'] is None:
+        return False
+    low, high = meta['bill_range']
+    if high < bill_range[0] or low > bill_range[1]:
+        return False
+    for column, value in zip(FILTER_COLUMNS, (day, gender, time, smoker)):
+        if value != 'All' and value not in meta['categories'][column]:
+            return False
+    return True
+
+
+def partition_mask(dataFrame, day, gender, time, smoker, bill_range):
+    bills = dataFrame['total_bill'].to_numpy()
+    mask = (bills >= bill_range[0]) & (bills <= bill_range[1])
+    for column, value in zip(FILTER_COLUMNS, (day, gender, time, smoker)):
+        if value != 'All':
+            mask &= (dataFrame[column] == value).to_numpy()
+    return mask
+
+
+def cells_shape(categories):
+    # По ячейке на значение категории и одна под пустые значения
+    return tuple(len(categories[column]) + 1 for column in FILTER_COLUMNS)
+
+
+def partition_cells(cache_dir, meta, categories, filters):
+    """
+    Моменты и экстремумы строк одной части по ячейкам (day, sex, time, smoker).
+    Выполняется в рабочем процессе; частичные результаты частей складываются.
+    Строки с пустой категорией (код -1) идут в последнюю ячейку оси, как в StatsCube
+    """
+    dataFrame = load_column_cache(cache_dir, meta, categories)
+    rows = dataFrame[partition_mask(dataFrame, *filters)]
+    shape = cells_shape(categories)
+    cell_ids = np.ravel_multi_index([rows[column].cat.codes.to_numpy() for column in FILTER_COLUMNS], shape,
+                                    mode=CELL_MODES[:-1])
+    return accumulate_cells(cell_ids, rows['tip'], rows['total_bill'], rows['size'], int(np.prod(shape)))
+
+
+class PartitionSnapshot:
+    """
+    Набор данных из каталога CSV-частей (например, по дням или месяцам).
+
+    Для каждой части хранится колоночный кэш с метаданными: число строк, диапазон
+    счета и присутствующие категории. Части, которые не могут подойти под фильтры,
+    не читаются. Статистика считается по частям параллельно в пуле процессов,
+    частичные моменты складываются и переводятся в формат calculate_statistics
+    """
+
+    def __init__(self, directory, processes=None):
+        self.directory = directory
+        self.version = 0
+        self.partitions = [ensure_column_cache(path)
+                           for path in sorted(glob.glob(os.path.join(directory, '*.csv')))]
+        if not self.partitions:
+            raise ValueError(f"no CSV partitions in {directory}")
+
+        metas = [meta for _, meta in self.partitions]
+        self.columns = metas[0]['columns']
+        self.n_rows = sum(meta['rows'] for meta in metas)
+        # Общие отсортированные категории всех частей
+        self.categories = {column: sorted(set().union(*(meta['categories'][column] for meta in metas)))
+                           for column in metas[0]['categories']}
+        ranges = [meta['bill_range'] for meta in metas if meta['bill_range'] is not None]
+        self.bill_range = (min(low for low, _ in ranges), max(high for _, high in ranges)) if ranges else (0.0, 0.0)
+
+        self.processes = processes if processes is not None else os.cpu_count() or 1
+        self._executor = None
+        # Части не меняются, поэтому моменты ячеек по набору фильтров можно хранить
+        self._cells_cache = LRUCache(maxsize=32)
+
+    @property
+    def df(self):
+        # Все строки набора данных (нужно клиентскому режиму для небольших наборов)
+        return self.filter('All', 'All', 'All', 'All', self.bill_range)
+
+    @property
+    def executor(self):
+        # Пул создается при первом запросе, уже в рабочем процессе сервера.
+        # spawn - чтобы не копировать через fork потоки и блокировки сервера
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(self.processes,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    def candidates(self, day, gender, time, smoker, bill_range):
+        return [(cache_dir, meta) for cache_dir, meta in self.partitions
+                if partition_can_match(meta, day, gender, time, smoker, bill_range)]
+
+    def filter(self, day, gender, time, smoker, bill_range):
+        """
+        Строки подходящих частей, прошедшие фильтры, одной таблицей
+        """
+        frames = []
+        for cache_dir, meta in self.candidates(day, gender, time, smoker, bill_range):
+            dataFrame = load_column_cache(cache_dir, meta, self.categories)
+            frames.append(dataFrame[partition_mask(dataFrame, day, gender, time, smoker, bill_range)])
+        if not frames:
+            return load_column_cache(*self.partitions[0], self.categories).iloc[:0]
+        return pd.concat(frames, ignore_index=True)
+
+    def filter_chunks(self, day, gender, time, smoker, bill_range, rows=50000):
+        """
+        Отфильтрованные строки подходящих частей порциями не больше rows.
+        Всегда отдает хотя бы одну (возможно, пустую) порцию - с колонками и типами
+        """
+        empty = True
+        for cache_dir, meta in self.candidates(day, gender, time, smoker, bill_range):
+            dataFrame = load_column_cache(cache_dir, meta, self.categories)
+            positions = np.flatnonzero(partition_mask(dataFrame, day, gender, time, smoker, bill_range))
+            for start in range(0, len(positions), rows):
+                empty = False
+                yield dataFrame.iloc[positions[start:start + rows]]
+        if empty:
+            yield load_column_cache(*self.partitions[0], self.categories).iloc[:0]
+
+    def table_page(self, day, gender, time, smoker, bill_range, columns, filter_query='', sort_by=None,
+                   page_current=0, page_size=20):
+        """
+        Страница таблицы и число подходящих строк. Порции частей просматриваются
+        по очереди: в памяти одновременно только порция и строки страницы. Без filter_query
+        число строк берется из моментов ячеек, и без сортировки просмотр заканчивается на странице
+        """
+        n_rows = None
+        if not filter_query:
+            moments, _ = self.cells(day, gender, time, smoker, bill_range)
+            n_rows = int(moments[..., M['count']].sum())
+        return chunked_page(self.filter_chunks(day, gender, time, smoker, bill_range),
+                            columns, filter_query, page_current, page_size, sort_by, n_rows)
+
+    def chunks(self):
+        # Части по очереди - для проходов по всем строкам без загрузки всего набора
+        for cache_dir, meta in self.partitions:
+            yield load_column_cache(cache_dir, meta, self.categories)
+
+    def cells(self, day, gender, time, smoker, bill_range):
+        """
+        Моменты и экстремумы по ячейкам (day, sex, time, smoker) для фильтров
+        """
+        filters = (day, gender, time, smoker, tuple(bill_range))
+        return self._cells_cache.get_or_compute(filters, lambda: self._scan_cells(filters))
+
+    def statistics(self, day, gender, time, smoker, bill_range):
+        moments, extremes = self.cells(day, gender, time, smoker, bill_range)
+        return statistics_from_cells(moments, extremes, self.categories)
+
+    def cell_counts(self, bill_range):
+        # Число строк по ячейкам в диапазоне счета - для счетчиков вариантов фильтров
+        return self.cells('All', 'All', 'All', 'All', bill_range)[0][..., M['count']]
+
+    def _scan_cells(self, filters):
+        candidates = self.candidates(*filters)
+        shape = cells_shape(self.categories)
+        moments = np.zeros((int(np.prod(shape)), len(METRICS)))
+        extremes = np.tile(EMPTY_EXTREMES, (int(np.prod(shape)), 1))
+
+        if self.processes > 1 and len(candidates) > 1:
+            futures = [self.executor.submit(partition_cells, cache_dir, meta, self.categories, filters)
+                       for cache_dir, meta in candidates]
+            partials = (future.result() for future in futures)
+        else:
+            partials = (partition_cells(cache_dir, meta, self.categories, filters)
+                        for cache_dir, meta in candidates)
+
+        for part_moments, part_extremes in partials:
+            moments += part_moments
+            extremes[:, 0::2] = np.minimum(extremes[:, 0::2], part_extremes[:, 0::2])
+            extremes[:, 1::2] = np.maximum(extremes[:, 1::2], part_extremes[:, 1::2])
+        return moments.reshape(shape + (len(METRICS),)), extremes.reshape(shape + (len(EXTREMES),))
+
+
+class PartitionedDataset:
+    """
+    Набор данных из каталога частей: только для чтения, новые строки добавляются новыми файлами
+    """
+
+    def __init__(self, directory, processes=None):
+        self.snapshot = PartitionSnapshot(directory, processes)
+
+    @property
+    def version(self):
+        return self.snapshot.version
+
+    def append(self, rows):
+        raise ValueError("partitioned dataset is read-only: add rows as a new partition file")
@@ -0,0 +1,209 @@
+import copy
+
+import numpy as np
+import pandas as pd
+
+from cache import LRUCache
+from filterindex import FILTER_COLUMNS
+from statcube import METRICS, EXTREMES, CELL_MODES, M, accumulate_cells, statistics_from_cells
+
+# Квантиль нормального распределения для 95% доверительных интервалов
+Z_95 = 1.959964
+
+
+class StratifiedSample:
+    """
+    Стратифицированная выборка строк по ячейкам (day, sex, time, smoker).
+
+    Каждой строке назначается случайный ключ, и в ячейке остаются capacity строк
+    с наименьшими ключами - это равномерная выборка без возвращения (резервуар),
+    которую можно дополнять порциями строк. Число строк в каждой ячейке известно
+    точно, поэтому статистика оценивается с весами N/m ячеек и доверительными
+    интервалами. Для графиков берется общий для подходящих ячеек порог ключа:
+    получается равномерная выборка строк без перекоса в сторону маленьких ячеек
+    """
+
+    def __init__(self, categories, capacity, seed=0, version=0):
+        self.categories = {column: list(categories[column]) for column in FILTER_COLUMNS}
+        self.capacity = capacity
+        self.seed = seed
+        self.version = version
+        self.n_rows = 0
+        # По ячейке на значение категории и одна под пустые значения, как в StatsCube
+        self.shape = tuple(len(self.categories[column]) + 1 for column in FILTER_COLUMNS)
+        n_cells = int(np.prod(self.shape))
+        self.population = np.zeros(n_cells, dtype=np.int64)
+        self.rows = None
+        self.keys = np.empty(0)
+        self.cells = np.empty(0, dtype=np.int64)
+        self.kept = np.zeros(n_cells, dtype=np.int64)
+        self.thresholds = np.ones(n_cells)
+        self._stats_cache = LRUCache(maxsize=32)
+
+    @classmethod
+    def build(cls, snapshot, capacity, seed=0):
+        """
+        Строит выборку за один проход по порциям строк среза данных
+        """
+        sample = cls(snapshot.categories, capacity, seed, snapshot.version)
+        rng = sample._rng()
+        for chunk in snapshot.chunks():
+            sample._add(chunk, rng)
+        sample._finish()
+        return sample
+
+    def extend(self, snapshot):
+        """
+        Выборка для новой версии данных: строки, дописанные в конец таблицы,
+        добавляются к копии выборки; при новых категориях выборка строится заново
+        """
+        if snapshot.version == self.version:
+            return self
+        categories = {column: list(snapshot.categories[column]) for column in FILTER_COLUMNS}
+        if categories != self.categories or snapshot.n_rows < self.n_rows:
+            return StratifiedSample.build(snapshot, self.capacity, self.seed)
+
+        extended = copy.copy(self)
+        extended.version = snapshot.version
+        extended._stats_cache = LRUCache(maxsize=32)
+        for chunk in snapshot.chunks(start=self.n_rows):
+            extended._add(chunk, extended._rng())
+        extended._finish()
+        return extended
+
+    def _rng(self):
+        # Своя последовательность ключей для каждой версии данных
+        return np.random.default_rng([self.seed, self.version])
+
+    def _add(self, chunk, rng):
+        chunk = chunk.reset_index(drop=True)
+        codes = []
+        for column in FILTER_COLUMNS:
+            values = pd.Categorical(chunk[column], categories=self.categories[column])
+            chunk[column] = values
+            codes.append(values.codes)
+        # Строки с пустой категорией (код -1) попадают в последнюю ячейку оси
+        cells = np.ravel_multi_index(codes, self.shape, mode=CELL_MODES[:-1]).astype(np.int64)
+        keys = rng.random(len(chunk))
+
+        self.n_rows += len(chunk)
+        self.population = self.population + np.bincount(cells, minlength=len(self.population))
+        if self.rows is None:
+            self.rows = chunk.iloc[:0]
+
+        # В заполненную ячейку может попасть только строка с ключом меньше текущего порога
+        self._finish()
+        limits = np.where(self.kept >= self.capacity, self.thresholds, np.inf)
+        candidates = keys < limits[cells]
+
+        rows = pd.concat([self.rows, chunk[candidates]], ignore_index=True)
+        keys = np.concatenate([self.keys, keys[candidates]])
+        cells = np.concatenate([self.cells, cells[candidates]])
+        # Ранг ключа внутри ячейки; позиции сортируются обратно, чтобы сохранить порядок строк
+        order = np.lexsort((keys, cells))
+        ranks = np.arange(len(order)) - np.searchsorted(cells[order], cells[order])
+        keep = np.sort(order[ranks < self.capacity])
+        self.rows = rows.iloc[keep].reset_index(drop=True)
+        self.keys = keys[keep]
+        self.cells = cells[keep]
+
+    def _finish(self):
+        # Порог ключа ячейки: все строки ячейки с ключом не больше порога есть в выборке
+        self.kept = np.bincount(self.cells, minlength=len(self.population))
+        largest = np.zeros(len(self.population))
+        np.maximum.at(largest, self.cells, self.keys)
+        self.thresholds = np.where(self.population > self.kept, largest, 1.0)
+
+    def _matching_cells(self, day, gender, time, smoker):
+        matching = np.ones(self.shape, dtype=bool)
+        for axis, (column, value) in enumerate(zip(FILTER_COLUMNS, (day, gender, time, smoker))):
+            if value != 'All':
+                selected = np.array([category == value for category in self.categories[column]] + [False])
+                shape = [1] * len(self.shape)
+                shape[axis] = len(selected)
+                matching &= selected.reshape(shape)
+        return matching.ravel()
+
+    def _mask(self, matching, bill_range):
+        bills = self.rows['total_bill'].to_numpy()
+        return (bills >= bill_range[0]) & (bills <= bill_range[1]) & matching[self.cells]
+
+    def _threshold(self, matching):
+        occupied = matching & (self.population > 0)
+        return float(self.thresholds[occupied].min()) if occupied.any() else 1.0
+
+    def view(self, day, gender, time, smoker, bill_range):
+        """
+        Равномерная выборка подходящих строк для графиков и признак того,
+        что в нее попали все подходящие строки
+        """
+        matching = self._matching_cells(day, gender, time, smoker)
+        threshold = self._threshold(matching)
+        mask = self._mask(matching, bill_range) & (self.keys <= threshold)
+        return self.rows[mask], threshold >= 1.0
+
+    def cell_counts(self, bill_range):
+        """
+        Оценка числа строк по ячейкам в диапазоне счета: строки выборки с весами N/m
+        """
+        bills = self.rows['total_bill'].to_numpy()
+        inside = (bills >= bill_range[0]) & (bills <= bill_range[1])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            weights = np.where(self.kept > 0, self.population / self.kept, 0.0)
+        counts = np.bincount(self.cells[inside], weights=weights[self.cells[inside]],
+                             minlength=len(self.population))
+        return counts.reshape(self.shape)
+
+    def statistics(self, day, gender, time, smoker, bill_range):
+        filters = (day, gender, time, smoker, tuple(bill_range))
+        return self._stats_cache.get_or_compute(filters, lambda: self._estimate_statistics(filters))
+
+    def _estimate_statistics(self, filters):
+        """
+        Оценка статистики в формате calculate_statistics по строкам выборки с весами N/m ячеек.
+        Дополнительно: intervals - полуширины 95% доверительных интервалов основных показателей,
+        sample_rows - число строк выборки, exact - в выборке все подходящие строки
+        """
+        day, gender, time, smoker, bill_range = filters
+        matching = self._matching_cells(day, gender, time, smoker)
+        mask = self._mask(matching, bill_range)
+        rows = self.rows[mask]
+        n_cells = len(self.population)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            weights = np.where(self.kept > 0, self.population / self.kept, 0.0)
+            moments, extremes = accumulate_cells(self.cells[mask], rows['tip'], rows['total_bill'],
+                                                 rows['size'], n_cells)
+            moments *= weights[:, None]
+            stats = statistics_from_cells(moments.reshape(self.shape + (len(METRICS),)),
+                                          extremes.reshape(self.shape + (len(EXTREMES),)),
+                                          self.categories)
+            count = moments[:, M['count']].sum()
+
+            # Дисперсия стратифицированной оценки с поправкой на конечность ячеек;
+            # для средних (отношение двух оценок) - через линеаризацию
+            factors = np.where(self.kept > 0, self.population ** 2 * (1 - self.kept / self.population) / self.kept, 0.0)
+            tip = self.rows['tip'].to_numpy(dtype=float)
+            bill = self.rows['total_bill'].to_numpy(dtype=float)
+            size = self.rows['size'].to_numpy(dtype=float)
+            values = {'avg_bill': bill, 'avg_tip': tip,
+                      'avg_tip_percentage': tip / bill * 100, 'avg_size': size}
+            intervals = {'total_records': Z_95 * np.sqrt(self._variance(mask.astype(float), factors))}
+            for name, value in values.items():
+                linearized = np.where(mask, (value - stats[name]) / count, 0.0) if count else np.zeros(len(mask))
+                intervals[name] = Z_95 * np.sqrt(self._variance(linearized, factors))
+
+        stats['total_records'] = int(round(count))
+        stats['intervals'] = intervals
+        stats['sample_rows'] = int(mask.sum())
+        stats['exact'] = self._threshold(matching) >= 1.0
+        return stats
+
+    def _variance(self, values, factors):
+        # Сумма по ячейкам N^2 (1 - m/N) s^2 / m, s^2 - выборочная дисперсия в ячейке
+        n_cells = len(self.population)
+        sums = np.bincount(self.cells, weights=values, minlength=n_cells)
+        squares = np.bincount(self.cells, weights=values * values, minlength=n_cells)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            variances = np.where(self.kept > 1, (squares - sums * sums / self.kept) / (self.kept - 1), 0.0)
+        return float((factors * np.maximum(variances, 0.0)).sum())
@@ -0,0 +1,110 @@
+import gzip
+
+import numpy as np
+from flask import request
+
+# brotli необязателен: без него ответы сжимаются gzip. Необязательный orjson отдельно
+# не импортируется - plotly (и через него Dash) сам выбирает его для JSON ответов
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Типы ответов, которые имеет смысл сжимать
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/javascript', 'text/html',
+                          'text/css', 'text/plain', 'text/javascript')
+
+
+def round_floats(value, decimals):
+    """
+    Округляет дробные числа во вложенных списках, словарях и numpy-массивах
+    """
+    if isinstance(value, np.ndarray):
+        return np.round(value, decimals) if value.dtype.kind == 'f' else value
+    if isinstance(value, float):
+        return round(value, decimals)
+    if isinstance(value, dict):
+        return {key: round_floats(item, decimals) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [round_floats(item, decimals) for item in value]
+    return value
+
+
+def figure_data(fig, decimals=None, axes=('x', 'y')):
+    """
+    Фигура в виде словаря для ответа Dash. До decimals знаков (None или < 0 - без округления)
+    округляются только координаты денежных осей axes; счетчики, квартили, оформление
+    и шаблон не изменяются. numpy-массивы остаются массивами - Dash кодирует их сам
+    """
+    figure = fig.to_plotly_json()
+    if decimals is not None and decimals >= 0:
+        for trace in figure['data']:
+            for axis in axes:
+                if axis in trace:
+                    trace[axis] = round_floats(trace[axis], decimals)
+    return figure
+
+
+def estimate_size(value):
+    """
+    Примерный размер значения в JSON, байт - для ограничения кэша фигур без сериализации
+    """
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, str):
+        return len(value) + 2
+    if isinstance(value, dict):
+        return sum(len(str(key)) + 4 + estimate_size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_size(item) + 1 for item in value)
+    return 8
+
+
+def columnar(dataFrame, decimals=None):
+    """
+    Таблица в колоночном виде {колонка: [значения]} - без повторения имен колонок в каждой записи
+    """
+    data = {}
+    for column in dataFrame.columns:
+        values = dataFrame[column].to_numpy()
+        if values.dtype.kind == 'f' and decimals is not None and decimals >= 0:
+            values = np.round(values, decimals)
+        data[column] = values.tolist()
+    return {'columns': dataFrame.columns.tolist(), 'data': data}
+
+
+def accepted_encoding():
+    accepted = request.headers.get('Accept-Encoding', '').lower()
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def register_compression(server, min_size=1024, level=6):
+    """
+    Сжимает ответы Flask-сервера brotli или gzip, если они больше min_size байт
+    """
+
+    @server.after_request
+    def compress_response(response):
+        if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = accepted_encoding()
+        data = response.get_data()
+        if encoding is None or len(data) < min_size:
+            return response
+
+        if encoding == 'br':
+            data = brotli.compress(data, quality=min(level, 11))
+        else:
+            data = gzip.compress(data, compresslevel=min(level, 9))
+        response.set_data(data)
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    return compress_response
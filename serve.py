@@ -0,0 +1,75 @@
+"""
+Production-запуск дашборда: python serve.py [--workers N] [--bind HOST:PORT]
+
+Данные загружаются и индексируются один раз в главном процессе и переносятся
+в разделяемую память, после чего gunicorn создает рабочие процессы через fork.
+Память на данные не растет с числом рабочих процессов
+"""
+import argparse
+import gc
+
+from gunicorn.app.base import BaseApplication
+
+import config
+import main
+from dataset import TipsDataset
+from sharedmem import share_snapshot
+
+
+class DashboardServer(BaseApplication):
+    """
+    Gunicorn с уже созданным WSGI-приложением
+    """
+
+    def __init__(self, application, options):
+        self.application = application
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return self.application
+
+
+def post_fork(server, worker):
+    # Потоки главного процесса не наследуются - запускаем их в каждом рабочем
+    main.start_background_tasks(prewarm=False)
+
+
+def run(workers, bind, timeout=60):
+    # Пул фоновых callback'ов живет в одном процессе: опрос результата может попасть
+    # в другой рабочий процесс, поэтому при нескольких процессах графики строятся сразу
+    # Пул процессов для частей у каждого рабочего процесса свой, поэтому
+    # TIPS_PARTITION_PROCESSES делится между ними, а не умножается на их число
+    app = main.create_app(background=config.BACKGROUND_CALLBACKS and workers == 1,
+                          partition_processes=max(1, config.PARTITION_PROCESSES // workers))
+    if isinstance(main.dataset, TipsDataset):
+        share_snapshot(main.dataset.snapshot)
+    if config.PREWARM_FIGURES:
+        # Графики без фильтров строятся до fork и попадают в кэш всех процессов
+        main.prewarm_figures()
+
+    # Объекты, созданные при загрузке, исключаются из сборки мусора, чтобы она
+    # не трогала их заголовки и не вызывала копирование страниц в рабочих процессах
+    gc.collect()
+    gc.freeze()
+
+    DashboardServer(app.server, {
+        'bind': bind,
+        'workers': workers,
+        'timeout': timeout,
+        'preload_app': True,
+        'post_fork': post_fork,
+    }).run()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Tips dashboard production server')
+    parser.add_argument('--workers', type=int, default=config.WORKERS)
+    parser.add_argument('--bind', default=config.BIND)
+    parser.add_argument('--timeout', type=int, default=60)
+    args = parser.parse_args()
+    run(args.workers, args.bind, args.timeout)
@@ -0,0 +1,49 @@
+import mmap
+
+import numpy as np
+
+
+def is_mapped(array):
+    """
+    Проверяет, лежат ли данные массива в отображенной памяти (файл или разделяемый блок)
+    """
+    base = array
+    while base is not None:
+        if isinstance(base, (np.memmap, mmap.mmap)):
+            return True
+        base = getattr(base, 'base', None)
+    return False
+
+
+def to_shared(array):
+    """
+    Копирует массив в анонимную разделяемую память (MAP_SHARED).
+    После fork все процессы читают одни и те же страницы, без копирования при записи.
+    Массив становится доступным только для чтения
+    """
+    if is_mapped(array) or array.nbytes == 0:
+        return array
+    buffer = mmap.mmap(-1, array.nbytes)
+    shared = np.frombuffer(buffer, dtype=array.dtype).reshape(array.shape)
+    shared[...] = array
+    shared.flags.writeable = False
+    return shared
+
+
+def share_snapshot(snapshot):
+    """
+    Переносит массивы индекса фильтрации и куба статистики среза в разделяемую память.
+    Колонки таблицы уже отображены из колоночного кэша и не копируются.
+    Индекс и куб после этого не изменяются на месте: новые строки создают новый срез
+    """
+    index = snapshot.index
+    index.masks = {column: {value: to_shared(mask) for value, mask in masks.items()}
+                   for column, masks in index.masks.items()}
+    index.bill_order = to_shared(index.bill_order)
+    index.sorted_bills = to_shared(index.sorted_bills)
+
+    cube = snapshot.cube
+    cube.edges = to_shared(cube.edges)
+    cube.moments = to_shared(cube.moments)
+    cube.extremes = to_shared(cube.extremes)
+    return snapshot
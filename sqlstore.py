@@ -0,0 +1,319 @@
+import os
+import re
+import sqlite3
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+from cache import LRUCache
+from datastore import CATEGORICAL_COLUMNS, NUMERIC_DTYPES, read_tips_csv
+from filterindex import FILTER_COLUMNS
+from statcube import METRICS, EXTREMES, EMPTY_EXTREMES, statistics_from_cells
+from tablequery import split_filter_part
+
+# Расширения файлов встроенных баз данных
+SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+DUCKDB_EXTENSIONS = ('.duckdb',)
+
+# Агрегаты по ячейкам (day, sex, time, smoker) в порядке METRICS и EXTREMES
+CELL_AGGREGATES = (
+    'COUNT(*)', 'SUM(tip)', 'SUM(total_bill)', 'SUM(size)', 'SUM(tip * 100.0 / total_bill)',
+    'SUM(tip * tip)', 'SUM(total_bill * total_bill)', 'SUM(size * size)',
+    'SUM(tip * total_bill)', 'SUM(tip * size)', 'SUM(total_bill * size)',
+    'MIN(tip)', 'MAX(tip)', 'MIN(total_bill)', 'MAX(total_bill)',
+)
+
+# Операторы сравнения filter_query, которые переносятся в SQL как есть
+SQL_COMPARISONS = ('=', '!=', '<', '<=', '>', '>=')
+
+
+def is_database(path):
+    return path.lower().endswith(SQLITE_EXTENSIONS + DUCKDB_EXTENSIONS)
+
+
+def where_clause(day, gender, time, smoker, bill_range, full_range=None):
+    """
+    Условие WHERE с параметрами для фильтров дашборда. Если диапазон счета покрывает
+    full_range (весь диапазон данных), вместо диапазона проверяется только наличие
+    счета, чтобы база не выбирала индекс по счету для чтения всех строк
+    """
+    conditions = ['1 = 1']
+    params = []
+    if full_range is None or bill_range[0] > full_range[0] or bill_range[1] < full_range[1]:
+        conditions.append('total_bill BETWEEN ? AND ?')
+        params += [float(bill_range[0]), float(bill_range[1])]
+    else:
+        # Строки без счета не проходят фильтр по диапазону, как в pandas
+        conditions.append('total_bill IS NOT NULL')
+    for column, value in zip(FILTER_COLUMNS, (day, gender, time, smoker)):
+        if value != 'All':
+            conditions.append(f'{column} = ?')
+            params.append(value)
+    return ' AND '.join(conditions), params
+
+
+def filter_query_clause(filter_query, columns, numeric_columns):
+    """
+    Условие WHERE с параметрами для filter_query DataTable - по тем же правилам,
+    что apply_filter_query: условия по колонкам не из columns пропускаются,
+    категории сравниваются как строки, строку с числовой колонкой сравнить нельзя
+    """
+    conditions = ['1 = 1']
+    params = []
+    for filter_part in (filter_query or '').split(' && '):
+        column, operator, value, ignore_case = split_filter_part(filter_part)
+        if column not in columns:
+            continue
+        if operator in ('contains', 'datestartswith'):
+            text, value = f'CAST({column} AS TEXT)', str(value)
+            if ignore_case:
+                text, value = f'LOWER({text})', value.lower()
+            if operator == 'contains':
+                conditions.append(f'instr({text}, ?) > 0')
+                params.append(value)
+            else:
+                conditions.append(f'substr({text}, 1, ?) = ?')
+                params += [len(value), value]
+        elif isinstance(value, str) and column in numeric_columns:
+            conditions.append('0 = 1')
+        elif operator in SQL_COMPARISONS:
+            target = column
+            if isinstance(value, str) and ignore_case:
+                target, value = f'LOWER({column})', value.lower()
+            conditions.append(f'{target} {operator} ?')
+            params.append(value)
+    return ' AND '.join(conditions), params
+
+
+class SqlSnapshot:
+    """
+    Данные в локальной встроенной базе (SQLite или DuckDB).
+
+    Фильтры превращаются в WHERE по индексированным колонкам, статистика считается
+    одним агрегирующим запросом по ячейкам (day, sex, time, smoker) и переводится
+    в формат calculate_statistics. В Python попадают только результаты запросов
+    """
+
+    def __init__(self, path, table='tips'):
+        if not re.fullmatch(r'[A-Za-z_][A-Za-z0-9_]*', table):
+            raise ValueError(f"invalid table name: {table}")
+        if not os.path.exists(path):
+            raise ValueError(f"database not found: {path}")
+        self.path = path
+        self.table = table
+        self.version = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._duckdb = None
+        self._cells_cache = LRUCache(maxsize=32)
+        self._counts_cache = LRUCache(maxsize=32)
+        self._rows_cache = LRUCache(maxsize=32)
+
+        self.columns = [column[0] for column in self.execute(f'SELECT * FROM {table} LIMIT 0', (), describe=True)]
+        self.categories = {column: sorted(value for (value,) in self.execute(
+                               f'SELECT DISTINCT {column} FROM {table} WHERE {column} IS NOT NULL'))
+                           for column in CATEGORICAL_COLUMNS if column in self.columns}
+        n_rows, low, high = self.execute(f'SELECT COUNT(*), MIN(total_bill), MAX(total_bill) FROM {table}')[0]
+        self.n_rows = n_rows
+        self.bill_range = (float(low), float(high)) if n_rows else (0.0, 0.0)
+        # Индекс по ячейкам из build_sqlite покрывает запрос числа строк по ячейкам
+        self.cells_index = None
+        if not self.path.lower().endswith(DUCKDB_EXTENSIONS) and self.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (f'idx_{table}_cells',)):
+            self.cells_index = f'idx_{table}_cells'
+
+    def connection(self):
+        # Соединение на поток: sqlite3 не разрешает общее соединение между потоками,
+        # у DuckDB потоки получают курсоры одного соединения с базой
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            if self.path.lower().endswith(DUCKDB_EXTENSIONS):
+                with self._lock:
+                    if self._duckdb is None:
+                        import duckdb
+                        self._duckdb = duckdb.connect(self.path, read_only=True)
+                    connection = self._duckdb.cursor()
+            else:
+                connection = sqlite3.connect(f'file:{os.path.abspath(self.path)}?mode=ro',
+                                             uri=True, check_same_thread=False)
+            self._local.connection = connection
+        return connection
+
+    def execute(self, query, params=(), describe=False):
+        cursor = self.connection().cursor()
+        try:
+            cursor.execute(query, params)
+            return cursor.description if describe else cursor.fetchall()
+        finally:
+            cursor.close()
+
+    @property
+    def df(self):
+        # Все строки набора данных (нужно клиентскому режиму для небольших наборов)
+        return self.filter('All', 'All', 'All', 'All', self.bill_range)
+
+    def filter(self, day, gender, time, smoker, bill_range):
+        """
+        Строки, прошедшие фильтры, с теми же типами колонок, что и при чтении CSV
+        """
+        where, params = where_clause(day, gender, time, smoker, bill_range, self.bill_range)
+        columns = ', '.join(self.columns)
+        # rowid сохраняет порядок строк исходного файла
+        rows = self.execute(f'SELECT {columns} FROM {self.table} WHERE {where} ORDER BY rowid', params)
+        return self._frame(rows)
+
+    def chunks(self, rows=100000):
+        """
+        Все строки таблицы порциями по rows - для проходов без загрузки всего набора
+        """
+        return self._fetch_chunks('1 = 1', (), rows)
+
+    def filter_chunks(self, day, gender, time, smoker, bill_range, rows=50000):
+        """
+        Отфильтрованные строки порциями по rows, курсор читает результат запроса постепенно.
+        Всегда отдает хотя бы одну (возможно, пустую) порцию - с колонками и типами
+        """
+        where, params = where_clause(day, gender, time, smoker, bill_range, self.bill_range)
+        empty = True
+        for chunk in self._fetch_chunks(where, params, rows):
+            empty = False
+            yield chunk
+        if empty:
+            yield self._frame([])
+
+    def _fetch_chunks(self, where, params, rows):
+        cursor = self.connection().cursor()
+        try:
+            cursor.execute(f'SELECT {", ".join(self.columns)} FROM {self.table} WHERE {where} ORDER BY rowid',
+                           params)
+            while True:
+                batch = cursor.fetchmany(rows)
+                if not batch:
+                    break
+                yield self._frame(batch)
+        finally:
+            cursor.close()
+
+    def table_page(self, day, gender, time, smoker, bill_range, columns, filter_query='', sort_by=None,
+                   page_current=0, page_size=20):
+        """
+        Страница таблицы и число подходящих строк. Фильтры, filter_query, сортировка
+        и LIMIT/OFFSET выполняются в базе - в pandas попадает только страница
+        """
+        columns = [column for column in columns if column in self.columns]
+        where, params = where_clause(day, gender, time, smoker, bill_range, self.bill_range)
+        query_where, query_params = filter_query_clause(
+            filter_query, columns, [column for column in NUMERIC_DTYPES if column in self.columns])
+        where, params = f'{where} AND {query_where}', tuple(params + query_params)
+        total = self._rows_cache.get_or_compute(
+            (where, params), lambda: self.execute(f'SELECT COUNT(*) FROM {self.table} WHERE {where}', params)[0][0])
+
+        # rowid в конце порядка - как устойчивая сортировка в get_page
+        order = [f"{item['column_id']} {'ASC' if item['direction'] == 'asc' else 'DESC'}"
+                 for item in (sort_by or []) if item['column_id'] in columns]
+        rows = self.execute(f'SELECT {", ".join(columns)} FROM {self.table} WHERE {where} '
+                            f'ORDER BY {", ".join(order + ["rowid"])} LIMIT ? OFFSET ?',
+                            params + (page_size, (page_current or 0) * page_size))
+        return self._frame(rows, columns), total
+
+    def _frame(self, rows, columns=None):
+        columns = columns or self.columns
+        dataFrame = pd.DataFrame.from_records(rows, columns=columns)
+        for column in columns:
+            if column in self.categories:
+                dataFrame[column] = pd.Categorical(dataFrame[column], categories=self.categories[column])
+            elif column in NUMERIC_DTYPES:
+                dataFrame[column] = dataFrame[column].astype(NUMERIC_DTYPES[column])
+        return dataFrame
+
+    def cells(self, day, gender, time, smoker, bill_range):
+        """
+        Моменты и экстремумы по ячейкам (day, sex, time, smoker) для фильтров
+        """
+        filters = (day, gender, time, smoker, tuple(bill_range))
+        return self._cells_cache.get_or_compute(filters, lambda: self._query_cells(filters))
+
+    def statistics(self, day, gender, time, smoker, bill_range):
+        moments, extremes = self.cells(day, gender, time, smoker, bill_range)
+        return statistics_from_cells(moments, extremes, self.categories)
+
+    def cell_counts(self, bill_range):
+        # Число строк по ячейкам в диапазоне счета - для счетчиков вариантов фильтров
+        bill_range = tuple(bill_range)
+        return self._counts_cache.get_or_compute(bill_range, lambda: self._query_counts(bill_range))
+
+    def _query_counts(self, bill_range):
+        # Отдельный COUNT(*) читает только индекс по ячейкам, без обращения к строкам таблицы
+        where, params = where_clause('All', 'All', 'All', 'All', bill_range, self.bill_range)
+        groups = ', '.join(FILTER_COLUMNS)
+        hint = f' INDEXED BY {self.cells_index}' if self.cells_index else ''
+        rows = self.execute(f'SELECT {groups}, COUNT(*) FROM {self.table}{hint} '
+                            f'WHERE {where} GROUP BY {groups}', params)
+        counts = np.zeros(self.cells_shape)
+        for row in rows:
+            counts[self._cell(row)] = row[len(FILTER_COLUMNS)]
+        return counts
+
+    @property
+    def cells_shape(self):
+        # По ячейке на значение категории и одна под NULL, как в StatsCube
+        return tuple(len(self.categories[column]) + 1 for column in FILTER_COLUMNS)
+
+    def _cell(self, row):
+        return tuple(len(self.categories[column]) if value is None else self.categories[column].index(value)
+                     for column, value in zip(FILTER_COLUMNS, row))
+
+    def _query_cells(self, filters):
+        where, params = where_clause(*filters, self.bill_range)
+        groups = ', '.join(FILTER_COLUMNS)
+        rows = self.execute(f'SELECT {groups}, {", ".join(CELL_AGGREGATES)} FROM {self.table} '
+                            f'WHERE {where} GROUP BY {groups}', params)
+
+        shape = self.cells_shape
+        moments = np.zeros(shape + (len(METRICS),))
+        extremes = np.tile(EMPTY_EXTREMES, shape + (1,))
+        n_keys = len(FILTER_COLUMNS)
+        for row in rows:
+            cell = self._cell(row)
+            moments[cell] = row[n_keys:n_keys + len(METRICS)]
+            extremes[cell] = row[n_keys + len(METRICS):n_keys + len(METRICS) + len(EXTREMES)]
+        return moments, extremes
+
+
+class SqlDataset:
+    """
+    Набор данных во встроенной базе: только для чтения, новые строки записываются в базу отдельно
+    """
+
+    def __init__(self, path, table='tips'):
+        self.snapshot = SqlSnapshot(path, table)
+
+    @property
+    def version(self):
+        return self.snapshot.version
+
+    def append(self, rows):
+        raise ValueError("database dataset is read-only: insert rows into the database directly")
+
+
+def build_sqlite(csv_path, db_path, table='tips'):
+    """
+    Загружает CSV в SQLite и создает индексы под фильтры дашборда
+    """
+    dataFrame = read_tips_csv(csv_path)
+    for column in CATEGORICAL_COLUMNS:
+        # Пустые значения остаются NULL, а не строкой 'nan'
+        dataFrame[column] = dataFrame[column].astype(object).where(dataFrame[column].notna(), None)
+    with sqlite3.connect(db_path) as connection:
+        dataFrame.to_sql(table, connection, if_exists='replace', index=False)
+        connection.execute(f'CREATE INDEX idx_{table}_bill ON {table} (total_bill)')
+        connection.execute(f'CREATE INDEX idx_{table}_cells ON {table} (day, sex, time, smoker, total_bill)')
+    return len(dataFrame)
+
+
+if __name__ == '__main__':
+    # Конвертация CSV в SQLite: python sqlstore.py tips.csv tips.sqlite
+    rows = build_sqlite(sys.argv[1], sys.argv[2])
+    print(f"{rows} rows written to {sys.argv[2]}")
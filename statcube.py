@@ -0,0 +1,294 @@
+import numpy as np
+import pandas as pd
+
+from filterindex import FILTER_COLUMNS
+
+# Накопленные моменты в каждой ячейке куба
+METRICS = ('count', 'sum_tip', 'sum_bill', 'sum_size', 'sum_pct',
+           'sq_tip', 'sq_bill', 'sq_size', 'tip_bill', 'tip_size', 'bill_size')
+M = {name: i for i, name in enumerate(METRICS)}
+
+# Экстремальные значения в каждой ячейке: min/max чаевых и счета
+EXTREMES = ('min_tip', 'max_tip', 'min_bill', 'max_bill')
+EMPTY_EXTREMES = np.array([np.inf, -np.inf, np.inf, -np.inf])
+
+# Колонки строк, которые считаются по строкам в краевых корзинах
+EDGE_COLUMNS = list(FILTER_COLUMNS) + ['tip', 'total_bill', 'size']
+
+# Режимы ravel_multi_index для (day, sex, time, smoker, корзина): код -1 пустого
+# значения категории попадает в последнюю ячейку оси, номер корзины проверяется
+CELL_MODES = ('wrap',) * len(FILTER_COLUMNS) + ('raise',)
+
+
+def accumulate_cells(cell_ids, tip, bill, size, n_cells):
+    """
+    Суммирует моменты и экстремумы строк по ячейкам за один проход на метрику
+    """
+    tip = np.asarray(tip, dtype=float)
+    bill = np.asarray(bill, dtype=float)
+    size = np.asarray(size, dtype=float)
+
+    columns = (None, tip, bill, size, tip / bill * 100,
+               tip * tip, bill * bill, size * size, tip * bill, tip * size, bill * size)
+    moments = np.empty((n_cells, len(METRICS)))
+    for i, weights in enumerate(columns):
+        moments[:, i] = np.bincount(cell_ids, weights=weights, minlength=n_cells)
+
+    extremes = np.tile(EMPTY_EXTREMES, (n_cells, 1))
+    np.minimum.at(extremes[:, 0], cell_ids, tip)
+    np.maximum.at(extremes[:, 1], cell_ids, tip)
+    np.minimum.at(extremes[:, 2], cell_ids, bill)
+    np.maximum.at(extremes[:, 3], cell_ids, bill)
+    return moments, extremes
+
+
+def cube_codes(series, categories):
+    """
+    Коды значений категориальной колонки по списку категорий куба, -1 - пустое значение
+    """
+    values = series.array
+    if not isinstance(values, pd.Categorical):
+        return pd.Categorical(values, categories=categories).codes
+    # Перекодировка через таблицу соответствия категорий, без сравнения строк по каждой строке
+    positions = {value: i for i, value in enumerate(categories)}
+    lookup = np.array([positions.get(value, -1) for value in values.categories] + [-1])
+    return lookup[values.codes]
+
+
+def _group_stats(moments, categories, column, means, counts=()):
+    """
+    Собирает таблицу по группе в том же виде, что и groupby().agg().round(2):
+    means - колонки со средними, counts - колонки с количеством записей.
+    Ячейка пустых значений за последней категорией в группы не входит
+    """
+    moments = moments[:len(categories)]
+    present = moments[:, M['count']] > 0
+    count = moments[present, M['count']]
+    data = {}
+    for name, metric in means.items():
+        data[name] = moments[present, M[metric]] / count
+    for name in counts:
+        data[name] = count.astype(int)
+    index = pd.Index(np.asarray(categories, dtype=object)[present], name=column)
+    # Категории, добавленные при дозагрузке, стоят в конце оси - сортируем как groupby
+    return pd.DataFrame(data, index=index).round(2).sort_index()
+
+
+def statistics_from_cells(moments, extremes, categories):
+    """
+    Рассчитывает статистику в формате calculate_statistics по ячейкам
+    (day, sex, time, smoker) с накопленными моментами
+    """
+    axes = tuple(range(len(FILTER_COLUMNS)))
+    total = moments.reshape(-1, len(METRICS)).sum(axis=0)
+    n = total[M['count']]
+
+    def by(column):
+        axis = FILTER_COLUMNS.index(column)
+        other = tuple(a for a in axes if a != axis)
+        return moments.sum(axis=other)
+
+    stats = {}
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # Основные показатели
+        stats['total_records'] = int(n)
+        stats['avg_bill'] = total[M['sum_bill']] / n if n else np.nan
+        stats['avg_tip'] = total[M['sum_tip']] / n if n else np.nan
+        stats['avg_tip_percentage'] = total[M['sum_pct']] / n if n else np.nan
+        stats['avg_size'] = total[M['sum_size']] / n if n else np.nan
+
+        # Разбивки по полу, дням, времени и курящим
+        means = {'tip': 'sum_tip', 'total_bill': 'sum_bill'}
+        stats['gender_stats'] = _group_stats(by('sex'), categories['sex'], 'sex',
+                                             {**means, 'size': 'sum_size'})
+        stats['day_stats'] = _group_stats(by('day'), categories['day'], 'day',
+                                          means, counts=('size',))
+        stats['time_stats'] = _group_stats(by('time'), categories['time'], 'time', means)
+        stats['smoker_stats'] = _group_stats(by('smoker'), categories['smoker'], 'smoker', means)
+
+        # Корреляция Пирсона по суммам и суммам произведений
+        sx, sy = total[M['sum_bill']], total[M['sum_tip']]
+        cov = n * total[M['tip_bill']] - sx * sy
+        var_x = n * total[M['sq_bill']] - sx * sx
+        var_y = n * total[M['sq_tip']] - sy * sy
+        # Дисперсия на уровне ошибки округления считается нулевой
+        tolerance = 1e-12 * n
+        if n > 1 and var_x > tolerance * total[M['sq_bill']] and var_y > tolerance * total[M['sq_tip']]:
+            stats['correlation'] = float(np.clip(cov / np.sqrt(var_x * var_y), -1, 1))
+        else:
+            stats['correlation'] = np.nan
+
+    # Экстремальные значения
+    ext = extremes.reshape(-1, len(EXTREMES))
+    for i, name in enumerate(EXTREMES):
+        reduce = np.min if name.startswith('min') else np.max
+        stats[name] = float(reduce(ext[:, i])) if n else np.nan
+
+    return stats
+
+
+class StatsCube:
+    """
+    Предагрегированный куб статистики по (day, sex, time, smoker, корзина счета).
+
+    Каждая ячейка хранит количество, суммы, суммы квадратов и попарных произведений
+    tip, total_bill и size, поэтому статистика любого набора фильтров получается
+    суммированием ячеек. Точно по строкам считаются только корзины на краях
+    диапазона счета, попавшие в него частично.
+
+    Последняя ячейка каждой категориальной оси - строки с пустым значением: они
+    входят в итоги при фильтре All, но не в разбивки. Строки без суммы счета
+    в куб не попадают.
+    """
+
+    def __init__(self, index, bucket_width=1.0):
+        self.index = index
+        self.bucket_width = bucket_width
+        dataFrame = index.df
+
+        self.categories = {column: sorted(index.masks[column]) for column in FILTER_COLUMNS}
+
+        # Границы корзин счета: корзина i содержит edges[i] <= total_bill < edges[i + 1]
+        bills = index.sorted_bills
+        if len(bills):
+            low = np.floor(bills[0] / bucket_width) * bucket_width
+            high = bills[-1] + bucket_width
+        else:
+            low, high = 0.0, bucket_width
+        self.edges = np.arange(low, high + bucket_width, bucket_width)
+
+        self.moments = np.zeros(self.shape + (len(self.edges) - 1, len(METRICS)))
+        self.extremes = np.tile(EMPTY_EXTREMES, self.shape + (len(self.edges) - 1, 1))
+        self._add_rows(dataFrame)
+
+    @property
+    def shape(self):
+        # По ячейке на значение категории и одна под пустые значения
+        return tuple(len(self.categories[column]) + 1 for column in FILTER_COLUMNS)
+
+    def extend(self, index, new_rows):
+        """
+        Возвращает куб для индекса, дополненного строками new_rows в конце.
+        Новые строки добавляются в ячейки, старые не пересчитываются
+        """
+        extended = StatsCube.__new__(StatsCube)
+        extended.index = index
+        extended.bucket_width = self.bucket_width
+
+        # Новые значения категорий добавляются в конец осей
+        extended.categories = {
+            column: self.categories[column] + [value for value in pd.unique(new_rows[column])
+                                               if not pd.isna(value) and value not in self.categories[column]]
+            for column in FILTER_COLUMNS
+        }
+
+        # Корзины счета расширяются, если новые суммы вышли за крайние границы
+        width = self.bucket_width
+        bills = new_rows['total_bill'].dropna().to_numpy()
+        before = after = 0
+        if len(bills):
+            before = max(0, int(np.ceil((self.edges[0] - bills.min()) / width)))
+            after = max(0, int(np.floor((bills.max() - self.edges[-1]) / width)) + 1)
+        extended.edges = np.concatenate([self.edges[0] - width * np.arange(before, 0, -1),
+                                         self.edges,
+                                         self.edges[-1] + width * np.arange(1, after + 1)])
+
+        # Копии массивов с отступами под новые категории и корзины;
+        # ячейка пустых значений остается последней на оси
+        n_buckets = len(extended.edges) - 1
+        old = np.ix_(*[np.append(np.arange(n - 1), m - 1) for n, m in zip(self.shape, extended.shape)],
+                     np.arange(before, before + self.moments.shape[-2]))
+        extended.moments = np.zeros(extended.shape + (n_buckets, len(METRICS)))
+        extended.moments[old] = self.moments
+        extended.extremes = np.tile(EMPTY_EXTREMES, extended.shape + (n_buckets, 1))
+        extended.extremes[old] = self.extremes
+
+        extended._add_rows(new_rows)
+        return extended
+
+    def _add_rows(self, rows):
+        """
+        Добавляет строки в ячейки куба
+        """
+        if not len(rows):
+            return
+        codes = [cube_codes(rows[column], self.categories[column]) for column in FILTER_COLUMNS]
+
+        bills = rows['total_bill'].to_numpy()
+        billed = ~np.isnan(bills)
+        buckets = np.searchsorted(self.edges, bills[billed], side='right') - 1
+        n_buckets = len(self.edges) - 1
+        cell_ids = np.ravel_multi_index([code[billed] for code in codes] + [buckets],
+                                        self.shape + (n_buckets,), mode=CELL_MODES)
+        moments, extremes = accumulate_cells(
+            cell_ids, rows['tip'].to_numpy()[billed], bills[billed], rows['size'].to_numpy()[billed],
+            int(np.prod(self.shape)) * n_buckets)
+
+        self.moments += moments.reshape(self.moments.shape)
+        extremes = extremes.reshape(self.extremes.shape)
+        self.extremes[..., 0::2] = np.minimum(self.extremes[..., 0::2], extremes[..., 0::2])
+        self.extremes[..., 1::2] = np.maximum(self.extremes[..., 1::2], extremes[..., 1::2])
+
+    def _selection(self, day, gender, time, smoker):
+        """
+        Срезы по осям куба для значений фильтров, None - если значения нет в данных
+        """
+        selection = []
+        for column, value in zip(FILTER_COLUMNS, (day, gender, time, smoker)):
+            if value == 'All':
+                selection.append(slice(None))
+            elif value in self.categories[column]:
+                i = self.categories[column].index(value)
+                selection.append(slice(i, i + 1))
+            else:
+                return None
+        return tuple(selection)
+
+    def cells(self, day, gender, time, smoker, bill_range):
+        """
+        Возвращает моменты и экстремумы по ячейкам (day, sex, time, smoker)
+        для заданных фильтров
+        """
+        moments = np.zeros(self.shape + (len(METRICS),))
+        extremes = np.tile(EMPTY_EXTREMES, self.shape + (1,))
+        selection = self._selection(day, gender, time, smoker)
+        if selection is None:
+            return moments, extremes
+
+        # Корзины, целиком лежащие внутри диапазона счета
+        first = np.searchsorted(self.edges, bill_range[0], side='left')
+        last = np.searchsorted(self.edges, bill_range[1], side='right') - 1
+        if first < last:
+            moments[selection] = self.moments[selection + (slice(first, last),)].sum(axis=-2)
+            extremes[selection] = np.stack([
+                reduce(self.extremes[selection + (slice(first, last), i)], axis=-1)
+                for i, reduce in enumerate((np.min, np.max, np.min, np.max))
+            ], axis=-1)
+            edge_ranges = [(bill_range[0], self.edges[first], 'left'),
+                           (self.edges[last], bill_range[1], 'right')]
+        else:
+            edge_ranges = [(bill_range[0], bill_range[1], 'right')]
+
+        # Краевые корзины считаются по строкам через индекс
+        for low, high, side in edge_ranges:
+            rows = self.index.select(day, gender, time, smoker, (low, high), side)
+            if not len(rows):
+                continue
+            for edge in self.index.take_parts(rows, EDGE_COLUMNS):
+                codes = [cube_codes(edge[column], self.categories[column]) for column in FILTER_COLUMNS]
+                cell_ids = np.ravel_multi_index(codes, self.shape, mode=CELL_MODES[:-1])
+                edge_moments, edge_extremes = accumulate_cells(
+                    cell_ids, edge['tip'], edge['total_bill'], edge['size'], int(np.prod(self.shape)))
+                moments += edge_moments.reshape(moments.shape)
+                edge_extremes = edge_extremes.reshape(extremes.shape)
+                extremes[..., 0::2] = np.minimum(extremes[..., 0::2], edge_extremes[..., 0::2])
+                extremes[..., 1::2] = np.maximum(extremes[..., 1::2], edge_extremes[..., 1::2])
+
+        return moments, extremes
+
+    def statistics(self, day, gender, time, smoker, bill_range):
+        """
+        Статистика для набора фильтров в формате calculate_statistics
+        """
+        moments, extremes = self.cells(day, gender, time, smoker, bill_range)
+        return statistics_from_cells(moments, extremes, self.categories)
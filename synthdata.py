@@ -0,0 +1,51 @@
+import sys
+
+import numpy as np
+import pandas as pd
+
+from datastore import CATEGORICAL_COLUMNS, NUMERIC_DTYPES, read_tips_csv
+
+
+def generate_tips(n_rows, source='tips.csv', seed=0, bill_noise=0.15, pct_noise=0.02):
+    """
+    Синтетические данные о чаевых со схемой и распределениями исходного CSV.
+
+    Строки исходного файла выбираются с возвращением, так что сохраняются частоты
+    сочетаний (day, sex, time, smoker) и размер компании. Счет умножается на
+    логнормальный шум, чаевые пересчитываются из процента чаевых исходной строки
+    с небольшим шумом, поэтому сохраняется связь чаевых со счетом
+    """
+    template = read_tips_csv(source)
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, len(template), n_rows)
+
+    bills = template['total_bill'].to_numpy()[rows]
+    tips = template['tip'].to_numpy()[rows]
+    bills = np.round(bills * rng.lognormal(0.0, bill_noise, n_rows), 2)
+    bills = np.maximum(bills, 1.0)
+    pct = tips / template['total_bill'].to_numpy()[rows] + rng.normal(0.0, pct_noise, n_rows)
+    tips = np.round(np.clip(bills * pct, 1.0, None), 2)
+
+    columns = {}
+    for column in template.columns:
+        if column == 'total_bill':
+            columns[column] = bills
+        elif column == 'tip':
+            columns[column] = tips
+        elif column in CATEGORICAL_COLUMNS:
+            series = template[column]
+            categories = sorted(series.cat.categories)
+            codes = series.cat.reorder_categories(categories).cat.codes.to_numpy()[rows]
+            columns[column] = pd.Categorical.from_codes(codes, categories=categories)
+        else:
+            columns[column] = template[column].to_numpy()[rows].astype(NUMERIC_DTYPES[column])
+    return pd.DataFrame(columns)
+
+
+if __name__ == '__main__':
+    # Генерация CSV: python synthdata.py <число строк> <файл> [seed]
+    n_rows = int(float(sys.argv[1]))
+    path = sys.argv[2]
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    generate_tips(n_rows, seed=seed).to_csv(path, index=False)
+    print(f"{n_rows} rows written to {path}")
@@ -0,0 +1,153 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# Операторы фильтра DataTable: необязательный префикс регистра (i/s) и сам оператор
+FILTER_PART = re.compile(
+    r'^\{(?P<column>[^}]+)\}\s*'
+    r'(?P<case>[is])?(?P<operator>>=|<=|!=|<|>|=|ge|le|ne|lt|gt|eq|contains|datestartswith)'
+    r'\s+(?P<value>.+)$',
+    re.IGNORECASE
+)
+
+OPERATOR_ALIASES = {'ge': '>=', 'le': '<=', 'ne': '!=', 'lt': '<', 'gt': '>', 'eq': '='}
+
+
+def split_filter_part(filter_part):
+    """
+    Разбирает одно условие filter_query вида "{column} operator value"
+    """
+    match = FILTER_PART.match(filter_part.strip())
+    if match is None:
+        return None, None, None, False
+
+    operator = match.group('operator').lower()
+    operator = OPERATOR_ALIASES.get(operator, operator)
+    ignore_case = (match.group('case') or '').lower() == 'i'
+
+    value_part = match.group('value').strip()
+    quote = value_part[0]
+    if quote == value_part[-1] and quote in ("'", '"', '`') and len(value_part) > 1:
+        value = value_part[1:-1].replace('\\' + quote, quote)
+    else:
+        try:
+            value = float(value_part)
+        except ValueError:
+            value = value_part
+
+    return match.group('column'), operator, value, ignore_case
+
+
+def apply_filter_query(dataFrame, filter_query):
+    """
+    Применяет filter_query DataTable к таблице на сервере
+    """
+    if not filter_query:
+        return dataFrame
+
+    mask = np.ones(len(dataFrame), dtype=bool)
+    for filter_part in filter_query.split(' && '):
+        column, operator, value, ignore_case = split_filter_part(filter_part)
+        if column not in dataFrame.columns:
+            continue
+        series = dataFrame[column]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            # Неупорядоченные категории нельзя сравнивать на больше/меньше
+            series = series.astype(str)
+
+        if operator in ('contains', 'datestartswith'):
+            text = series.astype(str)
+            value = str(value)
+            if ignore_case:
+                text, value = text.str.lower(), value.lower()
+            if operator == 'contains':
+                part = text.str.contains(value, regex=False)
+            else:
+                part = text.str.startswith(value)
+        else:
+            if isinstance(value, str):
+                if series.dtype.kind in 'iuf':
+                    # Строку нельзя сравнить с числовой колонкой
+                    mask[:] = False
+                    continue
+                if ignore_case:
+                    series, value = series.astype(str).str.lower(), value.lower()
+            if operator == '=':
+                part = series == value
+            elif operator == '!=':
+                part = series != value
+            elif operator == '<':
+                part = series < value
+            elif operator == '<=':
+                part = series <= value
+            elif operator == '>':
+                part = series > value
+            else:
+                part = series >= value
+
+        mask &= np.asarray(part, dtype=bool)
+
+    if mask.all():
+        return dataFrame
+    return dataFrame[mask]
+
+
+def get_page(dataFrame, page_current, page_size, sort_by=None):
+    """
+    Возвращает только текущую страницу таблицы с учетом сортировки.
+    Сортируются лишь ключевые колонки, строки страницы выбираются по позициям.
+    """
+    page_current = page_current or 0
+    start = page_current * page_size
+    end = start + page_size
+
+    sort_by = [col for col in (sort_by or []) if col['column_id'] in dataFrame.columns]
+    if not sort_by:
+        return dataFrame.iloc[start:end]
+
+    keys = dataFrame[[col['column_id'] for col in sort_by]].reset_index(drop=True)
+    order = keys.sort_values(
+        by=list(keys.columns),
+        ascending=[col['direction'] == 'asc' for col in sort_by],
+        kind='mergesort'
+    ).index.to_numpy()
+    return dataFrame.iloc[order[start:end]]
+
+
+def chunked_page(chunks, columns, filter_query, page_current, page_size, sort_by=None, n_rows=None):
+    """
+    Страница таблицы по порциям строк, без сборки всех строк в одну таблицу.
+    Без сортировки из порций берутся строки страницы, с сортировкой - лучшие строки
+    до конца страницы среди уже просмотренных порций. Если число строк n_rows известно
+    заранее и сортировки нет, просмотр заканчивается на странице.
+    Возвращает страницу и число подходящих строк
+    """
+    page_current = page_current or 0
+    start = page_current * page_size
+    end = start + page_size
+    sort_by = [col for col in (sort_by or []) if col['column_id'] in columns]
+
+    parts = []
+    top = None
+    counted = 0
+    for chunk in chunks:
+        chunk = apply_filter_query(chunk[columns], filter_query)
+        if sort_by:
+            # Сортировка устойчивая, а прошлые лучшие строки идут раньше порции - порядок как у get_page
+            top = chunk if top is None else pd.concat([top, chunk])
+            top = get_page(top, 0, end, sort_by)
+        elif counted < end and counted + len(chunk) > start:
+            parts.append(chunk.iloc[max(start - counted, 0):end - counted])
+        elif not parts:
+            # Пустая порция сохраняет колонки и типы для пустой страницы
+            parts.append(chunk.iloc[:0])
+        counted += len(chunk)
+        if n_rows is not None and not sort_by and counted >= end:
+            break
+
+    if sort_by:
+        page = top.iloc[start:end]
+    else:
+        page = pd.concat(parts) if len(parts) > 1 else parts[0]
+    return page, counted if n_rows is None else n_rows
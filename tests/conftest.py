@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope='session')
+def tips_csv(tmp_path_factory):
+    """
+    tips.csv с пустыми значениями в каждой категории, пустым счетом
+    и счетами ровно на границах корзин куба
+    """
+    dataFrame = pd.read_csv(os.path.join(ROOT, 'tips.csv'))
+    dataFrame['total_bill'] = dataFrame['total_bill'].astype(object)
+    for row, column in ((3, 'day'), (7, 'sex'), (9, 'smoker'), (11, 'time'), (12, 'total_bill')):
+        dataFrame.loc[row, column] = None
+    dataFrame.loc[20, 'total_bill'] = 10.0
+    dataFrame.loc[21, 'total_bill'] = 20.0
+    path = tmp_path_factory.mktemp('data') / 'tips.csv'
+    dataFrame.to_csv(path, index=False)
+    return str(path)
@@ -0,0 +1,164 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from dataset import TipsDataset
+from datastore import read_tips_csv
+from facets import facet_counts
+from filterindex import FILTER_COLUMNS
+from graphfunc import calculate_statistics
+from partitions import PartitionSnapshot
+from sampling import StratifiedSample
+from sqlstore import SqlSnapshot, build_sqlite
+from tablequery import apply_filter_query, get_page
+
+FILTERS = [
+    ('All', 'All', 'All', 'All'),
+    ('Sun', 'All', 'All', 'All'),
+    ('All', 'Female', 'Dinner', 'All'),
+    ('Sat', 'Male', 'Dinner', 'Yes'),
+    ('Thur', 'All', 'Dinner', 'All'),
+    # Значения, которого нет в данных
+    ('Mon', 'All', 'All', 'All'),
+]
+
+# None - весь диапазон счета набора данных. (10, 20) - ровно границы корзин куба,
+# на них лежат строки; (3.07, 3.07) - одна строка с минимальным счетом
+BILL_RANGES = [None, (10, 20), (10.5, 20.5), (3.07, 3.07), (0, 100), (60, 70)]
+
+SCALARS = ('avg_bill', 'avg_tip', 'avg_tip_percentage', 'avg_size', 'correlation',
+           'max_tip', 'min_tip', 'max_bill', 'min_bill')
+GROUPS = ('gender_stats', 'day_stats', 'time_stats', 'smoker_stats')
+
+# Выборка не строит страницы таблицы: таблица всегда читается из полных данных
+BACKENDS = ['memory', 'appended', 'partitions', 'sqlite', 'sample']
+TABLE_BACKENDS = BACKENDS[:-1]
+
+# Страницы: filter_query, сортировка, номер страницы
+PAGES = [
+    ('', None, 0),
+    ('', None, 1),
+    ('{tip} > 2', [{'column_id': 'tip', 'direction': 'desc'}], 0),
+    ('{tip} > 2', [{'column_id': 'size', 'direction': 'asc'}, {'column_id': 'total_bill', 'direction': 'desc'}], 1),
+]
+
+
+def baseline_filter(dataFrame, day, gender, time, smoker, bill_range):
+    # Исходный путь приложения: сравнения по колонкам и диапазон счета
+    if day != 'All': dataFrame = dataFrame[dataFrame['day'] == day]
+    if gender != 'All': dataFrame = dataFrame[dataFrame['sex'] == gender]
+    if time != 'All': dataFrame = dataFrame[dataFrame['time'] == time]
+    if smoker != 'All': dataFrame = dataFrame[dataFrame['smoker'] == smoker]
+    return dataFrame[(dataFrame['total_bill'] >= bill_range[0]) & (dataFrame['total_bill'] <= bill_range[1])]
+
+
+def plain(dataFrame):
+    # Категории разных хранилищ отличаются порядком - сравниваются значения
+    dataFrame = dataFrame.reset_index(drop=True)
+    return dataFrame.astype({column: object for column in dataFrame.columns
+                             if isinstance(dataFrame[column].dtype, pd.CategoricalDtype)})
+
+
+@pytest.fixture(scope='module')
+def baseline(tips_csv):
+    return pd.read_csv(tips_csv)
+
+
+def open_backend(kind, tips_csv, tmp_path_factory):
+    if kind == 'memory':
+        yield kind, TipsDataset(read_tips_csv(tips_csv)).snapshot
+    elif kind == 'appended':
+        # Пустые значения остаются в основной части, новые строки - в дописанной
+        dataFrame = read_tips_csv(tips_csv)
+        dataset = TipsDataset(dataFrame.iloc[:150].reset_index(drop=True))
+        dataset.append(pd.read_csv(tips_csv).iloc[150:])
+        yield kind, dataset.snapshot
+    elif kind == 'partitions':
+        directory = tmp_path_factory.mktemp('parts')
+        for i, part in enumerate(np.array_split(pd.read_csv(tips_csv), 3)):
+            part.to_csv(directory / f'part{i}.csv', index=False)
+        snapshot = PartitionSnapshot(str(directory), processes=1)
+        yield kind, snapshot
+        if snapshot._executor is not None:
+            snapshot._executor.shutdown()
+    elif kind == 'sqlite':
+        path = str(tmp_path_factory.mktemp('db') / 'tips.sqlite')
+        build_sqlite(tips_csv, path)
+        yield kind, SqlSnapshot(path)
+    else:
+        # Емкость больше числа строк: в выборку попадают все строки
+        snapshot = TipsDataset(read_tips_csv(tips_csv)).snapshot
+        yield kind, StratifiedSample.build(snapshot, 1000)
+
+
+@pytest.fixture(scope='module', params=BACKENDS)
+def backend(request, tips_csv, tmp_path_factory):
+    yield from open_backend(request.param, tips_csv, tmp_path_factory)
+
+
+@pytest.fixture(scope='module', params=TABLE_BACKENDS)
+def table_backend(request, tips_csv, tmp_path_factory):
+    yield from open_backend(request.param, tips_csv, tmp_path_factory)
+
+
+def full_range(baseline, bill_range):
+    bills = baseline['total_bill']
+    return (bills.min(), bills.max()) if bill_range is None else bill_range
+
+
+@pytest.mark.parametrize('bill_range', BILL_RANGES)
+@pytest.mark.parametrize('filters', FILTERS)
+def test_statistics(backend, baseline, filters, bill_range):
+    kind, snapshot = backend
+    bill_range = full_range(baseline, bill_range)
+    expected = calculate_statistics(baseline_filter(baseline, *filters, bill_range))
+    stats = snapshot.statistics(*filters, bill_range)
+
+    assert stats['total_records'] == expected['total_records']
+    for name in SCALARS:
+        assert np.isclose(stats[name], expected[name], equal_nan=True), name
+    for name in GROUPS:
+        pd.testing.assert_frame_equal(stats[name].sort_index(), expected[name].sort_index(),
+                                      check_dtype=False, check_index_type=False, atol=0.01)
+    if kind == 'sample':
+        assert stats['exact']
+
+
+@pytest.mark.parametrize('bill_range', BILL_RANGES)
+@pytest.mark.parametrize('filters', FILTERS)
+def test_facet_counts(backend, baseline, filters, bill_range):
+    kind, snapshot = backend
+    bill_range = full_range(baseline, bill_range)
+    facets = facet_counts(snapshot.cell_counts(bill_range), snapshot.categories, *filters)
+    for axis, column in enumerate(FILTER_COLUMNS):
+        # Счетчик значения - число строк при остальных фильтрах и этом значении
+        others = list(filters)
+        others[axis] = 'All'
+        rows = baseline_filter(baseline, *others, bill_range)
+        assert facets[column]['All'] == pytest.approx(len(rows))
+        for value, count in rows[column].value_counts().items():
+            assert facets[column][value] == pytest.approx(count)
+
+
+@pytest.mark.parametrize('filter_query, sort_by, page_current', PAGES)
+@pytest.mark.parametrize('columns', [None, ['day', 'tip', 'total_bill', 'size']])
+@pytest.mark.parametrize('bill_range', BILL_RANGES)
+@pytest.mark.parametrize('filters', FILTERS)
+def test_table_page(table_backend, baseline, filters, bill_range, columns, filter_query, sort_by, page_current):
+    kind, snapshot = table_backend
+    bill_range = full_range(baseline, bill_range)
+    columns = columns or baseline.columns.tolist()
+    page_size = 25
+
+    expected = apply_filter_query(baseline_filter(baseline, *filters, bill_range)[columns], filter_query)
+    expected_page = get_page(expected, page_current, page_size, sort_by)
+    if kind in ('memory', 'appended'):
+        # Путь update_table для набора в памяти
+        rows = apply_filter_query(snapshot.take(snapshot.select(*filters, bill_range), columns), filter_query)
+        page, total = get_page(rows, page_current, page_size, sort_by), len(rows)
+    else:
+        page, total = snapshot.table_page(*filters, bill_range, columns, filter_query, sort_by,
+                                          page_current, page_size)
+
+    assert total == len(expected)
+    pd.testing.assert_frame_equal(plain(page), plain(expected_page), check_dtype=False)